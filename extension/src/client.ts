@@ -3,6 +3,17 @@
  */
 import * as vscode from 'vscode';
 
+// Characters of context sent from before and after the cursor
+const PREFIX_CHARS = 3000;
+const SUFFIX_CHARS = 1000;
+
+interface CompleteResponse {
+    completion: string;
+    cached: boolean;
+    superseded: boolean;
+    error?: string;
+}
+
 export class InlineProvider implements vscode.InlineCompletionItemProvider {
     async provideInlineCompletionItems(
         document: vscode.TextDocument,
@@ -13,24 +24,55 @@ export class InlineProvider implements vscode.InlineCompletionItemProvider {
         // Get the current line and context
         const line = document.lineAt(position.line);
         const text = line.text.substring(0, position.character);
-        
-        // Only trigger on specific patterns or after certain characters
-        if (!text.trim() || !text.endsWith(' ')) {
+
+        // Don't suggest on blank lines unless the user asked for a suggestion
+        if (!text.trim() && context.triggerKind === vscode.InlineCompletionTriggerKind.Automatic) {
             return { items: [] };
         }
 
+        const offset = document.offsetAt(position);
+        const prefix = document.getText(new vscode.Range(document.positionAt(Math.max(0, offset - PREFIX_CHARS)), position));
+        const suffix = document.getText(new vscode.Range(position, document.positionAt(offset + SUFFIX_CHARS)));
+        const config = vscode.workspace.getConfiguration('codeAssistant');
+
+        // Abort the request when VS Code cancels this completion because the user kept typing
+        const controller = new AbortController();
+        const subscription = token.onCancellationRequested(() => controller.abort());
+
         try {
-            // TODO: Implement actual API call to /generate endpoint
-            // For now, return a simple completion
+            const response = await fetch(`${config.get<string>('serverUrl', 'http://localhost:8000')}/complete`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    prefix,
+                    suffix,
+                    // Lets the server drop older requests for this document
+                    document_id: document.uri.toString(),
+                    model: config.get<string>('completionModel') || undefined
+                }),
+                signal: controller.signal
+            });
+            if (!response.ok) {
+                return { items: [] };
+            }
+
+            const result = await response.json() as CompleteResponse;
+            if (token.isCancellationRequested || result.superseded || !result.completion) {
+                return { items: [] };
+            }
             return {
                 items: [{
-                    insertText: '// TODO: Implement this function',
+                    insertText: result.completion,
                     range: new vscode.Range(position, position)
                 }]
             };
         } catch (error) {
-            console.error('Inline completion failed:', error);
+            if (!token.isCancellationRequested) {
+                console.error('Inline completion failed:', error);
+            }
             return { items: [] };
+        } finally {
+            subscription.dispose();
         }
     }
-} 
\ No newline at end of file
+}
@@ -3,6 +3,7 @@
  */
 import * as vscode from 'vscode';
 import { LanguageClient, LanguageClientOptions, ServerOptions, TransportKind } from 'vscode-languageclient/node';
+import { InlineProvider } from './client';
 
 // Define response types
 interface GenerateResponse {
@@ -18,6 +19,13 @@ interface ChatResponse {
 }
 
 export async function activate(context: vscode.ExtensionContext) {
+    // Inline completions come straight from the backend's /complete endpoint
+    if (vscode.workspace.getConfiguration('codeAssistant').get<boolean>('inlineCompletions', true)) {
+        context.subscriptions.push(
+            vscode.languages.registerInlineCompletionItemProvider({ pattern: '**' }, new InlineProvider())
+        );
+    }
+
     // Configure server options
     const serverOptions: ServerOptions = {
         command: 'uv',
@@ -4,45 +4,39 @@ Streamlit UI for Local Code Assistant
 import streamlit as st
 import requests
 import json
-import psutil
-import subprocess
+import uuid
 from datetime import datetime
 
+@st.cache_data(ttl=30)
 def get_available_models():
+    """Get installed Ollama models from the server's cached registry"""
     try:
-        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')[1:]  # Skip header
-            models = [line.split()[0] for line in lines if line.strip()]
-            return models
-        return []
+        response = requests.get("http://localhost:8000/models", timeout=10)
+        response.raise_for_status()
+        return response.json()
     except Exception as e:
         st.error(f"Error getting Ollama models: {str(e)}")
         return []
 
+@st.cache_data(ttl=5)
+def get_loaded_models():
+    """Get the models Ollama currently has in memory"""
+    try:
+        response = requests.get("http://localhost:8000/models/loaded", timeout=5)
+        response.raise_for_status()
+        return [model["name"] for model in response.json()]
+    except Exception:
+        return []
+
+@st.cache_data(ttl=2)
 def get_metrics():
-    """Get system metrics"""
-    metrics = {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory_percent": psutil.virtual_memory().percent,
-        "gpu_metrics": {}
-    }
-    
+    """Get the server's latest background-sampled system metrics"""
     try:
-        nvidia_smi = subprocess.check_output([
-            "nvidia-smi", "--query-gpu=utilization.gpu,memory.used,memory.total",
-            "--format=csv,noheader,nounits"
-        ])
-        gpu_metrics = nvidia_smi.decode().strip().split(",")
-        metrics["gpu_metrics"] = {
-            "utilization": float(gpu_metrics[0]),
-            "memory_used": float(gpu_metrics[1]),
-            "memory_total": float(gpu_metrics[2])
-        }
-    except:
-        pass
-    
-    return metrics
+        response = requests.get("http://localhost:8000/metrics", timeout=5)
+        response.raise_for_status()
+        return response.json()
+    except Exception:
+        return {"cpu_percent": 0.0, "memory_percent": 0.0, "gpu_metrics": {}}
 
 def generate_code(prompt, model):
     """Generate code using the API"""
@@ -55,12 +49,30 @@ def generate_code(prompt, model):
     except Exception as e:
         return {"error": str(e)}
 
+def stream_events(path, payload):
+    """Yield (event, data) pairs from a Server-Sent Events endpoint"""
+    with requests.post(
+        f"http://localhost:8000{path}",
+        json=payload,
+        stream=True
+    ) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+                event = "message"
+
 def review_code(code, model):
     """Review code using the API"""
     try:
         response = requests.post(
             "http://localhost:8000/review",
-            json={"prompt": code, "model": model}
+            json={"code": code, "model": model}
         )
         return response.json()
     except Exception as e:
@@ -133,6 +145,9 @@ st.markdown("""
 # Initialize session state
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+if 'session_id' not in st.session_state:
+    # The server keeps the conversation history for this ID
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Sidebar
 with st.sidebar:
@@ -142,7 +157,15 @@ with st.sidebar:
     if not available_models:
         st.warning("No Ollama models found. Use 'ollama pull <model>' to add models.")
         st.stop()
-    model = st.selectbox("Select Model", available_models, index=0)
+    loaded_models = get_loaded_models()
+    # Default to a model that is already in memory so the first request skips the load
+    default_index = next((i for i, name in enumerate(available_models) if name in loaded_models), 0)
+    model = st.selectbox(
+        "Select Model",
+        available_models,
+        index=default_index,
+        format_func=lambda name: f"{name} (loaded)" if name in loaded_models else name
+    )
     st.markdown(f"<div style='font-size:0.8em;color:#666;margin-top:0.5em;'>Using model: {model}</div>", unsafe_allow_html=True)
     
     # System metrics
@@ -182,18 +205,25 @@ with tab1:
     )
     
     if st.button("Generate Code", type="primary"):
-        with st.spinner("Generating code..."):
-            result = generate_code(prompt, model)
-            if "error" in result:
-                st.error(result["error"])
-            else:
-                st.markdown("### Generated Code")
-                st.code(result.get("code", ""), language="python")
-                
-                if "issues" in result and result["issues"]:
-                    st.markdown("### Review Comments")
-                    for issue in result["issues"]:
-                        st.info(issue)
+        st.markdown("### Generated Code")
+        placeholder = st.empty()
+        raw, code_so_far = "", ""
+        try:
+            for event, data in stream_events("/generate/stream", {"prompt": prompt, "model": model}):
+                if event == "token":
+                    raw += data["text"]
+                elif event == "code":
+                    code_so_far += data["text"]
+                elif event == "done":
+                    code_so_far = data.get("code", "")
+                    if data.get("ttft_ms") is not None:
+                        st.caption(f"First token in {data['ttft_ms']} ms, finished in {data['total_ms']} ms")
+                elif event == "error":
+                    st.error(data["error"])
+                    break
+                placeholder.code(code_so_far or raw, language="python")
+        except Exception as e:
+            st.error(str(e))
 
 # Review Code Tab
 with tab2:
@@ -237,17 +267,31 @@ with tab3:
         
         # Get and display assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = send_chat(prompt, model)
-                if "error" in response:
-                    st.error(response["error"])
-                else:
-                    st.markdown(response.get("response", ""))
-                    # Add assistant response to chat history
-                    st.session_state.chat_history.append({
-                        "role": "assistant",
-                        "content": response.get("response", "")
-                    })
+            errors = []
+
+            def chat_tokens():
+                try:
+                    for event, data in stream_events(
+                        "/chat/stream",
+                        {"message": prompt, "model": model, "session_id": st.session_state.session_id}
+                    ):
+                        if event == "token":
+                            yield data["text"]
+                        elif event == "error":
+                            errors.append(data["error"])
+                except Exception as e:
+                    errors.append(str(e))
+
+            # Render tokens as they arrive
+            reply = st.write_stream(chat_tokens())
+            if errors:
+                st.error(errors[0])
+            else:
+                # Add assistant response to chat history
+                st.session_state.chat_history.append({
+                    "role": "assistant",
+                    "content": reply
+                })
 
 # Auto-refresh metrics
 if st.button("Refresh Metrics"):
@@ -1,84 +1,230 @@
 """
 Helper to call AutoGen for multi-agent dialogue using local Ollama models.
+Agent sets (agents, group chat and manager) are pooled per model/device,
+backend and system-message tuple, so they are built once per configuration
+and reset between uses instead of being rebuilt on every request. A chat can
+be cancelled from another thread; it then stops before the next agent turn.
+Each chat is routed to a backend by the backend pool; the other backends
+follow it in the config list, so AutoGen fails over to them if it errors.
 """
-from autogen import ConversableAgent, GroupChatManager
-import os
+from autogen import Agent, ConversableAgent, GroupChat, GroupChatManager
+from inference import InferenceContext
+from backend_pool import get_backend_pool
 from dotenv import load_dotenv
-from typing import Union, Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Union, Dict, Any, Optional, Tuple
+import asyncio
+import os
+import threading
 
 # Load environment variables
 load_dotenv()
 
-def run_autogen_chat(system_messages: list[str], user_message: str) -> Union[str, Dict[str, Any]]:
-    """
-    Run a multi-agent chat session using AutoGen with local Ollama models.
-    
-    Args:
-        system_messages: List of system messages for each agent
-        user_message: The user's message to process
-        
-    Returns:
-        Union[str, Dict[str, Any]]: The response from the agents, either as a string or a structured dict
-    """
-    try:
-        # Get model from environment
-        model = os.getenv("OLLAMA_MODEL")
-        if not model:
-            return {"error": "No model selected. Please select a model from the UI."}
-        
-        # Configure LLM settings for local Ollama model
-        llm_config = {
-            "config_list": [{
-                "model": model,
-                "base_url": "http://localhost:11434",
-                "api_type": "open_ai",
+# (model, device, backend URL, system messages)
+PoolKey = Tuple[str, str, str, Tuple[str, ...]]
+
+def build_llm_config(inference: InferenceContext, base_urls: Optional[list[str]] = None) -> Dict[str, Any]:
+    """LLM settings for Ollama models behind their OpenAI-compatible API, one config per backend in failover order"""
+    base_urls = base_urls or [backend.url for backend in get_backend_pool().ranked(inference.model)]
+    return {
+        "config_list": [
+            {
+                "model": inference.model,
+                "base_url": f"{base_url}/v1",
                 "api_key": "not-needed",  # Ollama doesn't require an API key
-                "options": {
-                    "num_gpu": 1,  # Use 1 GPU
-                    "num_thread": 4,  # Adjust based on your CPU
-                    "gpu_layers": 20,  # Reduced layers for 4GB GPU
-                    "num_ctx": 2048,  # Reduced context window
-                    "num_batch": 256,  # Reduced batch size
-                    "num_gqa": 4,  # Reduced attention heads
-                    "rope_scaling": None,
-                    "temperature": 0.7,
-                    "top_p": 0.95,
-                    "top_k": 40,
-                    "repeat_penalty": 1.1,
-                    "mirostat": 0,
-                    "mirostat_eta": 0.1,
-                    "mirostat_tau": 5.0,
-                    "seed": 42
-                }
-            }],
-            "temperature": 0.7,
-            "timeout": 60
-        }
-        
+                "extra_body": {"options": inference.options}
+            }
+            for base_url in base_urls
+        ],
+        "temperature": 0.7,
+        "timeout": 60
+    }
+
+@dataclass
+class AgentSet:
+    """One ready-to-use group chat: role agents, their manager and the user proxy"""
+    agents: list[ConversableAgent]
+    groupchat: GroupChat
+    manager: GroupChatManager
+    user: ConversableAgent
+    cancelled: Optional[threading.Event] = None  # Set by the borrower to stop the chat early
+
+    @classmethod
+    def build(cls, inference: InferenceContext, system_messages: Tuple[str, ...], base_urls: list[str]) -> "AgentSet":
+        llm_config = build_llm_config(inference, base_urls)
+
         # Create agents with different roles
         agents = [
             ConversableAgent(
                 name=f"Agent{i}",
                 system_message=msg,
-                llm_config=llm_config
+                llm_config=llm_config,
+                human_input_mode="NEVER"
             )
             for i, msg in enumerate(system_messages)
         ]
-        
-        # Create and run group chat
-        manager = GroupChatManager(
-            groupchat=agents,
-            llm_config=llm_config,
-            messages=[{"role": "user", "content": user_message}]
+        # Every agent speaks once, in order, after the user message
+        groupchat = GroupChat(
+            agents=agents,
+            messages=[],
+            max_round=len(agents) + 1,
+            speaker_selection_method="round_robin"
+        )
+        manager = GroupChatManager(groupchat=groupchat, llm_config=llm_config)
+        user = ConversableAgent(
+            name="User",
+            llm_config=False,
+            human_input_mode="NEVER",
+            code_execution_config=False
         )
-        
-        # Process the chat
-        chat_result = manager.run()
-        
+        agent_set = cls(agents=agents, groupchat=groupchat, manager=manager, user=user)
+        for agent in agents:
+            agent.register_reply([Agent, None], agent_set.stop_if_cancelled)
+        return agent_set
+
+    def stop_if_cancelled(self, recipient, messages=None, sender=None, config=None) -> Tuple[bool, None]:
+        """Reply hook checked first on every agent turn: a final empty reply ends the group chat"""
+        if self.cancelled is not None and self.cancelled.is_set():
+            return True, None
+        return False, None
+
+    def reset(self):
+        """Clear all conversation state so the set can serve another request"""
+        for agent in self.agents:
+            agent.reset()
+        self.groupchat.reset()
+        self.manager.reset()
+        self.user.reset()
+        self.cancelled = None
+
+class AgentPool:
+    def __init__(self, max_idle_per_key: Optional[int] = None, max_keys: Optional[int] = None):
+        """
+        Args:
+            max_idle_per_key: Idle agent sets kept per configuration
+            max_keys: Configurations kept before the least recently used is dropped
+        """
+        self.max_idle_per_key = max_idle_per_key or int(os.getenv("AGENT_POOL_IDLE_PER_KEY", "4"))
+        self.max_keys = max_keys or int(os.getenv("AGENT_POOL_MAX_KEYS", "8"))
+        self._idle: "OrderedDict[PoolKey, list[AgentSet]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def checkout(self, inference: InferenceContext, system_messages: list[str]):
+        """Borrow an agent set for this configuration on the best backend, building one only if none is idle"""
+        backends = get_backend_pool().ranked(inference.model)
+        key: PoolKey = (inference.model, inference.device, backends[0].url, tuple(system_messages))
+        agent_set = None
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                agent_set = idle.pop()
+                self._idle.move_to_end(key)
+                self.reused += 1
+        if agent_set is None:
+            agent_set = AgentSet.build(inference, key[3], [backend.url for backend in backends])
+            with self._lock:
+                self.created += 1
+
+        try:
+            with get_backend_pool().lease(backends[0]):
+                yield agent_set
+        finally:
+            agent_set.reset()
+            with self._lock:
+                idle = self._idle.setdefault(key, [])
+                self._idle.move_to_end(key)
+                if len(idle) < self.max_idle_per_key:
+                    idle.append(agent_set)
+                while len(self._idle) > self.max_keys:
+                    self._idle.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "idle": sum(len(idle) for idle in self._idle.values()),
+                "configurations": len(self._idle)
+            }
+
+_pool: Optional[AgentPool] = None
+_pool_lock = threading.Lock()
+
+def get_agent_pool() -> AgentPool:
+    """Return the process-wide agent pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AgentPool()
+        return _pool
+
+def run_autogen_chat(
+    system_messages: list[str],
+    user_message: str,
+    inference: Optional[InferenceContext] = None,
+    cancelled: Optional[threading.Event] = None
+) -> Union[str, Dict[str, Any]]:
+    """
+    Run a multi-agent chat session using AutoGen with local Ollama models.
+
+    Args:
+        system_messages: List of system messages for each agent
+        user_message: The user's message to process
+        inference: Request-scoped model/device settings; defaults to the configured model
+        cancelled: Event that, once set, stops the chat before the next agent turn
+
+    Returns:
+        Union[str, Dict[str, Any]]: The response from the agents, either as a string or a structured dict
+    """
+    try:
+        inference = inference or InferenceContext.from_request()
+        if not inference.model:
+            return {"error": "No model selected. Please select a model from the UI."}
+
+        with get_agent_pool().checkout(inference, system_messages) as agent_set:
+            agent_set.cancelled = cancelled
+            # Process the chat
+            agent_set.user.initiate_chat(agent_set.manager, message=user_message, silent=True)
+            replies = [
+                message for message in agent_set.groupchat.messages
+                if message.get("name") != agent_set.user.name and message.get("content")
+            ]
+
         # Return the final response
-        if isinstance(chat_result, dict):
-            return chat_result
-        return {"response": str(chat_result)}
-        
+        if cancelled is not None and cancelled.is_set():
+            return {"error": "Chat cancelled"}
+        if not replies:
+            return {"error": "Chat failed: no agent replied"}
+        return {
+            "response": replies[-1]["content"],
+            "messages": [{"agent": message.get("name"), "content": message["content"]} for message in replies]
+        }
+
     except Exception as e:
-        return {"error": f"Chat failed: {str(e)}"} 
\ No newline at end of file
+        return {"error": f"Chat failed: {str(e)}"}
+
+async def arun_autogen_chat(
+    system_messages: list[str],
+    user_message: str,
+    inference: Optional[InferenceContext] = None
+) -> Union[str, Dict[str, Any]]:
+    """
+    Run run_autogen_chat in a worker thread. If the caller is cancelled, the chat stops
+    before its next agent turn; the caller waits for the turn in progress so its
+    scheduler slot isn't released while the model is still busy.
+    """
+    cancelled = threading.Event()
+    future = asyncio.ensure_future(asyncio.to_thread(
+        run_autogen_chat, system_messages, user_message, inference, cancelled
+    ))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancelled.set()
+        await asyncio.wait({future})
+        raise
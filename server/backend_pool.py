@@ -0,0 +1,237 @@
+"""
+Pool of Ollama backends that generation, agent chat and embedding traffic share.
+Each request goes to the backend with the fewest outstanding requests,
+preferring backends that already have the model loaded unless they are
+noticeably busier. Backends are health-checked in the background via /api/ps
+(which also tells us what each one has loaded); a backend that fails a
+request is taken out of rotation until it passes a check again, and the
+request is retried on the next backend.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import httpx
+
+from telemetry import BACKEND_HEALTHY, BACKEND_REQUESTS
+
+
+def parse_urls(value: str) -> list[str]:
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+@dataclass
+class Backend:
+    url: str
+    healthy: bool = True
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    failed_at: float = 0.0
+    last_error: str = ""
+    loaded: frozenset = field(default_factory=frozenset)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "loaded": sorted(self.loaded)
+        }
+
+
+class BackendPool:
+    def __init__(
+        self,
+        urls: Optional[list[str]] = None,
+        health_interval: Optional[float] = None,
+        health_timeout: Optional[float] = None,
+        affinity_slack: Optional[int] = None
+    ):
+        """
+        Args:
+            urls: Backend base URLs; defaults to OLLAMA_BASE_URLS, then OLLAMA_BASE_URL
+            health_interval: Seconds between health checks, and before a failed backend is tried again
+            health_timeout: Timeout for one health check
+            affinity_slack: Extra outstanding requests a backend with the model loaded may have
+                and still be preferred over an idler one that would have to load it
+        """
+        urls = urls or parse_urls(
+            os.getenv("OLLAMA_BASE_URLS") or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        )
+        self.backends = [Backend(url) for url in urls]
+        self.health_interval = health_interval or float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))
+        self.health_timeout = health_timeout or float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "2"))
+        self.affinity_slack = affinity_slack if affinity_slack is not None else int(
+            os.getenv("OLLAMA_AFFINITY_SLACK", "2")
+        )
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        for backend in self.backends:
+            BACKEND_HEALTHY.labels(backend.url).set(1)
+
+    def get(self, url: str) -> Optional[Backend]:
+        return next((backend for backend in self.backends if backend.url == url), None)
+
+    def ranked(self, model: Optional[str] = None, exclude: Iterable[str] = ()) -> list[Backend]:
+        """Backends in the order a request for `model` should try them"""
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            candidates = [backend for backend in self.backends if backend.url not in exclude]
+            # A failed backend gets another chance once a health interval has passed;
+            # if nothing is healthy, try everything rather than fail outright
+            available = [
+                backend for backend in candidates
+                if backend.healthy or now - backend.failed_at >= self.health_interval
+            ] or candidates
+
+            def cost(backend: Backend):
+                warm = model is not None and model in backend.loaded
+                return (
+                    not backend.healthy,
+                    backend.outstanding - (self.affinity_slack if warm else 0),
+                    backend.requests
+                )
+
+            return sorted(available, key=cost)
+
+    def choose(self, model: Optional[str] = None) -> Backend:
+        return self.ranked(model)[0]
+
+    def failover(self, model: Optional[str] = None) -> Iterator[Backend]:
+        """Yield backends to try for one request, best first; the caller stops at the first success"""
+        tried: set = set()
+        while True:
+            ranked = self.ranked(model, exclude=tried)
+            if not ranked:
+                return
+            tried.add(ranked[0].url)
+            yield ranked[0]
+
+    @contextmanager
+    def lease(self, backend: Backend):
+        """Count a request as outstanding on `backend` for the duration of the block"""
+        with self._lock:
+            backend.outstanding += 1
+            backend.requests += 1
+        try:
+            yield backend
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def record_success(self, backend: Backend, model: Optional[str] = None):
+        with self._lock:
+            backend.healthy = True
+            backend.failures = 0
+            if model:
+                backend.loaded = backend.loaded | {model}
+        BACKEND_HEALTHY.labels(backend.url).set(1)
+        BACKEND_REQUESTS.labels(backend.url, "ok").inc()
+
+    def record_failure(self, backend: Backend, error: Exception) -> bool:
+        """
+        Note a failed request. Returns True if it should be retried on another backend:
+        connection errors, timeouts and 5xx take the backend out of rotation; a 404 means
+        this backend doesn't have the model, so another one may.
+        """
+        BACKEND_REQUESTS.labels(backend.url, "failed").inc()
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            if status == 404:
+                return True
+            if status < 500:
+                return False
+        elif not isinstance(error, httpx.TransportError):
+            return False
+        self._mark_down(backend, error)
+        return True
+
+    def _mark_down(self, backend: Backend, error: Exception):
+        with self._lock:
+            backend.healthy = False
+            backend.failures += 1
+            backend.failed_at = time.monotonic()
+            backend.last_error = str(error) or type(error).__name__
+        BACKEND_HEALTHY.labels(backend.url).set(0)
+
+    def set_loaded(self, url: str, models: Iterable[str]):
+        backend = self.get(url)
+        if backend is not None:
+            with self._lock:
+                backend.loaded = frozenset(models)
+
+    def loaded_models(self) -> frozenset:
+        """Models loaded on any healthy backend, as of the last health check or request"""
+        with self._lock:
+            return frozenset().union(*(backend.loaded for backend in self.backends if backend.healthy))
+
+    def check(self, backend: Backend, client: httpx.Client):
+        """Health-check one backend, refreshing the models it has loaded"""
+        try:
+            response = client.get(f"{backend.url}/api/ps")
+            response.raise_for_status()
+            models = [model["name"] for model in response.json().get("models", [])]
+        except Exception as e:
+            self._mark_down(backend, e)
+            return
+        with self._lock:
+            backend.healthy = True
+            backend.loaded = frozenset(models)
+        BACKEND_HEALTHY.labels(backend.url).set(1)
+
+    def check_all(self):
+        with httpx.Client(timeout=self.health_timeout) as client:
+            for backend in self.backends:
+                self.check(backend, client)
+
+    def start(self):
+        """Start health checks in a background thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="backend-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.check_all()
+            except Exception as e:
+                print(f"Error checking Ollama backends: {e}")
+            if self._stop.wait(self.health_interval):
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backends": [backend.to_dict() for backend in self.backends],
+                "healthy": sum(1 for backend in self.backends if backend.healthy)
+            }
+
+
+_pool: Optional[BackendPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_backend_pool() -> BackendPool:
+    """Return the process-wide backend pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BackendPool()
+        return _pool
@@ -0,0 +1,261 @@
+"""
+Batch code review over many files or whole directories.
+Files are collected with the workspace filter and split into review units
+with the same chunker the index uses (adjacent small chunks are merged up to
+a size budget). Units from all files are reviewed concurrently at batch
+priority under the inference scheduler, and each file's result is published
+as soon as its last unit finishes.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+
+from cache import ResponseCache, get_response_cache
+from chunking import Chunk, chunk_file
+from flows import GenerateReviewFlow
+from inference import InferenceContext
+from jobs import Job
+from ollama_client import get_ollama_client
+from scheduler import get_scheduler
+from workspace_filter import WorkspaceFilter
+
+REVIEW_SYSTEM_MESSAGE = (
+    "You are a code reviewer. Cover all of the following perspectives:\n"
+    + "\n".join(f"- {name}: {message}" for name, message in GenerateReviewFlow.reviewers.items())
+    + "\nList one concrete issue per line, citing line numbers. Reply with nothing if there are no issues."
+)
+
+
+@dataclass
+class ReviewUnit:
+    filepath: str
+    text: str
+    start_line: int
+    end_line: int
+
+
+def merge_chunks(chunks: list[Chunk], max_chars: int) -> list[Chunk]:
+    """Join adjacent chunks while they fit in max_chars, so small definitions share one review call"""
+    merged: list[Chunk] = []
+    for chunk in chunks:
+        last = merged[-1] if merged else None
+        if last is not None and len(last.text) + len(chunk.text) + 1 <= max_chars:
+            merged[-1] = Chunk(
+                text=f"{last.text}\n{chunk.text}",
+                start_line=last.start_line,
+                end_line=chunk.end_line,
+                kind="merged"
+            )
+        else:
+            merged.append(chunk)
+    return merged
+
+
+def within(path: str, root: str) -> bool:
+    """Whether path, with symlinks resolved, lies inside the (resolved) root directory"""
+    real, real_root = os.path.realpath(path), os.path.realpath(root)
+    return os.path.commonpath([real, real_root]) == real_root
+
+
+def collect_files(paths: Iterable[str], root: Optional[str] = None) -> list[str]:
+    """
+    Expand files and directories (relative to root) into the files to review.
+    Raises PermissionError for a path outside root, so only workspace files are ever read.
+    """
+    root = root or os.getcwd()
+    files: list[str] = []
+    seen = set()
+    for path in paths:
+        path = os.path.abspath(os.path.join(root, path))
+        if not within(path, root):
+            raise PermissionError(f"Path is outside the workspace: {path}")
+        if os.path.isdir(path):
+            candidates = WorkspaceFilter(path).walk()
+        elif os.path.isfile(path):
+            candidates = [path]
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+        for filepath in candidates:
+            # Symlinked files inside a directory may still point out of the workspace
+            if filepath not in seen and within(filepath, root):
+                seen.add(filepath)
+                files.append(filepath)
+    return files
+
+
+def split_file(filepath: str, max_chars: int, max_file_size: int) -> Tuple[list[ReviewUnit], Optional[str]]:
+    """Review units for one file, or a skip reason for oversized, binary or non-UTF-8 files"""
+    if os.path.getsize(filepath) > max_file_size:
+        return [], "too large"
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    if b"\0" in data[:8192]:
+        return [], "binary"
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        return [], "not utf-8"
+    if not text.strip():
+        return [], "empty"
+    chunks = merge_chunks(chunk_file(filepath, text, chunk_size=max_chars), max_chars)
+    return [ReviewUnit(filepath, chunk.text, chunk.start_line, chunk.end_line) for chunk in chunks], None
+
+
+class BatchReview:
+    def __init__(
+        self,
+        files: list[str],
+        inference: InferenceContext,
+        root: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        unit_chars: Optional[int] = None,
+        max_file_size: Optional[int] = None
+    ):
+        """
+        Args:
+            files: Files to review (see collect_files)
+            inference: Model/device settings; reviews run at its priority
+            root: Directory file names in results are reported relative to
+            concurrency: Review calls queued at once; defaults to the scheduler's in-flight limit
+            unit_chars: Size budget for one review unit
+            max_file_size: Files larger than this are skipped
+        """
+        self.files = files
+        self.inference = inference
+        self.root = root or os.getcwd()
+        self.concurrency = concurrency or int(os.getenv("BATCH_REVIEW_CONCURRENCY", "0")) or get_scheduler().max_inflight
+        self.unit_chars = unit_chars or int(os.getenv("BATCH_REVIEW_UNIT_CHARS", "6000"))
+        self.max_file_size = max_file_size or int(os.getenv("INDEX_MAX_FILE_SIZE", str(512 * 1024)))
+        self.results: list[Dict[str, Any]] = []
+        self.finished = False
+        self._condition = asyncio.Condition()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+
+    def _relpath(self, filepath: str) -> str:
+        relpath = os.path.relpath(filepath, self.root)
+        return filepath if relpath.startswith("..") else relpath.replace(os.sep, "/")
+
+    async def run(self, job: Job) -> Dict[str, Any]:
+        """Review every file; used as the body of a background job"""
+        started = time.perf_counter()
+        done = 0
+
+        async def review_and_publish(filepath: str):
+            nonlocal done
+            result = await self._review_file(filepath)
+            done += 1
+            job.update(done / len(self.files), f"{done}/{len(self.files)} files")
+            async with self._condition:
+                self.results.append(result)
+                self._condition.notify_all()
+
+        try:
+            await asyncio.gather(*(review_and_publish(filepath) for filepath in self.files))
+        finally:
+            async with self._condition:
+                self.finished = True
+                self._condition.notify_all()
+        return self.summary(time.perf_counter() - started)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        units = sum(result["units"] for result in self.results)
+        return {
+            "files": len(self.files),
+            "reviewed": sum(1 for result in self.results if not result.get("skipped")),
+            "skipped": sum(1 for result in self.results if result.get("skipped")),
+            "units": units,
+            "issues": sum(len(result["issues"]) for result in self.results),
+            "errors": sum(result["errors"] for result in self.results),
+            "elapsed_s": round(elapsed, 2),
+            "files_per_s": round(len(self.results) / elapsed, 2) if elapsed else None,
+            "units_per_s": round(units / elapsed, 2) if elapsed else None
+        }
+
+    async def _review_file(self, filepath: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result: Dict[str, Any] = {"file": self._relpath(filepath), "units": 0, "issues": [], "errors": 0}
+        try:
+            units, skip_reason = await asyncio.to_thread(split_file, filepath, self.unit_chars, self.max_file_size)
+        except OSError as e:
+            units, skip_reason = [], f"unreadable: {e}"
+        if skip_reason:
+            result["skipped"] = skip_reason
+            return result
+
+        reviews = await asyncio.gather(*(self._review_unit(unit) for unit in units))
+        result["units"] = len(units)
+        for issues, ok in reviews:
+            result["issues"].extend(issues)
+            result["errors"] += 0 if ok else 1
+        result["elapsed_s"] = round(time.perf_counter() - started, 2)
+        return result
+
+    async def _review_unit(self, unit: ReviewUnit) -> Tuple[list[str], bool]:
+        """Review one unit; returns (issues, succeeded)"""
+        location = f"{self._relpath(unit.filepath)}:{unit.start_line}-{unit.end_line}"
+        user_message = f"Please review this code from {location}:\n\n{unit.text}"
+        cache = get_response_cache() if self.inference.use_cache else None
+        key = ""
+        if cache is not None:
+            key = ResponseCache.make_key(
+                "review-batch", self.inference.model, self.inference.options, [REVIEW_SYSTEM_MESSAGE, user_message]
+            )
+            cached = await cache.aget(key)
+            if cached is not None:
+                return cached, True
+
+        async with self._semaphore:
+            scheduler = get_scheduler()
+            # The job was admitted once; its units still leave the queue to interactive traffic
+            while not scheduler.admits(self.inference.priority):
+                await asyncio.sleep(scheduler.retry_after())
+            try:
+                async with scheduler.slot(self.inference.model, self.inference.priority):
+                    result = await get_ollama_client().chat(
+                        model=self.inference.model,
+                        messages=[
+                            {"role": "system", "content": REVIEW_SYSTEM_MESSAGE},
+                            {"role": "user", "content": user_message}
+                        ],
+                        options=self.inference.options
+                    )
+            except Exception as e:
+                return [f"[{location}] Review failed: {str(e)}"], False
+
+        content = result.get("message", {}).get("content", "")
+        issues = [f"[{location}] {line.strip()}" for line in content.splitlines() if line.strip()]
+        if cache is not None:
+            await cache.aset(key, issues)
+        return issues, True
+
+    async def events(self) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Yield a `file` event per finished file (including ones finished before subscribing), then `done`"""
+        sent = 0
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: len(self.results) > sent or self.finished)
+                pending = self.results[sent:]
+                finished = self.finished
+            for result in pending:
+                yield "file", result
+            sent += len(pending)
+            if finished:
+                break
+        yield "done", {"files": len(self.files), "results": sent}
+
+
+_batches: "OrderedDict[str, BatchReview]" = OrderedDict()
+
+
+def register_batch(job_id: str, batch: BatchReview, max_batches: int = 32):
+    """Keep a batch addressable by its job id for result streaming"""
+    _batches[job_id] = batch
+    while len(_batches) > max_batches:
+        _batches.popitem(last=False)
+
+
+def get_batch(job_id: str) -> Optional[BatchReview]:
+    return _batches.get(job_id)
@@ -0,0 +1,108 @@
+"""
+Parallel-load latency benchmark for the FastAPI backend.
+
+Fires concurrent /generate requests and, while they run, probes /metrics
+to show whether slow generations hold up unrelated endpoints. Run it once
+against the old server and once against the new one to compare p50/p99.
+
+    python benchmarks/concurrency.py --url http://localhost:8000 \
+        --model codellama:7b-instruct --concurrency 8 --requests 32
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Return the pct-th percentile using nearest-rank."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies: list[float], elapsed: float) -> dict:
+    """Summarize a list of latencies (seconds) into a report dict."""
+    return {
+        "count": len(latencies),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else 0.0
+    }
+
+
+async def run_generate(client: httpx.AsyncClient, args, latencies: list[float], errors: list[str]):
+    """Issue generate requests from a bounded number of workers."""
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/generate",
+                    json={"prompt": f"{args.prompt} (variant {i})", "model": args.model}
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(str(e))
+
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+
+
+async def run_probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list[float]):
+    """Poll /metrics until the generate load finishes."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.get("/metrics")
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            pass
+        await asyncio.sleep(0.1)
+
+
+async def main(args):
+    generate_latencies: list[float] = []
+    probe_latencies: list[float] = []
+    errors: list[str] = []
+    stop = asyncio.Event()
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        probe = asyncio.create_task(run_probe(client, stop, probe_latencies))
+        await run_generate(client, args, generate_latencies, errors)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+
+    report = {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "elapsed_s": round(elapsed, 3),
+        "generate": summarize(generate_latencies, elapsed),
+        "metrics_probe": summarize(probe_latencies, elapsed),
+        "errors": len(errors)
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--model", default="codellama:7b-instruct")
+    parser.add_argument("--prompt", default="a function that reverses a string")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,269 @@
+"""
+Stand-in for the Ollama HTTP API, for benchmarks on machines without a GPU.
+
+Serves the endpoints the backend uses (/api/generate, /api/chat, /api/embed,
+/api/tags, /api/ps, /api/pull, /api/delete and the OpenAI-compatible
+/v1/chat/completions used by AutoGen) with deterministic output and
+configurable timing: a one-off model load, prefill time per prompt token,
+decode time per generated token and a limit on parallel requests. Timing
+fields (load_duration, prompt_eval_duration, eval_duration, eval_count) are
+reported the way Ollama reports them, and a request that passes `context`
+only pays prefill for its new prompt, like a KV-cache hit.
+
+    python benchmarks/fake_ollama.py --port 11435 --token-latency 0.01
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+
+VOCABULARY = [
+    "value", "result", "items", "index", "count", "total", "name", "data", "config", "buffer",
+    "cache", "key", "node", "path", "offset", "limit", "size", "token", "state", "record"
+]
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def completion_tokens(prompt: str, tokens: int, seed: int) -> list[str]:
+    """Deterministic pseudo-code reply for a prompt, split into token-sized pieces"""
+    rng = random.Random(hashlib.sha1(f"{seed}\0{prompt}".encode("utf-8")).hexdigest())
+    body = []
+    while len(body) < tokens:
+        a, b = rng.sample(VOCABULARY, 2)
+        body += [f"\n    {a}", " =", f" {b}", " +", f" {rng.randint(1, 99)}"]
+    return ["Here", " is", " the", " code", ":\n```", "python", "\ndef", " solution", "(", "):"] + body[:tokens] + ["\n```\n"]
+
+
+def embed_text(text: str, dim: int) -> list[float]:
+    """Hashed bag-of-words embedding: deterministic, and texts sharing words land close together"""
+    vector = [0.0] * dim
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % dim] += 1.0 if digest[4] % 2 else -1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def make_app(
+    token_latency: float = 0.005,
+    prefill_latency: float = 0.0002,
+    load_latency: float = 0.5,
+    tokens: int = 64,
+    parallel: int = 2,
+    embed_dim: int = 64,
+    embed_latency: float = 0.0005,
+    seed: int = 0
+) -> FastAPI:
+    """
+    Args:
+        token_latency: Seconds to decode one token
+        prefill_latency: Seconds to prefill one prompt token
+        load_latency: Seconds to load a model on its first use
+        tokens: Approximate tokens per reply
+        parallel: Requests processed at once (OLLAMA_NUM_PARALLEL)
+        embed_dim: Embedding dimensions
+        embed_latency: Seconds per embedded input
+        seed: Seed for reply text
+    """
+    app = FastAPI(title="Fake Ollama")
+    slots = asyncio.Semaphore(parallel)
+    installed = ["codellama:7b-instruct", "nomic-embed-text"]
+    loaded: Dict[str, float] = {}
+
+    async def load(model: str) -> int:
+        if model in loaded:
+            return 0
+        await asyncio.sleep(load_latency)
+        loaded[model] = time.time()
+        if model not in installed:
+            installed.append(model)
+        return int(load_latency * 1e9)
+
+    async def run(model: str, prompt: str, context: Optional[list[int]], stream_text: bool) -> AsyncIterator[Dict[str, Any]]:
+        """Yield token chunks then a final stats chunk, holding a parallel slot throughout"""
+        async with slots:
+            load_ns = await load(model)
+            prompt_tokens = estimate_tokens(prompt)
+            await asyncio.sleep(prompt_tokens * prefill_latency)
+            pieces = completion_tokens(prompt, tokens, seed)
+            started = time.perf_counter()
+            for piece in pieces:
+                await asyncio.sleep(token_latency)
+                if stream_text:
+                    yield {"text": piece}
+            yield {
+                "done": True,
+                "text": "" if stream_text else "".join(pieces),
+                "load_duration": load_ns,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_tokens * prefill_latency * 1e9),
+                "eval_count": len(pieces),
+                "eval_duration": int((time.perf_counter() - started) * 1e9),
+                "context": (context or []) + list(range(prompt_tokens + len(pieces)))
+            }
+
+    def ndjson(chunks: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+        async def body():
+            async for chunk in chunks:
+                yield json.dumps(chunk) + "\n"
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    def stats(final: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in final.items() if key not in ("text", "context")}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model, prompt, context = body.get("model", ""), body.get("prompt", ""), body.get("context")
+        if not prompt:
+            # Empty prompt: just load the model, like Ollama's preload
+            return {"model": model, "response": "", "done": True, "load_duration": await load(model)}
+        prompt = f"{body.get('system', '')}\n{prompt}"
+
+        if body.get("stream", True):
+            async def chunks():
+                async for chunk in run(model, prompt, context, stream_text=True):
+                    if chunk.get("done"):
+                        yield {"model": model, "response": "", **stats(chunk), "context": chunk["context"]}
+                    else:
+                        yield {"model": model, "response": chunk["text"], "done": False}
+            return ndjson(chunks())
+
+        final: Dict[str, Any] = {}
+        async for chunk in run(model, prompt, context, stream_text=False):
+            final = chunk
+        return {"model": model, "response": final["text"], **stats(final), "context": final["context"]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+
+        if body.get("stream", True):
+            async def chunks():
+                async for chunk in run(model, prompt, None, stream_text=True):
+                    if chunk.get("done"):
+                        yield {"model": model, "message": {"role": "assistant", "content": ""}, **stats(chunk)}
+                    else:
+                        yield {"model": model, "message": {"role": "assistant", "content": chunk["text"]}, "done": False}
+            return ndjson(chunks())
+
+        final: Dict[str, Any] = {}
+        async for chunk in run(model, prompt, None, stream_text=False):
+            final = chunk
+        return {"model": model, "message": {"role": "assistant", "content": final["text"]}, **stats(final)}
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        prompt = "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+        final: Dict[str, Any] = {}
+        async for chunk in run(model, prompt, None, stream_text=False):
+            final = chunk
+        return {
+            "id": f"chatcmpl-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": final["text"]},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": final["prompt_eval_count"],
+                "completion_tokens": final["eval_count"],
+                "total_tokens": final["prompt_eval_count"] + final["eval_count"]
+            }
+        }
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        load_ns = await load(body.get("model", ""))
+        await asyncio.sleep(len(inputs) * embed_latency)
+        return {
+            "model": body.get("model", ""),
+            "embeddings": [embed_text(text, embed_dim) for text in inputs],
+            "load_duration": load_ns
+        }
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name, "model": name} for name in installed]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": name, "model": name} for name in loaded]}
+
+    @app.post("/api/pull")
+    async def pull(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+
+        async def progress():
+            for completed in range(0, 101, 20):
+                await asyncio.sleep(0.01)
+                yield {"status": f"pulling {model}", "total": 100, "completed": completed}
+            if model not in installed:
+                installed.append(model)
+            yield {"status": "success"}
+
+        if body.get("stream", True):
+            return ndjson(progress())
+        async for _ in progress():
+            pass
+        return {"status": "success"}
+
+    @app.delete("/api/delete")
+    async def delete(request: Request):
+        body = await request.json()
+        model = body.get("model", "")
+        if model in installed:
+            installed.remove(model)
+        loaded.pop(model, None)
+        return Response(status_code=200)
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--prefill-latency", type=float, default=0.0002)
+    parser.add_argument("--load-latency", type=float, default=0.5)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=2)
+    parser.add_argument("--embed-dim", type=int, default=64)
+    parser.add_argument("--embed-latency", type=float, default=0.0005)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    app = make_app(
+        token_latency=args.token_latency,
+        prefill_latency=args.prefill_latency,
+        load_latency=args.load_latency,
+        tokens=args.tokens,
+        parallel=args.parallel,
+        embed_dim=args.embed_dim,
+        embed_latency=args.embed_latency,
+        seed=args.seed
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,330 @@
+"""
+Offline load test for the backend and the workspace index.
+
+Drives /generate, /review, /chat and /metrics over HTTP and runs
+ContextManager.index_files / retrieve in-process, reporting throughput,
+p50/p95/p99 latency and peak RSS per scenario. With --spawn it starts the
+fake Ollama (benchmarks/fake_ollama.py) and the API server itself, so a run
+needs no GPU and no models and is reproducible on a CPU-only box. Results
+are written as JSON; --compare diffs two result files.
+
+    python benchmarks/load.py --spawn --output results.json
+    python benchmarks/load.py --url http://localhost:8000 --ollama-url http://localhost:11435
+    python benchmarks/load.py --compare baseline.json results.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+import psutil
+
+from concurrency import summarize
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HTTP_SCENARIOS = ["generate", "review", "chat", "metrics"]
+INDEX_SCENARIOS = ["index", "retrieve"]
+
+SAMPLE_CODE = '''def merge_intervals(intervals):
+    intervals.sort()
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+'''
+
+RequestSpec = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+class RssSampler:
+    """Track the peak resident set size of a process tree from a background thread"""
+    def __init__(self, pids: list[int], interval: float = 0.05):
+        self.processes = [psutil.Process(pid) for pid in pids]
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> int:
+        total = 0
+        for process in self.processes:
+            try:
+                total += process.memory_info().rss
+                total += sum(child.memory_info().rss for child in process.children(recursive=True))
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._sample())
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / (1024 * 1024), 1)
+
+
+def request_for(scenario: str, i: int, args) -> RequestSpec:
+    """The i-th request of a scenario; variants defeat the response cache"""
+    if scenario == "generate":
+        return "POST", "/generate", {"prompt": f"a function that reverses a string (variant {i})", "model": args.model}
+    if scenario == "review":
+        return "POST", "/review", {"code": f"{SAMPLE_CODE}\n# variant {i}\n", "model": args.model}
+    if scenario == "chat":
+        payload = {"message": f"How do I merge overlapping intervals? (turn {i})", "model": args.model}
+        if args.chat_sessions:
+            payload["session_id"] = f"bench-{i % args.chat_sessions}"
+        return "POST", "/chat", payload
+    return "GET", "/metrics", None
+
+
+async def run_http_scenario(client: httpx.AsyncClient, scenario: str, args) -> Dict[str, Any]:
+    """Issue --requests requests from --concurrency workers and summarize latencies"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    errors: list[str] = []
+    headers = {} if args.cache else {"X-Cache-Bypass": "1"}
+
+    async def one(i: int):
+        method, path, payload = request_for(scenario, i, args)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=payload, headers=headers)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(str(e))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    return {**summarize(latencies, elapsed), "elapsed_s": round(elapsed, 3), "errors": len(errors)}
+
+
+def synthetic_workspace(root: str, files: int, seed: int) -> str:
+    """Write a deterministic Python package of `files` modules under root"""
+    rng = random.Random(seed)
+    words = ["parse", "load", "merge", "render", "cache", "fetch", "index", "score", "split", "flush"]
+    for n in range(files):
+        package = os.path.join(root, f"pkg{n % 10}")
+        os.makedirs(package, exist_ok=True)
+        functions = []
+        for m in range(rng.randint(4, 12)):
+            verb, noun = rng.choice(words), rng.choice(words)
+            body = "\n".join(f"    value_{k} = items[{k}] * {rng.randint(1, 9)}" for k in range(rng.randint(3, 20)))
+            functions.append(f"def {verb}_{noun}_{m}(items):\n    \"\"\"{verb.title()} the {noun} items.\"\"\"\n{body}\n    return value_0\n")
+        with open(os.path.join(package, f"module_{n}.py"), "w") as f:
+            f.write("\n\n".join(functions))
+    return root
+
+
+def run_index_scenarios(args, scenarios: list[str]) -> Dict[str, Dict[str, Any]]:
+    """Index a workspace in-process against the Ollama at --ollama-url, then time retrieval"""
+    os.environ["OLLAMA_BASE_URL"] = args.ollama_url
+    sys.path.insert(0, SERVER_DIR)
+    from context_manager import ContextManager
+
+    results: Dict[str, Dict[str, Any]] = {}
+    scratch = tempfile.mkdtemp(prefix="codehermit-bench-")
+    try:
+        workspace = args.workspace or synthetic_workspace(os.path.join(scratch, "workspace"), args.files, args.seed)
+        manager = ContextManager(workspace, persist_dir=os.path.join(scratch, ".chroma"))
+
+        with RssSampler([os.getpid()]) as rss:
+            stats = manager.index_files()
+        results["index"] = {**stats, "peak_rss_mb": rss.peak_mb}
+
+        if "retrieve" in scenarios:
+            rng = random.Random(args.seed)
+            queries = [f"{rng.choice(['merge', 'parse', 'cache', 'score'])} the items" for _ in range(args.requests)]
+            latencies: list[float] = []
+            with RssSampler([os.getpid()]) as rss:
+                started = time.perf_counter()
+                for query in queries:
+                    query_started = time.perf_counter()
+                    manager.retrieve_chunks(query, k=8)
+                    latencies.append(time.perf_counter() - query_started)
+                elapsed = time.perf_counter() - started
+            results["retrieve"] = {**summarize(latencies, elapsed), "elapsed_s": round(elapsed, 3), "peak_rss_mb": rss.peak_mb}
+        if "index" not in scenarios:
+            del results["index"]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return results
+
+
+def wait_until_up(url: str, path: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server for {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url + path, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:g}s")
+
+
+@contextlib.contextmanager
+def spawn_servers(args) -> Iterator[list[subprocess.Popen]]:
+    """Run the fake Ollama and the API server pointed at it for the duration of the block"""
+    ollama_port = int(args.ollama_url.rsplit(":", 1)[1])
+    api_port = int(args.url.rsplit(":", 1)[1])
+    processes: list[subprocess.Popen] = []
+    # Run from a scratch directory with its own static/ so the server's files stay untouched
+    with tempfile.TemporaryDirectory(prefix="codehermit-api-") as workdir:
+        try:
+            fake = subprocess.Popen([
+                sys.executable, os.path.join(SERVER_DIR, "benchmarks", "fake_ollama.py"),
+                "--port", str(ollama_port),
+                "--token-latency", str(args.token_latency),
+                "--tokens", str(args.tokens),
+                "--parallel", str(args.parallel),
+                "--seed", str(args.seed)
+            ])
+            processes.append(fake)
+            wait_until_up(args.ollama_url, "/api/tags", fake)
+            env = {
+                **os.environ,
+                "OLLAMA_BASE_URL": args.ollama_url,
+                "OLLAMA_MODEL": args.model,
+                "RESPONSE_CACHE_ENABLED": "true" if args.cache else "false",
+                "WORKSPACE_DIR": ""
+            }
+            os.makedirs(os.path.join(workdir, "static"))
+            api = subprocess.Popen(
+                [
+                    sys.executable, "-m", "uvicorn", "main:app", "--app-dir", SERVER_DIR,
+                    "--port", str(api_port), "--log-level", "warning"
+                ],
+                cwd=workdir,
+                env=env
+            )
+            processes.append(api)
+            wait_until_up(args.url, "/metrics", api)
+            yield processes
+        finally:
+            # Stop the servers before their scratch directory is removed
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+
+def run_metadata(args) -> Dict[str, Any]:
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "args": {key: value for key, value in vars(args).items() if key != "compare"}
+    }
+
+
+async def main(args) -> Dict[str, Any]:
+    scenarios = args.scenarios.split(",")
+    report: Dict[str, Any] = {"meta": run_metadata(args), "scenarios": {}}
+    servers = spawn_servers(args) if args.spawn else contextlib.nullcontext([])
+    with servers as processes:
+        server_pids = [processes[1].pid] if processes else ([args.server_pid] if args.server_pid else [])
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            for scenario in [s for s in scenarios if s in HTTP_SCENARIOS]:
+                if server_pids:
+                    with RssSampler(server_pids) as rss:
+                        result = await run_http_scenario(client, scenario, args)
+                    result["peak_rss_mb"] = rss.peak_mb
+                else:
+                    result = await run_http_scenario(client, scenario, args)
+                report["scenarios"][scenario] = result
+                print(f"{scenario}: {json.dumps(result)}", file=sys.stderr)
+
+        index_scenarios = [s for s in scenarios if s in INDEX_SCENARIOS]
+        if index_scenarios:
+            for scenario, result in run_index_scenarios(args, index_scenarios).items():
+                report["scenarios"][scenario] = result
+                print(f"{scenario}: {json.dumps(result)}", file=sys.stderr)
+    return report
+
+
+def compare(baseline_path: str, current_path: str):
+    """Print per-scenario changes between two result files"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    with open(current_path) as f:
+        current = json.load(f)["scenarios"]
+    fields = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms", "files_per_s", "chunks_per_s", "peak_rss_mb"]
+    print(f"{'scenario':<10} {'metric':<15} {'baseline':>10} {'current':>10} {'change':>8}")
+    for scenario in current:
+        for field in fields:
+            old, new = baseline.get(scenario, {}).get(field), current[scenario].get(field)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"{scenario:<10} {field:<15} {old:>10} {new:>10} {change:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--ollama-url", default="http://127.0.0.1:11435")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake Ollama and the API server")
+    parser.add_argument("--server-pid", type=int, help="API server PID, for peak RSS when not spawning")
+    parser.add_argument("--scenarios", default=",".join(HTTP_SCENARIOS + INDEX_SCENARIOS))
+    parser.add_argument("--model", default="codellama:7b-instruct")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--chat-sessions", type=int, default=4, help="Spread chat turns over N sessions (0: stateless group chat)")
+    parser.add_argument("--cache", action="store_true", help="Allow response cache hits")
+    parser.add_argument("--workspace", help="Index this directory instead of a synthetic one")
+    parser.add_argument("--files", type=int, default=200, help="Modules in the synthetic workspace")
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--tokens", type=int, default=64)
+    parser.add_argument("--parallel", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    report = asyncio.run(main(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
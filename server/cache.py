@@ -0,0 +1,173 @@
+"""
+Content-addressed response cache for deterministic generations.
+Keys hash the model, options and prompt; generation options pin a seed, so
+identical requests produce identical output and can be served from here.
+Entries live in an in-memory LRU tier and, optionally, a SQLite tier.
+Async callers use aget/aset, which keep SQLite reads and writes off the
+event loop.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sqlite_path: Optional[str] = None,
+        max_disk_entries: Optional[int] = None
+    ):
+        """
+        Args:
+            max_entries: Size bound of the in-memory LRU tier
+            ttl: Seconds before an entry expires (0 disables expiry)
+            sqlite_path: Optional path of the on-disk tier
+            max_disk_entries: Size bound of the on-disk tier
+        """
+        self.max_entries = max_entries or int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.max_disk_entries = max_disk_entries or int(os.getenv("RESPONSE_CACHE_DISK_SIZE", "10000"))
+        self._memory: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        sqlite_path = sqlite_path or os.getenv("RESPONSE_CACHE_PATH")
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(kind: str, model: str, options: Dict[str, Any], prompt: Any) -> str:
+        """Hash everything that determines the model output."""
+        material = json.dumps(
+            {"kind": kind, "model": model, "options": options, "prompt": prompt},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return bool(self.ttl) and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created = json.loads(row[0]), row[1]
+                    if not self._expired(created):
+                        self._db.execute(
+                            "UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key)
+                        )
+                        self._db.commit()
+                        self._remember(key, created, value)
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get() for async callers; with a SQLite tier the lookup runs in a worker thread."""
+        if self._db is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any):
+        """set() for async callers; with a SQLite tier the write runs in a worker thread."""
+        if self._db is None:
+            self.set(key, value)
+        else:
+            await asyncio.to_thread(self.set, key, value)
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value under key."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                # Trim least recently used rows beyond the disk bound
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, created: float, value: Any):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return stats
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None when RESPONSE_CACHE_ENABLED is false."""
+    global _cache
+    if os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() != "true":
+        return None
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
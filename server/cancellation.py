@@ -0,0 +1,104 @@
+"""
+Cancel inference when the client goes away or a request outlives its deadline.
+Handlers run their flow as a task while watching for a client disconnect;
+either event cancels the task, which unwinds through the flow: the scheduler
+slot is released, the httpx call to Ollama is closed (so Ollama stops
+generating) and AutoGen chats stop before their next agent turn.
+Streams are cut off the same way between events.
+"""
+import asyncio
+import contextlib
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Optional, Tuple, TypeVar
+
+from fastapi import Request
+
+from telemetry import CANCELLED
+
+T = TypeVar("T")
+StreamEvent = Tuple[str, Any]
+
+# Cancelled flows still unwinding (e.g. an AutoGen turn finishing) kept referenced until done
+_unwinding: set = set()
+
+
+class RequestCancelled(Exception):
+    """Raised when a request's work was cancelled; reason is "disconnect" or "deadline\""""
+    def __init__(self, reason: str, deadline: Optional[float] = None):
+        message = "Client disconnected" if reason == "disconnect" else f"Deadline of {deadline:g}s exceeded"
+        super().__init__(message)
+        self.reason = reason
+        self.deadline = deadline
+
+
+def default_deadline() -> Optional[float]:
+    """Deadline applied when a request doesn't set one (REQUEST_DEADLINE seconds, 0 for none)"""
+    return float(os.getenv("REQUEST_DEADLINE", "0")) or None
+
+
+def endpoint_of(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+async def wait_for_disconnect(request: Request, interval: Optional[float] = None):
+    """Return once the client has gone away"""
+    interval = interval or float(os.getenv("DISCONNECT_POLL_INTERVAL", "0.25"))
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def run_cancellable(request: Request, work: Awaitable[T], deadline: Optional[float] = None) -> T:
+    """Await `work`, cancelling it if the client disconnects or `deadline` seconds pass"""
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.create_task(wait_for_disconnect(request))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+
+    if task in done:
+        return task.result()
+
+    reason = "disconnect" if watcher in done else "deadline"
+    task.cancel()
+    # Let the flow unwind in the background instead of holding up the response
+    _unwinding.add(task)
+    task.add_done_callback(_unwinding.discard)
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    CANCELLED.labels(endpoint_of(request), reason).inc()
+    raise RequestCancelled(reason, deadline)
+
+
+async def guard_stream(
+    request: Request,
+    events: AsyncIterator[StreamEvent],
+    deadline: Optional[float] = None
+) -> AsyncIterator[StreamEvent]:
+    """
+    Relay a flow's events until it finishes or `deadline` seconds pass; a deadline ends the
+    stream with an error event. A client disconnect cancels the response, and with it the flow.
+    """
+    expires = time.monotonic() + deadline if deadline else None
+    try:
+        while True:
+            timeout = None if expires is None else max(0.0, expires - time.monotonic())
+            try:
+                event = await asyncio.wait_for(events.__anext__(), timeout)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                CANCELLED.labels(endpoint_of(request), "deadline").inc()
+                yield "error", {"error": str(RequestCancelled("deadline", deadline)), "cancelled": "deadline"}
+                return
+            yield event
+    except (asyncio.CancelledError, GeneratorExit):
+        CANCELLED.labels(endpoint_of(request), "disconnect").inc()
+        raise
+    finally:
+        with contextlib.suppress(BaseException):
+            await events.aclose()
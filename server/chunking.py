@@ -0,0 +1,131 @@
+"""
+Split source files into retrieval chunks.
+Python files are chunked on function and class boundaries using the AST so
+each chunk is a complete unit; other files fall back to line windows.
+Chunk IDs are derived from content, so definitions that did not change keep
+their IDs (and embeddings) when code around them moves.
+"""
+import ast
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class Chunk:
+    text: str
+    start_line: int
+    end_line: int
+    kind: str = "lines"  # function, class, module or lines
+    name: str = ""
+
+
+def chunk_lines(
+    text: str,
+    chunk_size: int = 1000,
+    start_line: int = 1,
+    kind: str = "lines",
+    name: str = ""
+) -> list[Chunk]:
+    """Split text into chunks of approximately chunk_size characters on line boundaries."""
+    chunks = []
+    current_chunk = []
+    current_size = 0
+    chunk_start = start_line
+
+    for offset, line in enumerate(text.splitlines()):
+        line_size = len(line)
+        if current_size + line_size > chunk_size and current_chunk:
+            chunks.append(Chunk("\n".join(current_chunk), chunk_start, start_line + offset - 1, kind, name))
+            current_chunk = []
+            current_size = 0
+            chunk_start = start_line + offset
+        current_chunk.append(line)
+        current_size += line_size
+
+    if current_chunk:
+        chunks.append(Chunk("\n".join(current_chunk), chunk_start, chunk_start + len(current_chunk) - 1, kind, name))
+
+    return [chunk for chunk in chunks if chunk.text.strip()]
+
+
+def _window(lines: list[str], start: int, end: int, chunk_size: int, kind: str, name: str) -> list[Chunk]:
+    """Line-window chunks for lines start..end (1-based, inclusive)."""
+    return chunk_lines("\n".join(lines[start - 1:end]), chunk_size, start, kind, name)
+
+
+def _definition_start(node: ast.AST) -> int:
+    """First line of a definition, including its decorators."""
+    return min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+
+
+def _chunk_body(
+    nodes: list[ast.stmt],
+    lines: list[str],
+    start: int,
+    end: int,
+    chunk_size: int,
+    gap_kind: str,
+    gap_name: str,
+    prefix: str,
+    chunks: list[Chunk]
+):
+    """Chunk lines start..end, giving each definition in nodes its own chunk."""
+    cursor = start
+    for node in nodes:
+        if not isinstance(node, DEFINITIONS):
+            continue
+        node_start, node_end = _definition_start(node), node.end_lineno
+        if node_start > cursor:
+            chunks.extend(_window(lines, cursor, node_start - 1, chunk_size, gap_kind, gap_name))
+
+        name = f"{prefix}{node.name}"
+        kind = "class" if isinstance(node, ast.ClassDef) else "function"
+        text = "\n".join(lines[node_start - 1:node_end])
+        if len(text) <= chunk_size:
+            chunks.append(Chunk(text, node_start, node_end, kind, name))
+        elif isinstance(node, ast.ClassDef):
+            # Large class: header and attributes as one unit, each method as its own
+            _chunk_body(node.body, lines, node_start, node_end, chunk_size, "class", name, f"{name}.", chunks)
+        else:
+            chunks.extend(_window(lines, node_start, node_end, chunk_size, kind, name))
+        cursor = node_end + 1
+
+    if cursor <= end:
+        chunks.extend(_window(lines, cursor, end, chunk_size, gap_kind, gap_name))
+
+
+def chunk_python(source: str, chunk_size: int = 1000) -> list[Chunk]:
+    """Chunk Python source on definition boundaries, falling back to lines if it doesn't parse."""
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return chunk_lines(source, chunk_size)
+    lines = source.splitlines()
+    chunks: list[Chunk] = []
+    _chunk_body(tree.body, lines, 1, len(lines), chunk_size, "module", "", "", chunks)
+    return chunks
+
+
+def chunk_file(filepath: str, text: str, chunk_size: int = 1000) -> list[Chunk]:
+    """Chunk a file with the best chunker for its type."""
+    if filepath.endswith((".py", ".pyi")):
+        return chunk_python(text, chunk_size)
+    return chunk_lines(text, chunk_size)
+
+
+def chunk_ids(filepath: str, chunks: list[Chunk], seen: Optional[dict] = None) -> list[str]:
+    """
+    Content-derived chunk IDs: identical text in the same file maps to the
+    same ID, with an occurrence suffix for repeated chunks.
+    """
+    seen = {} if seen is None else seen
+    ids = []
+    for chunk in chunks:
+        digest = hashlib.sha1(f"{filepath}\0{chunk.text}".encode("utf-8")).hexdigest()[:20]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(digest if occurrence == 0 else f"{digest}-{occurrence}")
+    return ids
@@ -0,0 +1,223 @@
+"""
+Fill-in-the-middle completions for editor inline suggestions.
+Completions bypass the agent flows: one short /api/generate call with the
+prefix and suffix windows (Ollama applies the model's FIM template), capped
+at a few dozen tokens and scheduled at interactive priority.
+Two things keep keystroke-to-suggestion latency low:
+- A prefix-keyed cache: when the user types characters that an earlier
+  completion predicted, the rest of that completion is returned without a
+  model call.
+- Per-document debounce and supersede: a request waits briefly before
+  generating, and a newer request for the same document cancels an older one
+  that is still waiting or in flight. Requests without a document ID run
+  independently.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from inference import InferenceContext
+from ollama_client import get_ollama_client
+from scheduler import get_scheduler
+
+# (model, suffix head, prefix tail)
+CacheKey = Tuple[str, str, str]
+
+
+class CompletionCache:
+    def __init__(self, max_entries: int = 512, anchor_chars: int = 256):
+        """
+        Args:
+            max_entries: Completions kept
+            anchor_chars: Prefix characters (before the cursor) that identify a cached completion
+        """
+        self.max_entries = max_entries
+        self.anchor_chars = anchor_chars
+        self._entries: "OrderedDict[CacheKey, str]" = OrderedDict()
+        self._longest = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, model: str, prefix: str, suffix: str) -> CacheKey:
+        return (model, suffix[:self.anchor_chars], prefix[-self.anchor_chars:])
+
+    def get(self, model: str, prefix: str, suffix: str) -> Optional[str]:
+        """
+        Return the rest of a cached completion whose start the user has since typed,
+        i.e. one made at an earlier cursor position in this same prefix
+        """
+        for typed in range(min(self._longest, len(prefix)) + 1):
+            key = self._key(model, prefix[:len(prefix) - typed], suffix)
+            completion = self._entries.get(key)
+            if completion is None:
+                continue
+            remainder = completion[typed:]
+            if completion.startswith(prefix[len(prefix) - typed:]) and remainder.strip():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return remainder
+        self.misses += 1
+        return None
+
+    def set(self, model: str, prefix: str, suffix: str, completion: str):
+        key = self._key(model, prefix, suffix)
+        self._entries[key] = completion
+        self._entries.move_to_end(key)
+        self._longest = max(self._longest, len(completion))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def trim_overlap(completion: str, suffix: str, max_overlap: int = 64) -> str:
+    """Drop the end of a completion that repeats the text already after the cursor"""
+    for size in range(min(len(completion), len(suffix), max_overlap), 0, -1):
+        if completion.endswith(suffix[:size]):
+            return completion[:-size]
+    return completion
+
+
+class CompletionService:
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        max_tokens: Optional[int] = None,
+        prefix_chars: Optional[int] = None,
+        suffix_chars: Optional[int] = None,
+        debounce: Optional[float] = None,
+        cache_size: Optional[int] = None
+    ):
+        """
+        Args:
+            model: FIM-capable completion model
+            max_tokens: Cap on generated tokens (num_predict)
+            prefix_chars: Characters of prefix sent to the model
+            suffix_chars: Characters of suffix sent to the model
+            debounce: Seconds to wait for further keystrokes before generating
+            cache_size: Completions kept in the prefix cache
+        """
+        self.model = model or os.getenv("COMPLETION_MODEL", "qwen2.5-coder:1.5b")
+        self.max_tokens = max_tokens or int(os.getenv("COMPLETION_MAX_TOKENS", "64"))
+        self.prefix_chars = prefix_chars or int(os.getenv("COMPLETION_PREFIX_CHARS", "3000"))
+        self.suffix_chars = suffix_chars or int(os.getenv("COMPLETION_SUFFIX_CHARS", "1000"))
+        self.debounce = debounce if debounce is not None else int(os.getenv("COMPLETION_DEBOUNCE_MS", "75")) / 1000
+        self.cache = CompletionCache(cache_size or int(os.getenv("COMPLETION_CACHE_SIZE", "512")))
+        self._latest: Dict[str, int] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._sequence = 0
+        self.superseded = 0
+
+    def options(self, inference: InferenceContext) -> Dict[str, Any]:
+        """Device options with a low temperature and a hard token cap"""
+        return {
+            **inference.options,
+            "num_predict": self.max_tokens,
+            "temperature": 0.2,
+            "top_p": 0.9,
+            "stop": ["\n\n\n", "<|endoftext|>", "<EOT>", "<|file_separator|>"]
+        }
+
+    async def complete(
+        self,
+        prefix: str,
+        suffix: str,
+        inference: InferenceContext,
+        document_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Complete the text between prefix and suffix.
+        Returns {"completion", "cached", "superseded", "elapsed_ms"}; a superseded request
+        (a newer one arrived for the same document) comes back with an empty completion.
+        """
+        started = time.perf_counter()
+        prefix = prefix[-self.prefix_chars:]
+        suffix = suffix[:self.suffix_chars]
+
+        def result(completion: str, cached: bool = False, superseded: bool = False, **extra: Any) -> Dict[str, Any]:
+            return {
+                "completion": completion,
+                "cached": cached,
+                "superseded": superseded,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+                **extra
+            }
+
+        # Only tagged requests debounce and supersede: untagged ones can't be told apart
+        if document_id:
+            self._sequence += 1
+            sequence = self._latest[document_id] = self._sequence
+            previous = self._tasks.pop(document_id, None)
+            if previous is not None:
+                previous.cancel()
+
+        if inference.use_cache:
+            cached = self.cache.get(inference.model, prefix, suffix)
+            if cached is not None:
+                if document_id:
+                    # Older requests for this document still see themselves superseded
+                    del self._latest[document_id]
+                return result(cached, cached=True)
+
+        if not document_id:
+            try:
+                completion = await self._generate(prefix, suffix, inference)
+            except Exception as e:
+                return result("", error=f"Completion failed: {str(e)}")
+        else:
+            if self.debounce:
+                await asyncio.sleep(self.debounce)
+                if self._latest.get(document_id) != sequence:
+                    self.superseded += 1
+                    return result("", superseded=True)
+
+            task = asyncio.create_task(self._generate(prefix, suffix, inference))
+            self._tasks[document_id] = task
+            try:
+                completion = await task
+            except asyncio.CancelledError:
+                if self._latest.get(document_id) == sequence:
+                    raise  # The caller went away, not a newer keystroke
+                self.superseded += 1
+                return result("", superseded=True)
+            except Exception as e:
+                return result("", error=f"Completion failed: {str(e)}")
+            finally:
+                if self._tasks.get(document_id) is task:
+                    del self._tasks[document_id]
+                    del self._latest[document_id]
+
+        if completion and inference.use_cache:
+            self.cache.set(inference.model, prefix, suffix, completion)
+        return result(completion)
+
+    async def _generate(self, prefix: str, suffix: str, inference: InferenceContext) -> str:
+        async with get_scheduler().slot(inference.model, inference.priority):
+            response = await get_ollama_client().generate(
+                model=inference.model,
+                prompt=prefix,
+                suffix=suffix,
+                options=self.options(inference)
+            )
+        return trim_overlap(response.get("response", "").rstrip(), suffix)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "in_flight": len(self._tasks),
+            "superseded": self.superseded
+        }
+
+
+_service: Optional[CompletionService] = None
+
+
+def get_completion_service() -> CompletionService:
+    """Return the process-wide completion service"""
+    global _service
+    if _service is None:
+        _service = CompletionService()
+    return _service
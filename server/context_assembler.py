@@ -0,0 +1,159 @@
+"""
+Assemble retrieved workspace context into a prompt under a token budget.
+Stages: retrieve top-k chunks, dedupe and rank them, then pack as many as
+fit in the model's context window after reserving room for the system
+message, the prompt (with the context header) and the answer. Each stage
+is timed.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from context_manager import ContextManager
+
+
+# Code tokenizes denser than prose; err on the side of overestimating so prompts fit num_ctx
+CHARS_PER_TOKEN = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3"))
+CONTEXT_HEADER = "Relevant code from the workspace:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for code and prose (CONTEXT_CHARS_PER_TOKEN characters per token)."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def render_context(text: str, prompt: str) -> str:
+    """Prefix prompt with assembled context under the header the models are given."""
+    return f"{CONTEXT_HEADER}\n\n{text}\n\n{prompt}"
+
+
+@dataclass
+class AssembledContext:
+    text: str = ""
+    chunks: list[dict] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    candidates: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        """Compact description for API responses."""
+        return {
+            "chunks": len(self.chunks),
+            "candidates": self.candidates,
+            "tokens": self.tokens,
+            "budget": self.budget,
+            "timings_ms": self.timings
+        }
+
+
+class ContextAssembler:
+    def __init__(
+        self,
+        manager: ContextManager,
+        k: Optional[int] = None,
+        reserve_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            manager: ContextManager to retrieve chunks from
+            k: Number of chunks to retrieve before ranking and packing
+            reserve_tokens: Tokens kept free for the model's answer
+        """
+        self.manager = manager
+        self.k = k or int(os.getenv("CONTEXT_TOP_K", "8"))
+        self.reserve_tokens = reserve_tokens or int(os.getenv("CONTEXT_RESERVE_TOKENS", "512"))
+
+    def budget_for(self, num_ctx: int, prompt: str, system: str = "") -> int:
+        """Tokens left for context once the system message, header, prompt and answer reserve are accounted for."""
+        overhead = estimate_tokens(render_context("", prompt)) + estimate_tokens(system)
+        return max(0, num_ctx - self.reserve_tokens - overhead)
+
+    @staticmethod
+    def _dedupe(chunks: list[dict]) -> list[dict]:
+        """Drop repeated text and chunks whose lines are covered by a better-ranked chunk."""
+        kept: list[dict] = []
+        seen_text = set()
+        for chunk in chunks:
+            digest = hashlib.md5(chunk["text"].strip().encode("utf-8")).hexdigest()
+            if digest in seen_text:
+                continue
+            metadata = chunk["metadata"]
+            covered = any(
+                other["metadata"].get("filepath") == metadata.get("filepath")
+                and other["metadata"].get("start_line", 0) <= metadata.get("start_line", -1)
+                and other["metadata"].get("end_line", 0) >= metadata.get("end_line", 1 << 30)
+                for other in kept
+            )
+            if covered:
+                continue
+            seen_text.add(digest)
+            kept.append(chunk)
+        return kept
+
+    def _format(self, chunk: dict) -> str:
+        metadata = chunk["metadata"]
+        filepath = metadata.get("filepath", "")
+        try:
+            filepath = os.path.relpath(filepath, self.manager.dir)
+        except ValueError:
+            pass
+        location = filepath
+        if "start_line" in metadata:
+            location += f":{metadata['start_line']}-{metadata['end_line']}"
+        return f"# {location}\n{chunk['text']}"
+
+    def assemble(self, query: str, num_ctx: int, prompt: str = "", system: str = "") -> AssembledContext:
+        """Retrieve, rank and pack context for query so that it fits num_ctx alongside system and prompt."""
+        result = AssembledContext(budget=self.budget_for(num_ctx, prompt, system))
+        if result.budget <= 0:
+            return result
+
+        started = time.perf_counter()
+        candidates = self.manager.retrieve_chunks(query, k=self.k)
+        retrieved = time.perf_counter()
+
+        # Candidates arrive best first; fused and lexical hits have no comparable distance
+        ranked = self._dedupe(candidates)
+        result.candidates = len(candidates)
+        deduped = time.perf_counter()
+
+        # Greedy packing in rank order; chunks that don't fit are skipped so smaller ones can
+        sections = []
+        for chunk in ranked:
+            section = self._format(chunk)
+            cost = estimate_tokens(section) + 1
+            if result.tokens + cost > result.budget:
+                continue
+            sections.append(section)
+            result.chunks.append(chunk)
+            result.tokens += cost
+        result.text = "\n\n".join(sections)
+        packed = time.perf_counter()
+
+        result.timings = {
+            "retrieve": round((retrieved - started) * 1000, 2),
+            "rank": round((deduped - retrieved) * 1000, 2),
+            "pack": round((packed - deduped) * 1000, 2)
+        }
+        return result
+
+
+_assembler: Optional[ContextAssembler] = None
+_assembler_lock = threading.Lock()
+
+
+def get_context_assembler() -> Optional[ContextAssembler]:
+    """Return the process-wide assembler for WORKSPACE_DIR, or None when no workspace is configured."""
+    global _assembler
+    workspace = os.getenv("WORKSPACE_DIR")
+    if not workspace:
+        return None
+    with _assembler_lock:
+        if _assembler is None:
+            _assembler = ContextAssembler(ContextManager(workspace, os.getenv("CHROMA_PERSIST_DIR", ".chroma")))
+        return _assembler
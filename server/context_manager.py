@@ -1,92 +1,454 @@
 """
 Scan project workspace, chunk files, embed via Ollama or external embedder,
 and store/retrieve from Chroma vector store.
+Python files are chunked on definition boundaries (see chunking.py) and
+chunk IDs are content-derived, so edits only re-embed the chunks they touch.
+Retrieval is hybrid by default: a local BM25 index and symbol table (see
+lexical_index.py) are kept in step with the collection, exact-symbol queries
+are answered from the symbol table without an embedding call, and other
+queries merge the vector and lexical rankings with reciprocal-rank fusion.
 """
 import os
-from chromadb import Client, Settings
-from chromadb.utils import embedding_functions
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, Optional, Union
+from chromadb import PersistentClient, Settings
+from embeddings import OllamaEmbedder
+from chunking import chunk_file, chunk_ids
+from lexical_index import LexicalIndex, symbol_query
+from workspace_filter import WorkspaceFilter
+from telemetry import timed_stage
 import hashlib
 
+@dataclass
+class FileUpdate:
+    """Vector store changes derived from reading and chunking one file"""
+    filepath: str
+    ids: list[str] = field(default_factory=list)
+    documents: list[str] = field(default_factory=list)
+    metadatas: list[dict] = field(default_factory=list)
+    unchanged_ids: list[str] = field(default_factory=list)
+    unchanged_metadatas: list[dict] = field(default_factory=list)
+    stale_ids: list[str] = field(default_factory=list)
+    skip_reason: str = ""
+
 class ContextManager:
-    def __init__(self, workspace_dir: str, persist_dir: str = ".chroma"):
-        """Initialize the context manager with workspace and persistence settings."""
-        self.client = Client(Settings(
-            persist_directory=persist_dir,
-            anonymized_telemetry=False
-        ))
+    def __init__(
+        self,
+        workspace_dir: str,
+        persist_dir: str = ".chroma",
+        embed_batch_size: Optional[int] = None,
+        embed_concurrency: Optional[int] = None,
+        read_workers: Optional[int] = None,
+        include: Optional[list[str]] = None,
+        exclude: Optional[list[str]] = None,
+        max_file_size: Optional[int] = None,
+        retrieval_mode: Optional[str] = None
+    ):
+        """
+        Initialize the context manager with workspace and persistence settings.
+        retrieval_mode is "hybrid" (default), "vector" or "lexical".
+        """
+        self.client = PersistentClient(
+            path=persist_dir,
+            settings=Settings(anonymized_telemetry=False)
+        )
         self.dir = workspace_dir
+        self.embed_batch_size = embed_batch_size or int(os.getenv("EMBED_BATCH_SIZE", "64"))
+        self.embed_concurrency = embed_concurrency or int(os.getenv("EMBED_CONCURRENCY", "2"))
+        self.read_workers = read_workers or int(os.getenv("INDEX_READ_WORKERS", str(min(8, os.cpu_count() or 1))))
+        self.filter = WorkspaceFilter(workspace_dir, include=include, exclude=exclude, max_file_size=max_file_size)
+        self.embedder = OllamaEmbedder(max_connections=self.embed_concurrency)
+        self.retrieval_mode = retrieval_mode or os.getenv("RETRIEVAL_MODE", "hybrid")
+        self.rrf_k = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+        self.lexical = LexicalIndex()
+        self._lexical_loaded = False
+        self._index_lock = threading.Lock()
         self.collection = self.client.get_or_create_collection(
             name="workspace_context",
-            embedding_function=embedding_functions.OllamaEmbeddingFunction(
-                model_name=os.getenv("EMBEDDING_MODEL", "codellama:7b-instruct"),
-                url="http://localhost:11434"
-            )
+            embedding_function=self.embedder
         )
 
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> list[str]:
-        """Split text into chunks of approximately chunk_size characters."""
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for line in text.splitlines():
-            line_size = len(line)
-            if current_size + line_size > chunk_size and current_chunk:
-                chunks.append("\n".join(current_chunk))
-                current_chunk = []
-                current_size = 0
-            current_chunk.append(line)
-            current_size += line_size
-        
-        if current_chunk:
-            chunks.append("\n".join(current_chunk))
-        
-        return chunks
+    def _hash_content(self, data: bytes) -> str:
+        """Generate a hash of file or chunk contents for change detection."""
+        return hashlib.md5(data).hexdigest()
+
+    def _is_indexable(self, filepath: str) -> bool:
+        """Whether a file should be indexed at all (used for watcher events)."""
+        return self.filter.accepts_path(filepath)
 
-    def _get_file_hash(self, filepath: str) -> str:
-        """Generate a hash of the file contents for change detection."""
+    def _walk_files(self):
+        """Yield indexable file paths under the workspace; excluded trees are never entered."""
+        return self.filter.walk()
+
+    def _indexed_state(self, filepaths: Optional[list[str]] = None) -> dict[str, dict]:
+        """Map indexed files (all, or just filepaths) to their stored content hash and {chunk_id: chunk_hash}."""
+        if filepaths is None:
+            existing = self.collection.get(include=["metadatas"])
+        else:
+            existing = self.collection.get(where={"filepath": {"$in": filepaths}}, include=["metadatas"])
+        state = {}
+        for chunk_id, metadata in zip(existing.get("ids") or [], existing.get("metadatas") or []):
+            if not metadata or "filepath" not in metadata:
+                continue
+            entry = state.setdefault(metadata["filepath"], {"hash": metadata.get("hash", ""), "chunks": {}})
+            entry["chunks"][chunk_id] = metadata.get("chunk_hash")
+        return state
+
+    def _prepare_file(self, filepath: str, previous: Optional[dict]) -> Optional[FileUpdate]:
+        """
+        Read, hash and chunk one file; runs on the reader pool.
+        Returns None when the file is unchanged since it was last indexed, and an
+        update with skip_reason set for oversized, binary or non-UTF-8 files.
+        """
+        previous_chunks = previous["chunks"] if previous else {}
+        if os.path.getsize(filepath) > self.filter.max_file_size:
+            return FileUpdate(filepath=filepath, stale_ids=list(previous_chunks), skip_reason="too large")
         with open(filepath, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+            data = f.read()
+        if b"\0" in data[:8192]:
+            return FileUpdate(filepath=filepath, stale_ids=list(previous_chunks), skip_reason="binary")
+        file_hash = self._hash_content(data)
+        if previous and previous["hash"] == file_hash:
+            return None
+        try:
+            text = data.decode('utf-8')
+        except UnicodeDecodeError:
+            return FileUpdate(filepath=filepath, stale_ids=list(previous_chunks), skip_reason="not utf-8")
 
-    def index_files(self):
-        """Scan workspace and index all files in the vector store."""
-        for root, _, files in os.walk(self.dir):
-            for fname in files:
-                if fname.startswith('.') or fname.endswith(('.pyc', '.git')):
-                    continue
-                    
-                filepath = os.path.join(root, fname)
+        chunks = chunk_file(filepath, text)
+        update = FileUpdate(filepath=filepath)
+        current = set()
+        for i, (chunk_id, chunk) in enumerate(zip(chunk_ids(filepath, chunks), chunks)):
+            chunk_hash = self._hash_content(chunk.text.encode('utf-8'))
+            metadata = {
+                "filepath": filepath,
+                "chunk_index": i,
+                "hash": file_hash,
+                "chunk_hash": chunk_hash,
+                "start_line": chunk.start_line,
+                "end_line": chunk.end_line,
+                "kind": chunk.kind,
+                "name": chunk.name
+            }
+            current.add(chunk_id)
+            if previous_chunks.get(chunk_id) == chunk_hash:
+                # Unchanged text keeps its ID and embedding; only positions and the file hash are refreshed
+                update.unchanged_ids.append(chunk_id)
+                update.unchanged_metadatas.append(metadata)
+            else:
+                update.ids.append(chunk_id)
+                update.documents.append(chunk.text)
+                update.metadatas.append(metadata)
+        update.stale_ids = [chunk_id for chunk_id in previous_chunks if chunk_id not in current]
+        return update
+
+    def _prepare_files(
+        self,
+        pool: ThreadPoolExecutor,
+        filepaths: Iterable[str],
+        state: dict[str, dict]
+    ) -> Iterator[tuple[str, Union[FileUpdate, None, Exception]]]:
+        """Prepare files on the reader pool, keeping a bounded window of reads in flight."""
+        window: deque[tuple[str, Future]] = deque()
+        for filepath in filepaths:
+            window.append((filepath, pool.submit(self._prepare_file, filepath, state.get(filepath))))
+            if len(window) >= self.read_workers * 2:
+                yield self._take(window)
+        while window:
+            yield self._take(window)
+
+    @staticmethod
+    def _take(window: deque) -> tuple[str, Union[FileUpdate, None, Exception]]:
+        filepath, future = window.popleft()
+        try:
+            return filepath, future.result()
+        except Exception as e:
+            return filepath, e
+
+    def remove_file(self, filepath: str):
+        """Delete every chunk that belongs to filepath."""
+        self.collection.delete(where={"filepath": filepath})
+        self.lexical.remove_file(filepath)
+
+    def _load_lexical(self, page_size: int = 1000):
+        """Rebuild the lexical index from the collection once per process; caller holds _index_lock."""
+        if self._lexical_loaded:
+            return
+        self.lexical.clear()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            self.lexical.add(ids, page.get("documents") or [], page.get("metadatas") or [])
+            if len(ids) < page_size:
+                break
+            offset += page_size
+        self._lexical_loaded = True
+
+    def _lexical_ready(self) -> bool:
+        """Load the lexical index if no indexing run is holding the lock; False if it isn't available yet."""
+        if self._lexical_loaded:
+            return True
+        if not self._index_lock.acquire(blocking=False):
+            return False
+        try:
+            self._load_lexical()
+        finally:
+            self._index_lock.release()
+        return True
+
+    def index_files(self, progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Incrementally index the workspace through a streaming pipeline.
+
+        The walker feeds a reader pool that hashes and chunks files; unchanged
+        files are skipped, and changed chunks from many files are batched up to
+        embed_batch_size and embedded with up to embed_concurrency requests in
+        flight. Chunks of files that no longer exist are deleted.
+
+        Args:
+            progress: Optional callback receiving a stats snapshot after each embedded batch
+
+        Returns:
+            dict: Counts plus elapsed time and files/s, chunks/s throughput
+        """
+        with self._index_lock:
+            self._load_lexical()
+            state = self._indexed_state()
+            stats, seen = self._run_pipeline(self._walk_files(), state, progress)
+            for filepath in set(state) - seen:
+                try:
+                    self.remove_file(filepath)
+                    stats["removed"] += 1
+                except Exception as e:
+                    print(f"Error removing {filepath}: {e}")
+            return stats
+
+    def index_paths(
+        self,
+        filepaths: Iterable[str],
+        removed: Iterable[str] = (),
+        progress: Optional[Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        Re-index only the given files, e.g. from watcher events.
+        Paths that no longer exist are treated as removed.
+        """
+        with self._index_lock:
+            self._load_lexical()
+            removed = set(removed)
+            changed = []
+            for filepath in set(filepaths) - removed:
+                if not os.path.isfile(filepath):
+                    removed.add(filepath)
+                elif self._is_indexable(filepath):
+                    changed.append(filepath)
+
+            state = self._indexed_state(changed) if changed else {}
+            stats, _ = self._run_pipeline(changed, state, progress)
+            for filepath in removed:
+                try:
+                    self.remove_file(filepath)
+                    stats["removed"] += 1
+                except Exception as e:
+                    print(f"Error removing {filepath}: {e}")
+            return stats
+
+    def _run_pipeline(
+        self,
+        filepaths: Iterable[str],
+        state: dict[str, dict],
+        progress: Optional[Callable[[dict], None]]
+    ) -> tuple[dict, set]:
+        """Read, chunk, batch and embed filepaths; return stats and the set of paths seen."""
+        seen = set()
+        stats = {
+            "files_scanned": 0,
+            "indexed": 0,
+            "unchanged": 0,
+            "removed": 0,
+            "chunks_embedded": 0,
+            "skipped": 0,
+            "errors": 0
+        }
+        started = time.perf_counter()
+        batch = FileUpdate(filepath="")
+        inflight: deque[tuple[Future, FileUpdate]] = deque()
+
+        def report() -> dict:
+            elapsed = time.perf_counter() - started
+            stats["elapsed_s"] = round(elapsed, 3)
+            stats["files_per_s"] = round(stats["files_scanned"] / elapsed, 1) if elapsed else 0.0
+            stats["chunks_per_s"] = round(stats["chunks_embedded"] / elapsed, 1) if elapsed else 0.0
+            return dict(stats)
+
+        def drain(limit: int):
+            """Store finished embedding batches until at most `limit` are outstanding."""
+            while len(inflight) > limit:
+                future, pending = inflight.popleft()
                 try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    # Generate chunks
-                    chunks = self._chunk_text(content)
-                    
-                    # Create metadata for each chunk
-                    metadatas = [{
-                        "filepath": filepath,
-                        "chunk_index": i,
-                        "hash": self._get_file_hash(filepath)
-                    } for i in range(len(chunks))]
-                    
-                    # Add to collection
-                    self.collection.add(
-                        documents=chunks,
-                        metadatas=metadatas,
-                        ids=[f"{filepath}_{i}" for i in range(len(chunks))]
+                    self.collection.upsert(
+                        ids=pending.ids,
+                        embeddings=future.result(),
+                        documents=pending.documents,
+                        metadatas=pending.metadatas
                     )
+                    self.lexical.add(pending.ids, pending.documents, pending.metadatas)
+                    stats["chunks_embedded"] += len(pending.ids)
                 except Exception as e:
-                    print(f"Error indexing {filepath}: {e}")
+                    print(f"Error embedding batch of {len(pending.ids)} chunks: {e}")
+                    stats["errors"] += 1
+                    # Drop partial files so the next run re-indexes them
+                    for filepath in {metadata["filepath"] for metadata in pending.metadatas}:
+                        self.remove_file(filepath)
+                if progress:
+                    progress(report())
 
-    def retrieve(self, query: str, k: int = 5) -> list[str]:
-        """Query the vector store and return relevant chunks."""
+        def flush(embed_pool: ThreadPoolExecutor):
+            nonlocal batch
+            if not batch.ids:
+                return
+            drain(self.embed_concurrency - 1)
+            inflight.append((embed_pool.submit(self.embedder, batch.documents), batch))
+            batch = FileUpdate(filepath="")
+
+        with ThreadPoolExecutor(self.read_workers) as reader, \
+                ThreadPoolExecutor(self.embed_concurrency) as embed_pool:
+            for filepath, update in self._prepare_files(reader, filepaths, state):
+                seen.add(filepath)
+                if isinstance(update, Exception):
+                    print(f"Error indexing {filepath}: {update}")
+                    stats["errors"] += 1
+                    continue
+                stats["files_scanned"] += 1
+                if update is None:
+                    stats["unchanged"] += 1
+                    continue
+
+                if update.skip_reason:
+                    stats["skipped"] += 1
+                else:
+                    stats["indexed"] += 1
+                if update.stale_ids:
+                    self.collection.delete(ids=update.stale_ids)
+                    self.lexical.remove(update.stale_ids)
+                if update.unchanged_ids:
+                    self.collection.update(ids=update.unchanged_ids, metadatas=update.unchanged_metadatas)
+                    self.lexical.update_metadata(update.unchanged_ids, update.unchanged_metadatas)
+                for chunk_id, document, metadata in zip(update.ids, update.documents, update.metadatas):
+                    batch.ids.append(chunk_id)
+                    batch.documents.append(document)
+                    batch.metadatas.append(metadata)
+                    if len(batch.ids) >= self.embed_batch_size:
+                        flush(embed_pool)
+            flush(embed_pool)
+            drain(0)
+
+        return report(), seen
+
+    @timed_stage("retrieval")
+    def retrieve_chunks(self, query: str, k: int = 5, mode: Optional[str] = None) -> list[dict]:
+        """
+        Return the top-k chunks for query, best first, with their metadata and distance.
+
+        Exact-symbol queries ("index_files", "ContextManager.retrieve") return the
+        defining chunks straight from the symbol table. Otherwise mode "vector" queries
+        Chroma, "lexical" uses BM25 only, and "hybrid" fuses both rankings (plus any
+        definitions named in the query) with reciprocal-rank fusion. Distance is None
+        for chunks the vector query didn't return.
+        """
+        mode = mode or self.retrieval_mode
+        if mode == "vector" or not self._lexical_ready():
+            return self._vector_chunks(query, k)
+
+        name = symbol_query(query)
+        if name:
+            hits = [self.lexical.get(chunk_id) for chunk_id in self.lexical.lookup(name)[:k]]
+            hits = [dict(hit, score=1.0, source="symbol") for hit in hits if hit]
+            if hits:
+                return hits
+
+        lexical = self.lexical.search(query, k * 2)
+        if mode == "lexical":
+            hits = [(self.lexical.get(chunk_id), score) for chunk_id, score in lexical[:k]]
+            return [dict(hit, score=round(score, 4), source="lexical") for hit, score in hits if hit]
+
+        try:
+            vector = self._vector_chunks(query, k * 2)
+        except Exception as e:
+            # Embedding backend unavailable: lexical results are still useful
+            print(f"Error querying vector store, using lexical results only: {e}")
+            vector = []
+        return self._fuse(
+            {
+                "vector": [chunk["id"] for chunk in vector],
+                "lexical": [chunk_id for chunk_id, _ in lexical],
+                "symbol": self.lexical.symbols_in(query)[:k]
+            },
+            {chunk["id"]: chunk for chunk in vector},
+            k
+        )
+
+    def _fuse(self, rankings: dict[str, list[str]], vector_hits: dict[str, dict], k: int) -> list[dict]:
+        """Reciprocal-rank fusion: each ranking adds 1 / (rrf_k + rank) to the chunks it lists."""
+        scores: dict[str, float] = {}
+        sources: dict[str, list[str]] = {}
+        for source, ids in rankings.items():
+            for rank, chunk_id in enumerate(ids, start=1):
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (self.rrf_k + rank)
+                sources.setdefault(chunk_id, []).append(source)
+
+        fused = []
+        for chunk_id in sorted(scores, key=scores.get, reverse=True):
+            chunk = vector_hits.get(chunk_id) or self.lexical.get(chunk_id)
+            if chunk is None:
+                continue
+            fused.append(dict(chunk, score=round(scores[chunk_id], 6), source="+".join(sources[chunk_id])))
+            if len(fused) == k:
+                break
+        return fused
+
+    def _vector_chunks(self, query: str, k: int) -> list[dict]:
+        """Query the vector store and return chunks with their metadata and distance."""
+        if self.collection.count() == 0:
+            return []
         results = self.collection.query(
             query_texts=[query],
-            n_results=k
+            n_results=k,
+            include=["documents", "metadatas", "distances"]
         )
         
         if not results or not results['documents']:
             return []
-            
-        return results['documents'][0]  # Return first query's results 
\ No newline at end of file
+        
+        return [
+            {"id": chunk_id, "text": text, "metadata": metadata or {}, "distance": distance, "source": "vector"}
+            for chunk_id, text, metadata, distance in zip(
+                results['ids'][0],
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0]
+            )
+        ]
+
+    def retrieve(self, query: str, k: int = 5) -> list[str]:
+        """Return the text of the top-k chunks for query (see retrieve_chunks)."""
+        return [chunk["text"] for chunk in self.retrieve_chunks(query, k)]
+
+if __name__ == "__main__":
+    # Usage: python context_manager.py <workspace_dir> [persist_dir]
+    manager = ContextManager(sys.argv[1], *sys.argv[2:3])
+    result = manager.index_files(
+        progress=lambda p: print(
+            f"\r{p['files_scanned']} files, {p['chunks_embedded']} chunks "
+            f"({p['files_per_s']} files/s, {p['chunks_per_s']} chunks/s)",
+            end="",
+            flush=True
+        )
+    )
+    print(f"\n{result}")
@@ -0,0 +1,235 @@
+"""
+Server-side conversation memory keyed by session ID.
+Each conversation keeps a rolling summary plus the most recent turns, capped
+to a token budget; older turns are folded into the summary in the background.
+The Ollama `context` returned by the last turn is kept as well, so a follow-up
+turn only prefills the new message instead of the whole history.
+Conversations live in an in-memory LRU and, optionally, a SQLite table;
+async callers use aget/asave, which read and write that table in a worker
+thread instead of on the event loop.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from context_assembler import estimate_tokens
+
+
+@dataclass
+class Conversation:
+    session_id: str
+    summary: str = ""
+    turns: list[Dict[str, str]] = field(default_factory=list)
+    # Ollama KV state covering the whole conversation so far, valid for context_key only
+    context: Optional[list[int]] = None
+    context_key: str = ""
+    updated_at: float = field(default_factory=time.time)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False, compare=False)
+    summarizing: bool = field(default=False, repr=False, compare=False)
+
+    def history_tokens(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(turn["content"]) for turn in self.turns)
+
+    def transcript(self, turns: Optional[list[Dict[str, str]]] = None) -> str:
+        return "\n\n".join(
+            f"{'User' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}"
+            for turn in (self.turns if turns is None else turns)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "summary": self.summary,
+            "turns": self.turns,
+            "context": self.context,
+            "context_key": self.context_key,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Conversation":
+        return cls(
+            session_id=data["session_id"],
+            summary=data.get("summary", ""),
+            turns=data.get("turns", []),
+            context=data.get("context"),
+            context_key=data.get("context_key", ""),
+            updated_at=data.get("updated_at", time.time())
+        )
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_sessions: Optional[int] = None,
+        token_budget: Optional[int] = None,
+        keep_turns: Optional[int] = None,
+        reserve_tokens: Optional[int] = None,
+        ttl: Optional[float] = None,
+        sqlite_path: Optional[str] = None
+    ):
+        """
+        Args:
+            max_sessions: Conversations kept in memory
+            token_budget: History tokens (summary + turns) before older turns are summarized
+            keep_turns: Most recent turns always kept verbatim
+            reserve_tokens: num_ctx headroom left for the reply when reusing KV state
+            ttl: Seconds of inactivity before a conversation is forgotten (0 keeps them forever)
+            sqlite_path: Optional path of the on-disk store
+        """
+        self.max_sessions = max_sessions or int(os.getenv("CONVERSATION_MAX_SESSIONS", "256"))
+        self.token_budget = token_budget or int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1024"))
+        self.keep_turns = keep_turns or int(os.getenv("CONVERSATION_KEEP_TURNS", "4"))
+        self.reserve_tokens = reserve_tokens or int(os.getenv("CONVERSATION_RESERVE_TOKENS", "512"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("CONVERSATION_TTL", "86400"))
+        self._memory: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        sqlite_path = sqlite_path or os.getenv("CONVERSATION_STORE_PATH")
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "session_id TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def _expired(self, conversation: Conversation) -> bool:
+        return bool(self.ttl) and time.time() - conversation.updated_at > self.ttl
+
+    def get(self, session_id: str) -> Conversation:
+        """Return the conversation for session_id, starting a new one if none is stored"""
+        conversation = self._cached(session_id)
+        if conversation is None:
+            conversation = self._adopt(session_id, self._load(session_id))
+        return conversation
+
+    async def aget(self, session_id: str) -> Conversation:
+        """get() for async callers; a conversation not in memory is read from SQLite in a worker thread"""
+        conversation = self._cached(session_id)
+        if conversation is None:
+            stored = await asyncio.to_thread(self._load, session_id) if self._db is not None else None
+            conversation = self._adopt(session_id, stored)
+        return conversation
+
+    def _cached(self, session_id: str) -> Optional[Conversation]:
+        with self._lock:
+            conversation = self._memory.get(session_id)
+            if conversation is None or self._expired(conversation):
+                return None
+            self._memory.move_to_end(session_id)
+            return conversation
+
+    def _load(self, session_id: str) -> Optional[Conversation]:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM conversations WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return Conversation.from_dict(json.loads(row[0])) if row is not None else None
+
+    def _adopt(self, session_id: str, stored: Optional[Conversation]) -> Conversation:
+        """Keep stored (or a new conversation) in memory, unless a concurrent request already did"""
+        with self._lock:
+            conversation = self._memory.get(session_id)
+            if conversation is None or self._expired(conversation):
+                conversation = stored
+            if conversation is None or self._expired(conversation):
+                conversation = Conversation(session_id=session_id)
+            self._remember(conversation)
+            return conversation
+
+    def save(self, conversation: Conversation):
+        """Persist a conversation after it changed"""
+        row = self._snapshot(conversation)
+        if row is not None:
+            self._write(row)
+
+    async def asave(self, conversation: Conversation):
+        """
+        save() for async callers: the conversation is serialized here, while the caller
+        holds its lock, and the SQLite write runs in a worker thread
+        """
+        row = self._snapshot(conversation)
+        if row is not None:
+            await asyncio.to_thread(self._write, row)
+
+    def _snapshot(self, conversation: Conversation) -> Optional[tuple]:
+        """Remember a changed conversation; returns its row for the SQLite table, if there is one"""
+        conversation.updated_at = time.time()
+        with self._lock:
+            self._remember(conversation)
+        if self._db is None:
+            return None
+        return conversation.session_id, json.dumps(conversation.to_dict()), conversation.updated_at
+
+    def _write(self, row: tuple):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversations (session_id, value, updated) VALUES (?, ?, ?)", row
+            )
+            if self.ttl:
+                self._db.execute("DELETE FROM conversations WHERE updated < ?", (time.time() - self.ttl,))
+            self._db.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._memory.pop(session_id, None)
+            if self._db is not None:
+                self._db.execute("DELETE FROM conversations WHERE session_id = ?", (session_id,))
+                self._db.commit()
+
+    def _remember(self, conversation: Conversation):
+        self._memory[conversation.session_id] = conversation
+        self._memory.move_to_end(conversation.session_id)
+        while len(self._memory) > self.max_sessions:
+            self._memory.popitem(last=False)
+
+    def needs_summary(self, conversation: Conversation) -> bool:
+        return (
+            not conversation.summarizing
+            and len(conversation.turns) > self.keep_turns
+            and conversation.history_tokens() > self.token_budget
+        )
+
+    def recent_turns(self, conversation: Conversation, budget: Optional[int] = None) -> list[Dict[str, str]]:
+        """
+        The newest turns that fit, with the summary, in budget tokens (token_budget by default).
+        Normally that is every turn since the last summary; while a summary is still
+        pending, or when recent turns are long, the oldest ones are left out of the prompt.
+        """
+        remaining = min(budget, self.token_budget) if budget is not None else self.token_budget
+        remaining -= estimate_tokens(conversation.summary)
+        kept = 0
+        for turn in reversed(conversation.turns):
+            remaining -= estimate_tokens(turn["content"])
+            if remaining < 0:
+                break
+            kept += 1
+        return conversation.turns[len(conversation.turns) - kept:]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {"sessions": len(self._memory)}
+            if self._db is not None:
+                stats["stored_sessions"] = self._db.execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+            return stats
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Return the process-wide conversation store"""
+    global _store
+    if _store is None:
+        _store = ConversationStore()
+    return _store
@@ -0,0 +1,62 @@
+"""
+Batched embedding function backed by Ollama's /api/embed endpoint.
+One HTTP call embeds a whole batch of documents over a pooled connection,
+instead of one request per document. Batches are routed across the Ollama
+backend pool like generation requests, failing over to another backend.
+"""
+import os
+from typing import Optional
+
+import httpx
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+from backend_pool import BackendPool, get_backend_pool
+from telemetry import observe_stage
+
+
+class OllamaEmbedder(EmbeddingFunction[Documents]):
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        pool: Optional[BackendPool] = None,
+        timeout: Optional[float] = None,
+        max_connections: int = 8
+    ):
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", "codellama:7b-instruct")
+        self._pool = pool
+        self._client = httpx.Client(
+            timeout=timeout or float(os.getenv("EMBEDDING_TIMEOUT", "120")),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+    def __call__(self, input: Documents) -> Embeddings:
+        """Embed a batch of documents in a single request."""
+        texts = [input] if isinstance(input, str) else list(input)
+        if not texts:
+            return []
+        pool = self._pool or get_backend_pool()
+        error: Optional[Exception] = None
+        with observe_stage("embedding"):
+            for backend in pool.failover(self.model_name):
+                try:
+                    with pool.lease(backend):
+                        response = self._client.post(
+                            f"{backend.url}/api/embed",
+                            json={"model": self.model_name, "input": texts}
+                        )
+                        response.raise_for_status()
+                    pool.record_success(backend, self.model_name)
+                    return response.json()["embeddings"]
+                except Exception as e:
+                    if not pool.record_failure(backend, e):
+                        raise
+                    error = e
+            if error is None:
+                raise RuntimeError("No Ollama backend available")
+            raise error
+
+    def close(self):
+        self._client.close()
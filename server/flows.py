@@ -3,93 +3,251 @@ Define CrewAI Flows and integrate AutoGen subroutines.
 """
 from crewai.flow.flow import Flow, start, listen
 from pydantic import BaseModel
-from autogen_client import run_autogen_chat
+from autogen_client import arun_autogen_chat
+from ollama_client import get_ollama_client
+from inference import InferenceContext
+from scheduler import Priority, get_scheduler
+from streaming import CodeBlockExtractor, extract_code
+from cache import ResponseCache, get_response_cache
+from context_assembler import AssembledContext, estimate_tokens, get_context_assembler, render_context
+from conversations import Conversation, ConversationStore, get_conversation_store
+from telemetry import timed_stage
+from typing import Any, AsyncIterator, Dict, Optional, Tuple, Union
+import asyncio
 import os
-import requests
-import json
+import time
 
 class FlowState(BaseModel):
     prompt: str = ""
     result: str = ""
     issues: list[str] = []
 
-class GenerateReviewFlow(Flow[FlowState]):
+StreamEvent = Tuple[str, Dict[str, Any]]
+
+# Fire-and-forget tasks (conversation summaries) kept referenced until they finish
+_background_tasks: set = set()
+
+def stream_stats(started: float, first_token_at: Optional[float], final: Dict[str, Any]) -> Dict[str, Any]:
+    """Latency figures for a finished token stream"""
+    return {
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "eval_count": final.get("eval_count"),
+        "eval_duration": final.get("eval_duration")
+    }
+
+class InferenceFlow(Flow[FlowState]):
+    """Flow carrying the request-scoped InferenceContext for all its steps"""
+    def __init__(self, inference: Optional[InferenceContext] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.inference = inference or InferenceContext.from_request()
+        self.context: Optional[AssembledContext] = None
+
+    async def with_context(self, query: str, prompt: str, system: str = "") -> str:
+        """Prefix prompt with workspace context packed to fit the model's num_ctx next to the system message"""
+        assembler = get_context_assembler()
+        if assembler is None:
+            return prompt
+        try:
+            self.context = await asyncio.to_thread(
+                assembler.assemble, query, self.inference.options["num_ctx"], prompt, system
+            )
+        except Exception as e:
+            print(f"Context assembly failed: {e}")
+            return prompt
+        if not self.context.text:
+            return prompt
+        return render_context(self.context.text, prompt)
+
+    async def cache_lookup(self, kind: str, prompt: Any) -> Tuple[Optional[ResponseCache], str, Any]:
+        """Return (cache, key, cached value) for a deterministic call; cache is None when bypassed"""
+        cache = get_response_cache() if self.inference.use_cache else None
+        if cache is None:
+            return None, "", None
+        key = ResponseCache.make_key(kind, self.inference.model, self.inference.options, prompt)
+        return cache, key, await cache.aget(key)
+
+class GenerateReviewFlow(InferenceFlow):
+    reviewers = {
+        "security": "You are a code reviewer focused on security and best practices.",
+        "performance": "You are a performance optimization expert.",
+        "documentation": "You are a documentation and style guide expert."
+    }
+
     @start()
-    def step_generate(self, prompt: str) -> str:
+    @timed_stage("step_generate")
+    async def step_generate(self, prompt: str) -> str:
         """⇨ call OllamaClient to generate code from prompt + context"""
         self.state.prompt = prompt
-        model = os.getenv("OLLAMA_MODEL")  # Get model from environment
+        model = self.inference.model
         
         if not model:
             return "Error: No model selected. Please select a model from the UI."
         
+        full_prompt = await self.with_context(prompt, f"Generate Python code for: {prompt}")
+        cache, key, cached = await self.cache_lookup("generate", full_prompt)
+        if cached is not None:
+            return cached
+        
         try:
-            # Call Ollama API with GPU configuration
-            response = requests.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": model,
-                    "prompt": f"Generate Python code for: {prompt}",
-                    "stream": False,
-                    "options": {
-                        "num_gpu": 1,  # Use 1 GPU
-                        "num_thread": 4,  # Adjust based on your CPU
-                        "gpu_layers": 20,  # Reduced layers for 4GB GPU
-                        "num_ctx": 2048,  # Reduced context window
-                        "num_batch": 256,  # Reduced batch size
-                        "num_gqa": 4,  # Reduced attention heads
-                        "rope_scaling": None,
-                        "temperature": 0.7,
-                        "top_p": 0.95,
-                        "top_k": 40,
-                        "repeat_penalty": 1.1,
-                        "mirostat": 0,
-                        "mirostat_eta": 0.1,
-                        "mirostat_tau": 5.0,
-                        "seed": 42
-                    }
-                }
-            )
-            response.raise_for_status()
-            result = response.json()
-            generated_code = result.get("response", "")
+            # Call Ollama API through the shared async client
+            async with get_scheduler().slot(model, self.inference.priority):
+                result = await get_ollama_client().generate(
+                    model=model,
+                    prompt=full_prompt,
+                    options=self.inference.options
+                )
             
             # Extract code block if present
-            if "```python" in generated_code:
-                code_start = generated_code.find("```python") + 9
-                code_end = generated_code.find("```", code_start)
-                generated_code = generated_code[code_start:code_end].strip()
-            
+            generated_code = extract_code(result.get("response", ""))
+            if cache is not None:
+                await cache.aset(key, generated_code)
             return generated_code
         except Exception as e:
             return f"Error generating code: {str(e)}"
 
+    async def stream_generate(self, prompt: str) -> AsyncIterator[StreamEvent]:
+        """Streaming variant of step_generate: yields token, code, done/error events"""
+        self.state.prompt = prompt
+        model = self.inference.model
+        if not model:
+            yield "error", {"error": "No model selected. Please select a model from the UI."}
+            return
+
+        full_prompt = await self.with_context(prompt, f"Generate Python code for: {prompt}")
+        cache, key, cached = await self.cache_lookup("generate", full_prompt)
+        if cached is not None:
+            self.state.result = cached
+            yield "code", {"text": cached}
+            yield "done", {"code": cached, "cached": True}
+            return
+
+        extractor = CodeBlockExtractor()
+        tokens: list[str] = []
+        final: Dict[str, Any] = {}
+        started = time.perf_counter()
+        first_token_at = None
+        try:
+            async with get_scheduler().slot(model, self.inference.priority):
+                async for chunk in get_ollama_client().generate_stream(
+                    model=model,
+                    prompt=full_prompt,
+                    options=self.inference.options
+                ):
+                    token = chunk.get("response", "")
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        tokens.append(token)
+                        yield "token", {"text": token}
+                        code = extractor.feed(token)
+                        if code:
+                            yield "code", {"text": code}
+                    if chunk.get("done"):
+                        final = chunk
+        except Exception as e:
+            yield "error", {"error": f"Error generating code: {str(e)}"}
+            return
+
+        self.state.result = extract_code("".join(tokens))
+        if cache is not None:
+            await cache.aset(key, self.state.result)
+        done = {"code": self.state.result, **stream_stats(started, first_token_at, final)}
+        if self.context:
+            done["context"] = self.context.summary()
+        yield "done", done
+
     @listen(step_generate)
-    def step_review(self, generated: str) -> str:
-        """⇨ call AutoGen via run_autogen_chat for deep critique"""
+    @timed_stage("step_review")
+    async def step_review(self, generated: str) -> Union[str, Dict[str, Any]]:
+        """
+        ⇨ critique with every reviewer persona, concurrently or as an AutoGen group chat;
+        returns {"issues": [...]} in parallel mode and the group chat's review otherwise
+        """
         self.state.result = generated
         
-        # Define system messages for AutoGen agents
-        system_messages = [
-            "You are a code reviewer focused on security and best practices.",
-            "You are a performance optimization expert.",
-            "You are a documentation and style guide expert."
-        ]
+        user_message = f"Please review this code:\n\n{generated}"
+        if os.getenv("REVIEW_MODE", "parallel").lower() == "groupchat":
+            return await self._review_groupchat(user_message)
+        return await self._review_parallel(user_message)
+
+    async def _review_groupchat(self, user_message: str) -> Union[str, Dict[str, Any]]:
+        """All reviewers take turns in one AutoGen group chat"""
+        system_messages = list(self.reviewers.values())
+        cache, key, cached = await self.cache_lookup("review", [system_messages, user_message])
+        if cached is not None:
+            return cached
         
         try:
-            # Run AutoGen chat for review
-            review = run_autogen_chat(
-                system_messages=system_messages,
-                user_message=f"Please review this code:\n\n{generated}"
-            )
+            # Run AutoGen chat for review off the event loop; cancelling stops the remaining turns
+            async with get_scheduler().slot(self.inference.model, self.inference.priority):
+                review = await arun_autogen_chat(
+                    system_messages=system_messages,
+                    user_message=user_message,
+                    inference=self.inference
+                )
+            if cache is not None and not (isinstance(review, dict) and "error" in review):
+                await cache.aset(key, review)
             return review
         except Exception as e:
             return f"Error during code review: {str(e)}"
 
+    async def _review_parallel(self, user_message: str) -> Dict[str, Any]:
+        """Each reviewer critiques independently and concurrently; issues are merged per reviewer"""
+        cache, key, cached = await self.cache_lookup("review-parallel", [self.reviewers, user_message])
+        if cached is not None:
+            return cached
+
+        timeout = float(os.getenv("REVIEW_TIMEOUT", "120"))
+        tasks = [
+            asyncio.create_task(self._run_reviewer(name, system_message, user_message, timeout))
+            for name, system_message in self.reviewers.items()
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave sibling reviewers running (and holding scheduler slots) with nobody waiting
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        review = {"issues": [issue for issues, _ in results for issue in issues]}
+        if cache is not None and all(ok for _, ok in results):
+            await cache.aset(key, review)
+        return review
+
+    async def _run_reviewer(
+        self,
+        name: str,
+        system_message: str,
+        user_message: str,
+        timeout: float
+    ) -> Tuple[list[str], bool]:
+        """Run one reviewer persona; returns (issues, succeeded)"""
+        async def critique() -> str:
+            async with get_scheduler().slot(self.inference.model, self.inference.priority):
+                result = await get_ollama_client().chat(
+                    model=self.inference.model,
+                    messages=[
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": user_message}
+                    ],
+                    options=self.inference.options
+                )
+            return result.get("message", {}).get("content", "")
+
+        try:
+            content = await asyncio.wait_for(critique(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return [f"[{name}] Review timed out after {timeout:g}s"], False
+        except Exception as e:
+            return [f"[{name}] Review failed: {str(e)}"], False
+        return [f"[{name}] {line.strip()}" for line in content.splitlines() if line.strip()], True
+
     @listen(step_review)
-    def step_finish(self, review) -> str:
+    @timed_stage("step_finish")
+    def step_finish(self, review: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
         """⇨ combine code + fixes, return final output"""
-        print(f"[DEBUG] step_finish review type: {type(review)}, value: {review}")
         if isinstance(review, dict) and 'issues' in review:
             self.state.issues = review['issues']
         elif isinstance(review, str):
@@ -105,29 +263,34 @@ class GenerateReviewFlow(Flow[FlowState]):
             "status": "success"
         }
 
-class ConversationFlow(Flow[FlowState]):
+class ConversationFlow(InferenceFlow):
+    system_messages = [
+        "You are a helpful coding assistant.",
+        "You are a technical documentation expert.",
+        "You are a debugging specialist."
+    ]
+
     @start()
-    def step_chat(self, message: str) -> str:
+    @timed_stage("step_chat")
+    async def step_chat(self, message: str) -> str:
         """Handle conversation with context awareness"""
         self.state.prompt = message
         
         # Check if model is selected
-        model = os.getenv("OLLAMA_MODEL")
+        model = self.inference.model
         if not model:
             return "Error: No model selected. Please select a model from the UI."
         
         try:
             # Use AutoGen for multi-agent conversation
-            system_messages = [
-                "You are a helpful coding assistant.",
-                "You are a technical documentation expert.",
-                "You are a debugging specialist."
-            ]
-            
-            response = run_autogen_chat(
-                system_messages=system_messages,
-                user_message=message
-            )
+            # Each agent sees its own system message; leave room for the longest
+            user_message = await self.with_context(message, message, max(self.system_messages, key=len))
+            async with get_scheduler().slot(model, self.inference.priority):
+                response = await arun_autogen_chat(
+                    system_messages=self.system_messages,
+                    user_message=user_message,
+                    inference=self.inference
+                )
             
             # Handle different response types
             if isinstance(response, dict):
@@ -139,4 +302,162 @@ class ConversationFlow(Flow[FlowState]):
             return str(response)
             
         except Exception as e:
-            return f"Error during chat: {str(e)}" 
\ No newline at end of file
+            return f"Error during chat: {str(e)}"
+
+    async def stream_chat(self, message: str) -> AsyncIterator[StreamEvent]:
+        """
+        Streaming chat: a single assistant turn via Ollama /api/chat.
+        Group chat turns can't be streamed token by token, so the primary persona answers.
+        """
+        self.state.prompt = message
+        model = self.inference.model
+        if not model:
+            yield "error", {"error": "No model selected. Please select a model from the UI."}
+            return
+
+        messages = [
+            {"role": "system", "content": self.system_messages[0]},
+            {"role": "user", "content": await self.with_context(message, message, self.system_messages[0])}
+        ]
+        tokens: list[str] = []
+        final: Dict[str, Any] = {}
+        started = time.perf_counter()
+        first_token_at = None
+        try:
+            async with get_scheduler().slot(model, self.inference.priority):
+                async for chunk in get_ollama_client().chat_stream(
+                    model=model,
+                    messages=messages,
+                    options=self.inference.options
+                ):
+                    token = chunk.get("message", {}).get("content", "")
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        tokens.append(token)
+                        yield "token", {"text": token}
+                    if chunk.get("done"):
+                        final = chunk
+        except Exception as e:
+            yield "error", {"error": f"Error during chat: {str(e)}"}
+            return
+
+        self.state.result = "".join(tokens)
+        yield "done", {"response": self.state.result, **stream_stats(started, first_token_at, final)}
+
+    async def session_chat(self, message: str, session_id: str) -> Tuple[str, Dict[str, Any]]:
+        """Non-streaming session chat; returns (response or error text, done event data)"""
+        tokens: list[str] = []
+        async for event, data in self.stream_session_chat(message, session_id):
+            if event == "token":
+                tokens.append(data["text"])
+            elif event == "error":
+                return f"Error: {data['error']}", {}
+            elif event == "done":
+                return data["response"], data
+        return "".join(tokens), {}
+
+    async def stream_session_chat(self, message: str, session_id: str) -> AsyncIterator[StreamEvent]:
+        """
+        Streaming chat with server-side memory for session_id.
+        A turn with no usable KV state prefills the rolling summary and recent turns;
+        follow-up turns pass Ollama's returned `context`, so only the new message is prefilled.
+        """
+        self.state.prompt = message
+        model = self.inference.model
+        if not model:
+            yield "error", {"error": "No model selected. Please select a model from the UI."}
+            return
+
+        store = get_conversation_store()
+        conversation = await store.aget(session_id)
+        user_message = await self.with_context(message, message, f"{self.system_messages[0]}\n\n{conversation.summary}")
+        context_key = f"{model}:{self.inference.device}"
+        tokens: list[str] = []
+        final: Dict[str, Any] = {}
+        started = time.perf_counter()
+        first_token_at = None
+        async with conversation.lock:
+            # Reuse the KV state while it (plus this turn and the reply) still fits in num_ctx
+            limit = self.inference.options["num_ctx"] - store.reserve_tokens - estimate_tokens(user_message)
+            reuse = bool(conversation.context) and conversation.context_key == context_key and len(conversation.context) <= limit
+            if reuse:
+                request = {"prompt": user_message, "context": conversation.context}
+            else:
+                system = self.system_messages[0]
+                if conversation.summary:
+                    system += f"\n\nSummary of the earlier conversation:\n{conversation.summary}"
+                # Without KV state the whole history is prefilled, so cap it to the budget
+                turns = store.recent_turns(conversation, limit - estimate_tokens(self.system_messages[0]))
+                history = conversation.transcript(turns)
+                prompt = f"Conversation so far:\n\n{history}\n\nUser: {user_message}" if history else user_message
+                request = {"prompt": prompt, "system": system}
+            try:
+                async with get_scheduler().slot(model, self.inference.priority):
+                    async for chunk in get_ollama_client().generate_stream(
+                        model=model,
+                        options=self.inference.options,
+                        **request
+                    ):
+                        token = chunk.get("response", "")
+                        if token:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                            tokens.append(token)
+                            yield "token", {"text": token}
+                        if chunk.get("done"):
+                            final = chunk
+            except Exception as e:
+                yield "error", {"error": f"Error during chat: {str(e)}"}
+                return
+
+            self.state.result = "".join(tokens)
+            conversation.turns.append({"role": "user", "content": message})
+            conversation.turns.append({"role": "assistant", "content": self.state.result})
+            conversation.context = final.get("context")
+            conversation.context_key = context_key
+            await store.asave(conversation)
+
+        if store.needs_summary(conversation):
+            conversation.summarizing = True
+            task = asyncio.create_task(self._summarize(conversation, store))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+        yield "done", {
+            "response": self.state.result,
+            **stream_stats(started, first_token_at, final),
+            "session": {
+                "session_id": session_id,
+                "turns": len(conversation.turns),
+                "summarized": bool(conversation.summary),
+                "reused_context": reuse,
+                "prompt_eval_count": final.get("prompt_eval_count")
+            }
+        }
+
+    async def _summarize(self, conversation: Conversation, store: ConversationStore):
+        """Fold all but the most recent turns into the rolling summary"""
+        try:
+            older = conversation.turns[:-store.keep_turns]
+            prompt = (
+                "Update the summary of this conversation between a user and a coding assistant. "
+                "Keep decisions, code identifiers and open questions; be concise.\n\n"
+                f"Current summary:\n{conversation.summary or '(none)'}\n\n"
+                f"New turns:\n{conversation.transcript(older)}\n\nUpdated summary:"
+            )
+            async with get_scheduler().slot(self.inference.model, Priority.BATCH):
+                result = await get_ollama_client().generate(
+                    model=self.inference.model,
+                    prompt=prompt,
+                    options=self.inference.options
+                )
+            async with conversation.lock:
+                conversation.summary = result.get("response", "").strip()
+                # Only appends happen meanwhile, so the summarized turns are still the oldest ones
+                conversation.turns = conversation.turns[len(older):]
+                await store.asave(conversation)
+        except Exception as e:
+            print(f"Error summarizing conversation {conversation.session_id}: {e}")
+        finally:
+            conversation.summarizing = False
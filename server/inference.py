@@ -0,0 +1,45 @@
+"""
+Request-scoped inference settings.
+An InferenceContext is built once per API request and passed down through
+the flows and AutoGen helpers, so concurrent requests never share state.
+"""
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from ollama_client import DEFAULT_OPTIONS
+from scheduler import Priority
+
+
+@dataclass(frozen=True)
+class InferenceContext:
+    model: str
+    device: str = "gpu"
+    use_cache: bool = True
+    priority: Priority = Priority.STANDARD
+
+    @classmethod
+    def from_request(
+        cls,
+        model: Optional[str] = None,
+        device: Optional[str] = None,
+        default_model: Optional[str] = None,
+        use_cache: bool = True,
+        priority: Priority = Priority.STANDARD
+    ) -> "InferenceContext":
+        """Build a context from request fields, falling back to configured defaults."""
+        return cls(
+            model=model or default_model or os.getenv("OLLAMA_MODEL", ""),
+            device=(device or os.getenv("OLLAMA_DEVICE", "gpu")).lower(),
+            use_cache=use_cache,
+            priority=priority
+        )
+
+    @property
+    def options(self) -> Dict[str, Any]:
+        """Ollama options for this request's device."""
+        options = dict(DEFAULT_OPTIONS)
+        if self.device == "cpu":
+            options["num_gpu"] = 0
+            options["gpu_layers"] = 0
+        return options
@@ -0,0 +1,118 @@
+"""
+In-process background jobs with progress reporting.
+Long operations (model pulls, resets, warm-ups) run as asyncio tasks so
+API requests return immediately with a job id that can be polled.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "queued"  # queued, running, succeeded, failed
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def update(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """Report progress (0..1) and/or a status message"""
+        if progress is not None:
+            self.progress = max(0.0, min(1.0, progress))
+        if message is not None:
+            self.message = message
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+JobFunc = Callable[[Job], Awaitable[Any]]
+
+
+class JobManager:
+    def __init__(self, max_history: Optional[int] = None):
+        """
+        Args:
+            max_history: Finished jobs kept for polling before the oldest are dropped
+        """
+        self.max_history = max_history or int(os.getenv("JOB_HISTORY", "100"))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, kind: str, func: JobFunc) -> Job:
+        """Start `func(job)` in the background and return its job record"""
+        job = Job(id=uuid.uuid4().hex[:12], kind=kind)
+        self._jobs[job.id] = job
+        self._tasks[job.id] = asyncio.create_task(self._run(job, func))
+        self._prune()
+        return job
+
+    async def _run(self, job: Job, func: JobFunc):
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            job.result = await func(job)
+            job.status = "succeeded"
+            job.update(1.0, "done")
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "cancelled"
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"Job {job.kind} {job.id} failed: {e}")
+        finally:
+            job.finished_at = time.time()
+            self._tasks.pop(job.id, None)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self, kind: Optional[str] = None) -> list[Job]:
+        return [job for job in self._jobs.values() if kind is None or job.kind == kind]
+
+    def running(self, kind: str) -> Optional[Job]:
+        """The unfinished job of this kind, if any"""
+        return next((job for job in self._jobs.values() if job.kind == kind and not job.done), None)
+
+    async def wait(self, job_id: str):
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def shutdown(self):
+        """Cancel jobs that are still running"""
+        for task in list(self._tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Return the process-wide job manager"""
+    global _manager
+    if _manager is None:
+        _manager = JobManager()
+    return _manager
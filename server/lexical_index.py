@@ -0,0 +1,206 @@
+"""
+In-memory lexical index over workspace chunks, kept next to the vector store.
+- BM25 over identifier-aware tokens: `retrieve_chunks` is indexed as
+  "retrieve_chunks", "retrieve" and "chunks", and camelCase is split the
+  same way, so exact names and their parts both match.
+- A symbol table of Python definitions (qualified "Class.method" and bare
+  "method" names) for exact lookups that need no embedding at all.
+The index lives in memory only; ContextManager rebuilds it from the Chroma
+collection on first use and keeps it in step with every upsert and delete.
+"""
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|[0-9]+")
+WORD_PART = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+# A query that is nothing but a (possibly dotted) name, e.g. "ContextManager.index_files()"
+SYMBOL_QUERY = re.compile(r"^(?:def |class )?([A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*)(?:\(\))?$")
+SYMBOL_KINDS = ("function", "class")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased identifiers plus their snake_case and camelCase parts"""
+    terms = []
+    for word in IDENTIFIER.findall(text):
+        if len(word) > 1:
+            terms.append(word.lower())
+        parts = [part.lower() for piece in word.split("_") for part in WORD_PART.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def symbol_query(query: str) -> Optional[str]:
+    """The name an exact-symbol query asks for, or None for anything else"""
+    match = SYMBOL_QUERY.match(query.strip())
+    return match.group(1) if match else None
+
+
+def symbol_keys(metadata: Dict[str, Any]) -> set:
+    """Names a chunk is found under in the symbol table"""
+    name = metadata.get("name") or ""
+    if metadata.get("kind") not in SYMBOL_KINDS or not name:
+        return set()
+    return {name, name.rsplit(".", 1)[-1]}
+
+
+@dataclass
+class IndexedChunk:
+    text: str
+    metadata: Dict[str, Any]
+    terms: Counter
+    length: int
+    symbols: set = field(default_factory=set)
+
+
+class LexicalIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        """
+        Args:
+            k1: BM25 term-frequency saturation
+            b: BM25 document-length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._chunks: Dict[str, IndexedChunk] = {}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._symbols: Dict[str, set] = defaultdict(set)
+        self._files: Dict[str, set] = defaultdict(set)
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    def add(self, ids: Iterable[str], documents: Iterable[str], metadatas: Iterable[Dict[str, Any]]):
+        """Index chunks, replacing any already indexed under the same ID"""
+        with self._lock:
+            for chunk_id, text, metadata in zip(ids, documents, metadatas):
+                self._discard(chunk_id)
+                terms = Counter(tokenize(text))
+                chunk = IndexedChunk(text, dict(metadata or {}), terms, sum(terms.values()))
+                self._chunks[chunk_id] = chunk
+                self._total_length += chunk.length
+                for term, count in terms.items():
+                    self._postings[term][chunk_id] = count
+                self._link(chunk_id, chunk)
+
+    def update_metadata(self, ids: Iterable[str], metadatas: Iterable[Dict[str, Any]]):
+        """Refresh positions and names of chunks whose text didn't change"""
+        with self._lock:
+            for chunk_id, metadata in zip(ids, metadatas):
+                chunk = self._chunks.get(chunk_id)
+                if chunk is None:
+                    continue
+                self._unlink(chunk_id, chunk)
+                chunk.metadata = dict(metadata)
+                self._link(chunk_id, chunk)
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for chunk_id in ids:
+                self._discard(chunk_id)
+
+    def remove_file(self, filepath: str):
+        with self._lock:
+            for chunk_id in list(self._files.get(filepath, ())):
+                self._discard(chunk_id)
+
+    def clear(self):
+        with self._lock:
+            self._chunks.clear()
+            self._postings.clear()
+            self._symbols.clear()
+            self._files.clear()
+            self._total_length = 0
+
+    def _link(self, chunk_id: str, chunk: IndexedChunk):
+        chunk.symbols = symbol_keys(chunk.metadata)
+        for key in chunk.symbols:
+            self._symbols[key].add(chunk_id)
+        self._files[chunk.metadata.get("filepath", "")].add(chunk_id)
+
+    def _unlink(self, chunk_id: str, chunk: IndexedChunk):
+        for key in chunk.symbols:
+            self._drop(self._symbols, key, chunk_id)
+        self._drop(self._files, chunk.metadata.get("filepath", ""), chunk_id)
+
+    def _discard(self, chunk_id: str):
+        chunk = self._chunks.pop(chunk_id, None)
+        if chunk is None:
+            return
+        self._total_length -= chunk.length
+        for term in chunk.terms:
+            self._drop(self._postings, term, chunk_id)
+        self._unlink(chunk_id, chunk)
+
+    @staticmethod
+    def _drop(table: dict, key: str, chunk_id: str):
+        entries = table.get(key)
+        if entries is None:
+            return
+        if isinstance(entries, dict):
+            entries.pop(chunk_id, None)
+        else:
+            entries.discard(chunk_id)
+        if not entries:
+            del table[key]
+
+    def search(self, query: str, k: int = 5) -> list[tuple[str, float]]:
+        """Top-k (chunk ID, BM25 score) pairs for query"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._chunks or not terms:
+                return []
+            count = len(self._chunks)
+            average = self._total_length / count or 1.0
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, frequency in postings.items():
+                    length = self._chunks[chunk_id].length
+                    norm = self.k1 * (1 - self.b + self.b * length / average)
+                    scores[chunk_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def lookup(self, name: str) -> list[str]:
+        """IDs of chunks defining `name`, qualified matches first, in file order"""
+        with self._lock:
+            ids = list(self._symbols.get(name, ()))
+            return sorted(ids, key=lambda chunk_id: (
+                self._chunks[chunk_id].metadata.get("name") != name,
+                self._chunks[chunk_id].metadata.get("filepath", ""),
+                self._chunks[chunk_id].metadata.get("start_line", 0)
+            ))
+
+    def symbols_in(self, query: str) -> list[str]:
+        """IDs of chunks defining any name mentioned in a free-text query"""
+        ids: list[str] = []
+        for name in dict.fromkeys(re.findall(r"[A-Za-z_][A-Za-z0-9_.]*[A-Za-z0-9_]", query)):
+            ids.extend(chunk_id for chunk_id in self.lookup(name) if chunk_id not in ids)
+        return ids
+
+    def get(self, chunk_id: str) -> Optional[dict]:
+        """Chunk in the shape ContextManager.retrieve_chunks returns"""
+        with self._lock:
+            chunk = self._chunks.get(chunk_id)
+            if chunk is None:
+                return None
+            return {"id": chunk_id, "text": chunk.text, "metadata": dict(chunk.metadata), "distance": None}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chunks": len(self._chunks),
+                "terms": len(self._postings),
+                "symbols": len(self._symbols),
+                "files": len(self._files)
+            }
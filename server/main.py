@@ -1,21 +1,50 @@
 """
 FastAPI backend for Local Code Assistant
 - /generate: CrewAI GenerateReviewFlow
-- /review:   CrewAI + AutoGen deep critique
+- /review:   CrewAI + AutoGen deep critique of supplied code
+- /generate/review: generate, then critique the result
 - /chat:     ConversationFlow
+- /complete: fill-in-the-middle inline completions for the editor
+- /review/batch: background review of files/directories, streamed per file
+- /generate/stream, /chat/stream: token streaming over SSE
+- session_id on /chat and /chat/stream: server-side conversation memory
+- /models, /models/loaded: installed and in-memory Ollama models
+- /backends: health and load of each Ollama backend in the pool
+- /reset, /models/pull: background jobs, polled via /jobs/{job_id}
 - /metrics:  Prometheus CPU/GPU stats
+- /metrics/history: recent background-sampled CPU/GPU stats
+- /metrics/prometheus: request, stage and token metrics in Prometheus text format
+- deadline / X-Request-Timeout on inference endpoints: cancel the work when it runs over;
+  work is also cancelled when the client disconnects
 Load settings from .env via python-dotenv
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Depends, Header, HTTPException, Request, Response
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic_settings import BaseSettings
 from pydantic import BaseModel
 from flows import GenerateReviewFlow, ConversationFlow
-import psutil
+from ollama_client import close_ollama_client
+from backend_pool import get_backend_pool
+from inference import InferenceContext
+from scheduler import Priority, QueueFull, get_scheduler
+from streaming import sse_event
+from cancellation import RequestCancelled, default_deadline, guard_stream, run_cancellable
+from cache import get_response_cache
+from autogen_client import get_agent_pool
+from conversations import get_conversation_store
+from context_assembler import get_context_assembler
+from watcher import WorkspaceWatcher
+from system_metrics import get_sampler
+from model_registry import get_model_registry
+from jobs import Job, get_job_manager
+from completion import get_completion_service
+from batch_review import BatchReview, collect_files, get_batch, register_batch
+from telemetry import RequestMetricsMiddleware, render_latest
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import subprocess
 from dotenv import load_dotenv
 from typing import Optional, List
 
@@ -24,22 +53,143 @@ class Settings(BaseSettings):
     UV_PORT: int = 8000
     METRICS_ENABLED: bool = True
     GPU_ENABLED: bool = True
+    WATCH_WORKSPACE: bool = False
+    WARMUP_ON_STARTUP: bool = True
 
 class PromptRequest(BaseModel):
     prompt: str
     model: Optional[str] = None
     device: Optional[str] = "gpu"  # Default to GPU
 
+class ReviewRequest(BaseModel):
+    code: Optional[str] = None
+    prompt: Optional[str] = None  # Older clients send the code to review as `prompt`
+    model: Optional[str] = None
+    device: Optional[str] = "gpu"  # Default to GPU
+
+class CompletionRequest(BaseModel):
+    prefix: str  # Text before the cursor
+    suffix: str = ""  # Text after the cursor
+    document_id: Optional[str] = None  # Newer requests for the same document supersede older ones
+    model: Optional[str] = None
+    device: Optional[str] = "gpu"
+
+class BatchReviewRequest(BaseModel):
+    paths: List[str]  # Files and/or directories, relative to WORKSPACE_DIR unless absolute
+    model: Optional[str] = None
+    device: Optional[str] = "gpu"
+
+class PullRequest(BaseModel):
+    model: str
+
 class MessageRequest(BaseModel):
     message: str
     model: Optional[str] = None
     device: Optional[str] = "gpu"  # Default to GPU
+    session_id: Optional[str] = None  # Keep server-side history for this conversation
 
 # Load environment variables
 load_dotenv()
 settings = Settings()
 
-app = FastAPI(title="Local Code Assistant API")
+def cache_bypass(
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None)
+) -> bool:
+    """True when the caller asked for fresh output via Cache-Control: no-cache or X-Cache-Bypass"""
+    if x_cache_bypass and x_cache_bypass.lower() in ("1", "true", "yes"):
+        return True
+    return bool(cache_control) and "no-cache" in cache_control.lower()
+
+def request_deadline(
+    deadline: Optional[float] = None,
+    x_request_timeout: Optional[float] = Header(None)
+) -> Optional[float]:
+    """Seconds the request may run, from ?deadline= or X-Request-Timeout, else REQUEST_DEADLINE"""
+    return deadline or x_request_timeout or default_deadline()
+
+def inference_context(
+    request,
+    bypass_cache: bool = False,
+    priority: Priority = Priority.STANDARD,
+    default_model: Optional[str] = None
+) -> InferenceContext:
+    """Build the per-request model/device settings, rejecting the request early if the queue is full"""
+    get_scheduler().check_admission(priority)
+    return InferenceContext.from_request(
+        model=request.model,
+        device=request.device,
+        default_model=default_model or settings.OLLAMA_MODEL,
+        use_cache=not bypass_cache,
+        priority=priority
+    )
+
+async def pull_with_progress(job: Job, model: str):
+    """Pull `model`, mirroring Ollama's download progress onto the job"""
+    return await get_model_registry().pull(model, progress=lambda fraction, status: job.update(fraction, status))
+
+async def reset_model(job: Job, model: str):
+    """Remove, re-pull and reload `model`"""
+    registry = get_model_registry()
+    job.update(0.0, "removing")
+    try:
+        await registry.remove(model)
+    except Exception as e:
+        print(f"Error removing {model}: {e}")
+    await pull_with_progress(job, model)
+    job.update(1.0, "loading")
+    await registry.warm(model)
+    return {"model": model}
+
+async def warm_models(job: Job, embedding_model: Optional[str]):
+    """Load the configured generation (and embedding) model so the first request doesn't pay for it"""
+    registry = get_model_registry()
+    loaded = []
+    job.update(0.0, f"loading {settings.OLLAMA_MODEL}")
+    await registry.warm(settings.OLLAMA_MODEL)
+    loaded.append(settings.OLLAMA_MODEL)
+    if embedding_model and embedding_model != settings.OLLAMA_MODEL:
+        job.update(0.5, f"loading {embedding_model}")
+        await registry.warm_embedding(embedding_model)
+        loaded.append(embedding_model)
+    completion_model = get_completion_service().model
+    if completion_model not in loaded:
+        job.update(0.75, f"loading {completion_model}")
+        try:
+            await registry.warm(completion_model)
+            loaded.append(completion_model)
+        except Exception as e:
+            # Inline completions are optional; don't fail the warm-up if the model isn't pulled
+            print(f"Error loading completion model {completion_model}: {e}")
+    return {"loaded": loaded}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm models, index the configured workspace and start metrics sampling on startup; release pooled Ollama connections on shutdown"""
+    watcher = None
+    get_backend_pool().start()
+    if settings.METRICS_ENABLED:
+        get_sampler().start()
+    assembler = get_context_assembler()
+    if settings.WARMUP_ON_STARTUP:
+        embedding_model = assembler.manager.embedder.model_name if assembler is not None else None
+        app.state.warmup_job = get_job_manager().submit("warmup", lambda job: warm_models(job, embedding_model))
+    if assembler is not None:
+        # Index in the background so startup isn't blocked on embedding
+        app.state.index_task = asyncio.create_task(asyncio.to_thread(assembler.manager.index_files))
+        if settings.WATCH_WORKSPACE:
+            watcher = WorkspaceWatcher(assembler.manager)
+            watcher.start()
+    yield
+    if watcher is not None:
+        # stop() indexes pending events, which must not block the event loop
+        await asyncio.to_thread(watcher.stop)
+    get_sampler().stop()
+    await get_job_manager().shutdown()
+    await close_ollama_client()
+    get_backend_pool().stop()
+
+app = FastAPI(title="Local Code Assistant API", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -50,9 +200,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Plain ASGI middleware rather than @app.middleware("http"), which hides client disconnects from handlers
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.exception_handler(QueueFull)
+async def queue_full(request: Request, exc: QueueFull):
+    """Backpressure: tell the client to come back once the queue has drained"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(RequestCancelled)
+async def request_cancelled(request: Request, exc: RequestCancelled):
+    """499 (client closed request) after a disconnect, 504 after the request's deadline"""
+    return JSONResponse(
+        status_code=499 if exc.reason == "disconnect" else 504,
+        content={"detail": str(exc), "cancelled": exc.reason}
+    )
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def event_stream(events, request: Optional[Request] = None, deadline: Optional[float] = None) -> StreamingResponse:
+    """Wrap a flow's (event, data) stream as an SSE response, cut off at the deadline if given"""
+    if request is not None:
+        events = guard_stream(request, events, deadline)
+
+    async def body():
+        async for event, data in events:
+            yield sse_event(event, data)
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/")
 async def root():
     """Serve the web interface"""
@@ -60,97 +244,225 @@ async def root():
 
 @app.post("/reset")
 async def reset_app():
-    """Reset the application state"""
-    try:
-        # Reset Ollama model
-        subprocess.run(['ollama', 'rm', settings.OLLAMA_MODEL], capture_output=True)
-        subprocess.run(['ollama', 'pull', settings.OLLAMA_MODEL], capture_output=True)
-        return {"status": "success", "message": "Application reset successfully"}
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
+    """Re-download and reload the configured model as a background job"""
+    jobs = get_job_manager()
+    job = jobs.running("reset") or jobs.submit("reset", lambda job: reset_model(job, settings.OLLAMA_MODEL))
+    return {"status": "accepted", "message": "Reset started", "job_id": job.id}
+
+@app.post("/models/pull")
+async def pull_model(request: PullRequest):
+    """Download a model as a background job; poll /jobs/{job_id} for progress"""
+    job = get_job_manager().submit("pull", lambda job: pull_with_progress(job, request.model))
+    return {"status": "accepted", "job_id": job.id}
+
+@app.get("/jobs")
+async def list_jobs(kind: Optional[str] = None) -> List[dict]:
+    """List recent background jobs"""
+    return [job.to_dict() for job in get_job_manager().list(kind)]
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str) -> dict:
+    """Get a background job's status and progress"""
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
 
 @app.get("/models")
-async def get_models() -> List[str]:
-    """Get list of available Ollama models"""
+async def get_models(refresh: bool = False) -> List[str]:
+    """Get list of available Ollama models (cached; pass refresh=true to re-query)"""
     try:
-        result = subprocess.run(['ollama', 'list'], capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.strip().split('\n')[1:]  # Skip header
-            models = [line.split()[0] for line in lines if line.strip()]
-            return models
+        return await get_model_registry().names(refresh)
+    except Exception as e:
+        print(f"Error listing models: {e}")
         return []
+
+@app.get("/models/loaded")
+async def get_loaded_models(refresh: bool = False) -> List[dict]:
+    """Get the models Ollama currently has in memory"""
+    try:
+        return await get_model_registry().loaded(refresh)
     except Exception as e:
+        print(f"Error listing loaded models: {e}")
         return []
 
+@app.get("/backends")
+async def get_backends():
+    """Health, outstanding requests and loaded models of each Ollama backend"""
+    return get_backend_pool().stats()
+
 @app.post("/generate")
-async def generate(request: PromptRequest):
+async def generate(
+    request: PromptRequest,
+    http_request: Request,
+    bypass: bool = Depends(cache_bypass),
+    deadline: Optional[float] = Depends(request_deadline)
+):
     """⇨ CREWAI FLOW: launch GenerateReviewFlow with one Coder agent"""
-    flow = GenerateReviewFlow(state={})
-    # Set model and device as env vars for this request
-    if request.model:
-        os.environ["OLLAMA_MODEL"] = request.model
-    if request.device:
-        os.environ["OLLAMA_DEVICE"] = request.device
-    result = flow.step_generate(request.prompt)
+    flow = GenerateReviewFlow(state={}, inference=inference_context(request, bypass))
+    result = await run_cancellable(http_request, flow.step_generate(request.prompt), deadline)
     # Always return a dict
     if isinstance(result, dict):
         return result
-    return {"code": result, "issues": [], "status": "success"}
+    response = {"code": result, "issues": [], "status": "success"}
+    if flow.context:
+        response["context"] = flow.context.summary()
+    return response
+
+@app.post("/generate/stream")
+async def generate_stream(
+    request: PromptRequest,
+    http_request: Request,
+    bypass: bool = Depends(cache_bypass),
+    deadline: Optional[float] = Depends(request_deadline)
+):
+    """Stream generation tokens as Server-Sent Events (token, code, done, error)"""
+    flow = GenerateReviewFlow(state={}, inference=inference_context(request, bypass))
+    return event_stream(flow.stream_generate(request.prompt), http_request, deadline)
 
 @app.post("/review")
-async def review(request: PromptRequest):
-    """⇨ CREWAI + AUTOGEN: run deep multi-agent critique"""
-    flow = GenerateReviewFlow(state={})
-    if request.model:
-        os.environ["OLLAMA_MODEL"] = request.model
-    if request.device:
-        os.environ["OLLAMA_DEVICE"] = request.device
-    result = flow.step_generate(request.prompt)
-    review = flow.step_review(result)
+async def review(
+    request: ReviewRequest,
+    http_request: Request,
+    bypass: bool = Depends(cache_bypass),
+    deadline: Optional[float] = Depends(request_deadline)
+):
+    """⇨ CREWAI + AUTOGEN: run deep multi-agent critique of the supplied code"""
+    code = request.code if request.code is not None else request.prompt
+    if not code:
+        raise HTTPException(status_code=422, detail="No code to review")
+    flow = GenerateReviewFlow(state={}, inference=inference_context(request, bypass))
+    review = await run_cancellable(http_request, flow.step_review(code), deadline)
+    final = flow.step_finish(review)
+    if isinstance(final, dict):
+        return final
+    return {"code": code, "issues": [review], "status": "success"}
+
+@app.post("/generate/review")
+async def generate_and_review(
+    request: PromptRequest,
+    http_request: Request,
+    bypass: bool = Depends(cache_bypass),
+    deadline: Optional[float] = Depends(request_deadline)
+):
+    """⇨ CREWAI + AUTOGEN: generate code from the prompt, then critique it"""
+    flow = GenerateReviewFlow(state={}, inference=inference_context(request, bypass))
+
+    async def generate_then_review():
+        result = await flow.step_generate(request.prompt)
+        return result, await flow.step_review(result)
+
+    result, review = await run_cancellable(http_request, generate_then_review(), deadline)
     final = flow.step_finish(review)
     if isinstance(final, dict):
         return final
     return {"code": result, "issues": [review], "status": "success"}
 
+@app.post("/complete")
+async def complete(
+    request: CompletionRequest,
+    http_request: Request,
+    bypass: bool = Depends(cache_bypass),
+    deadline: Optional[float] = Depends(request_deadline)
+):
+    """Inline completion between `prefix` and `suffix` with a small FIM model, at interactive priority"""
+    service = get_completion_service()
+    inference = inference_context(request, bypass, Priority.INTERACTIVE, default_model=service.model)
+    return await run_cancellable(
+        http_request,
+        service.complete(request.prefix, request.suffix, inference, request.document_id),
+        deadline
+    )
+
+@app.post("/review/batch")
+async def review_batch(request: BatchReviewRequest, bypass: bool = Depends(cache_bypass)):
+    """Review many files as a background job; stream per-file results from /review/batch/{job_id}/stream"""
+    inference = inference_context(request, bypass, priority=Priority.BATCH)
+    root = os.getenv("WORKSPACE_DIR") or os.getcwd()
+    try:
+        files = await asyncio.to_thread(collect_files, request.paths, root)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not files:
+        raise HTTPException(status_code=400, detail="No reviewable files found")
+    batch = BatchReview(files, inference, root=root)
+    job = get_job_manager().submit("review-batch", batch.run)
+    register_batch(job.id, batch)
+    return {"status": "accepted", "job_id": job.id, "files": len(files)}
+
+@app.get("/review/batch/{job_id}/stream")
+async def review_batch_stream(job_id: str):
+    """Stream per-file batch review results as Server-Sent Events (file, done)"""
+    batch = get_batch(job_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch review: {job_id}")
+    return event_stream(batch.events())
+
 @app.post("/chat")
-async def chat(request: MessageRequest):
+async def chat(
+    request: MessageRequest,
+    http_request: Request,
+    deadline: Optional[float] = Depends(request_deadline)
+):
     """⇨ CREWAI ConversationFlow or AutoGen GroupChat based on config"""
-    flow = ConversationFlow(state={})
-    if request.model:
-        os.environ["OLLAMA_MODEL"] = request.model
-    if request.device:
-        os.environ["OLLAMA_DEVICE"] = request.device
-    result = flow.step_chat(request.message)
+    flow = ConversationFlow(state={}, inference=inference_context(request, priority=Priority.INTERACTIVE))
+    if request.session_id:
+        result, done = await run_cancellable(
+            http_request, flow.session_chat(request.message, request.session_id), deadline
+        )
+        return {"response": result, "session": done.get("session")}
+    result = await run_cancellable(http_request, flow.step_chat(request.message), deadline)
     if isinstance(result, dict):
         return result
     return {"response": result}
 
+@app.post("/chat/stream")
+async def chat_stream(
+    request: MessageRequest,
+    http_request: Request,
+    deadline: Optional[float] = Depends(request_deadline)
+):
+    """Stream chat tokens as Server-Sent Events (token, done, error)"""
+    flow = ConversationFlow(state={}, inference=inference_context(request, priority=Priority.INTERACTIVE))
+    if request.session_id:
+        return event_stream(flow.stream_session_chat(request.message, request.session_id), http_request, deadline)
+    return event_stream(flow.stream_chat(request.message), http_request, deadline)
+
+@app.delete("/chat/{session_id}")
+async def forget_chat(session_id: str):
+    """Drop the server-side history of a conversation"""
+    await asyncio.to_thread(get_conversation_store().delete, session_id)
+    return {"status": "success"}
+
 @app.get("/metrics")
 async def metrics():
-    """Return CPU/GPU usage via psutil and nvidia-smi"""
-    metrics = {
-        "cpu_percent": psutil.cpu_percent(),
-        "memory_percent": psutil.virtual_memory().percent,
-        "gpu_metrics": {}
+    """Return the latest background-sampled CPU/GPU usage plus serving stats"""
+    assembler = get_context_assembler()
+    cache = get_response_cache()
+    return {
+        **await get_sampler().alatest(),
+        "scheduler": get_scheduler().stats(),
+        "cache": await asyncio.to_thread(cache.stats) if cache else {},
+        "agent_pool": get_agent_pool().stats(),
+        "backends": get_backend_pool().stats(),
+        "completions": get_completion_service().stats(),
+        "conversations": await asyncio.to_thread(get_conversation_store().stats),
+        "lexical_index": assembler.manager.lexical.stats() if assembler is not None else {}
     }
-    
-    # Try to get GPU metrics if available
-    try:
-        nvidia_smi = subprocess.check_output([
-            "nvidia-smi",
-            "--query-gpu=utilization.gpu,memory.used,memory.total",
-            "--format=csv,noheader,nounits"
-        ])
-        gpu_metrics = nvidia_smi.decode().strip().split(",")
-        metrics["gpu_metrics"] = {
-            "utilization": float(gpu_metrics[0]),
-            "memory_used": float(gpu_metrics[1]),
-            "memory_total": float(gpu_metrics[2])
-        }
-    except:
-        pass
-    
-    return metrics
+
+@app.get("/metrics/history")
+async def metrics_history(seconds: Optional[float] = None):
+    """Return sampled CPU/GPU usage over the last `seconds` (the whole ring buffer by default)"""
+    sampler = get_sampler()
+    return {"interval": sampler.interval, "samples": sampler.history(seconds)}
+
+@app.get("/metrics/prometheus")
+async def metrics_prometheus():
+    """Request, stage, token and TTFT metrics in Prometheus text format"""
+    payload, content_type = render_latest()
+    return Response(content=payload, media_type=content_type)
 
 if __name__ == "__main__":
     import uvicorn
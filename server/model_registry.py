@@ -0,0 +1,169 @@
+"""
+Registry of the models Ollama has installed and currently loaded.
+Listings come from /api/tags and /api/ps on every backend in the pool and are
+cached for a short TTL; pulls and removals go through the registry (and are
+applied to every backend) so the cache is invalidated as soon as the set of
+installed models changes.
+Models can also be warmed (loaded with an explicit keep_alive) ahead of use.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from backend_pool import Backend
+from ollama_client import OllamaClient, get_ollama_client
+
+ProgressCallback = Callable[[Optional[float], str], None]
+
+
+def merge_listings(listings: list[Tuple[Backend, Dict[str, Any]]]) -> list[Dict[str, Any]]:
+    """Combine per-backend model listings, noting which backends have each model"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    for backend, result in listings:
+        for model in result.get("models", []):
+            entry = merged.setdefault(model["name"], {**model, "backends": []})
+            entry["backends"].append(backend.url)
+    return list(merged.values())
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        client: Optional[OllamaClient] = None,
+        ttl: Optional[float] = None,
+        loaded_ttl: Optional[float] = None
+    ):
+        """
+        Args:
+            client: Ollama client; defaults to the process-wide one
+            ttl: Seconds an installed-models listing stays fresh
+            loaded_ttl: Seconds a loaded-models listing stays fresh
+        """
+        self._client = client
+        self.ttl = ttl or float(os.getenv("MODEL_REGISTRY_TTL", "30"))
+        self.loaded_ttl = loaded_ttl or float(os.getenv("MODEL_PS_TTL", "5"))
+        self._installed: Optional[list[Dict[str, Any]]] = None
+        self._installed_at = 0.0
+        self._loaded: Optional[list[Dict[str, Any]]] = None
+        self._loaded_at = 0.0
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE") or "30m"
+        self._lock = asyncio.Lock()
+
+    @property
+    def client(self) -> OllamaClient:
+        return self._client or get_ollama_client()
+
+    async def list_models(self, refresh: bool = False) -> list[Dict[str, Any]]:
+        """Installed models as reported by /api/tags"""
+        async with self._lock:
+            if refresh or self._installed is None or time.monotonic() - self._installed_at > self.ttl:
+                listings = await self.client.get_all("/api/tags")
+                if not listings:
+                    # Every backend failed; don't cache "no models" until Ollama is back
+                    return []
+                self._installed = merge_listings(listings)
+                self._installed_at = time.monotonic()
+            return self._installed
+
+    async def names(self, refresh: bool = False) -> list[str]:
+        return [model["name"] for model in await self.list_models(refresh)]
+
+    async def loaded(self, refresh: bool = False) -> list[Dict[str, Any]]:
+        """Models currently resident in memory as reported by /api/ps"""
+        async with self._lock:
+            if refresh or self._loaded is None or time.monotonic() - self._loaded_at > self.loaded_ttl:
+                listings = await self.client.get_all("/api/ps")
+                if not listings:
+                    return []
+                for backend, result in listings:
+                    self.client.pool.set_loaded(backend.url, (model["name"] for model in result.get("models", [])))
+                self._loaded = merge_listings(listings)
+                self._loaded_at = time.monotonic()
+            return self._loaded
+
+    async def loaded_names(self, refresh: bool = False) -> list[str]:
+        return [model["name"] for model in await self.loaded(refresh)]
+
+    def invalidate(self):
+        """Drop cached listings so the next call hits Ollama"""
+        self._installed = None
+        self._loaded = None
+
+    async def pull(self, model: str, progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        Download a model onto every reachable backend in turn, reporting (fraction, status)
+        as layers arrive, and refresh the listings
+        """
+        backends = self.client.pool.backends
+        last: Dict[str, Any] = {}
+        pulled = []
+        try:
+            for index, backend in enumerate(backends):
+                prefix = f"{backend.url}: " if len(backends) > 1 else ""
+                try:
+                    async for update in self.client.stream("/api/pull", {"model": model}, limited=False, backend=backend):
+                        if "error" in update:
+                            raise RuntimeError(f"{prefix}{update['error']}")
+                        last = update
+                        if progress is not None:
+                            total = update.get("total")
+                            fraction = (index + update.get("completed", 0) / total) / len(backends) if total else None
+                            progress(fraction, f"{prefix}{update.get('status', '')}")
+                    pulled.append(backend.url)
+                except httpx.TransportError as e:
+                    print(f"Skipping unreachable backend {backend.url}: {e}")
+            if not pulled:
+                raise RuntimeError(f"No backend reachable to pull {model}")
+            return {**last, "backends": pulled}
+        finally:
+            self.invalidate()
+
+    async def remove(self, model: str) -> Dict[str, Any]:
+        """Delete a model from every reachable backend that has it and refresh the listings"""
+        removed = []
+        try:
+            for backend in self.client.pool.backends:
+                try:
+                    await self.client.delete("/api/delete", {"model": model}, backend=backend)
+                    removed.append(backend.url)
+                except httpx.TransportError as e:
+                    print(f"Skipping unreachable backend {backend.url}: {e}")
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 404:
+                        raise
+            if not removed:
+                raise RuntimeError(f"Model {model} is not installed on any reachable backend")
+            return {"removed": removed}
+        finally:
+            self.invalidate()
+
+    async def warm(self, model: str, keep_alive: Optional[str] = None) -> Dict[str, Any]:
+        """Load a generation model into memory without generating anything"""
+        payload: Dict[str, Any] = {"model": model, "stream": False, "keep_alive": keep_alive or self.keep_alive}
+        try:
+            return await self.client.post("/api/generate", payload)
+        finally:
+            self._loaded = None
+
+    async def warm_embedding(self, model: str, keep_alive: Optional[str] = None) -> Dict[str, Any]:
+        """Load an embedding model by embedding a single token"""
+        payload: Dict[str, Any] = {"model": model, "input": ["warm-up"], "keep_alive": keep_alive or self.keep_alive}
+        try:
+            result = await self.client.post("/api/embed", payload)
+            return {key: value for key, value in result.items() if key != "embeddings"}
+        finally:
+            self._loaded = None
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Return the process-wide model registry"""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
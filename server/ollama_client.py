@@ -0,0 +1,294 @@
+"""
+Shared async client for the Ollama HTTP API.
+One pooled httpx.AsyncClient per backend with keep-alive, timeouts and a
+cap on concurrent in-flight calls, so flows never block the event loop.
+Requests are routed and failed over across backends by the backend pool.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from backend_pool import Backend, BackendPool, get_backend_pool
+from telemetry import observe_generation
+
+# Load environment variables
+load_dotenv()
+
+# Generation options shared by every flow and agent
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    "num_gpu": 1,  # Use 1 GPU
+    "num_thread": 4,  # Adjust based on your CPU
+    "gpu_layers": 20,  # Reduced layers for 4GB GPU
+    "num_ctx": 2048,  # Reduced context window
+    "num_batch": 256,  # Reduced batch size
+    "num_gqa": 4,  # Reduced attention heads
+    "rope_scaling": None,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "repeat_penalty": 1.1,
+    "mirostat": 0,
+    "mirostat_eta": 0.1,
+    "mirostat_tau": 5.0,
+    "seed": 42
+}
+
+
+class OllamaClient:
+    def __init__(
+        self,
+        pool: Optional[BackendPool] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None
+    ):
+        """Configure pooled connections; one httpx client per backend is created lazily."""
+        self._pool = pool
+        # Concurrent calls per backend
+        self.max_concurrency = max_concurrency or int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+        self.timeout = httpx.Timeout(
+            timeout or float(os.getenv("OLLAMA_TIMEOUT", "300")),
+            connect=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+        )
+        self.limits = httpx.Limits(
+            max_connections=self.max_concurrency * 2,
+            max_keepalive_connections=self.max_concurrency,
+            keepalive_expiry=float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+        )
+        # How long Ollama keeps a model loaded after a call (e.g. "30m"); Ollama's default when unset
+        self.keep_alive = os.getenv("OLLAMA_KEEP_ALIVE") or None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def pool(self) -> BackendPool:
+        return self._pool or get_backend_pool()
+
+    def client(self, backend: Backend) -> httpx.AsyncClient:
+        """Return the shared httpx client for a backend, creating it on first use."""
+        client = self._clients.get(backend.url)
+        if client is None or client.is_closed:
+            client = self._clients[backend.url] = httpx.AsyncClient(
+                base_url=backend.url,
+                timeout=self.timeout,
+                limits=self.limits
+            )
+        return client
+
+    def _slot(self, backend: Backend, limited: bool = True):
+        if not limited:
+            return contextlib.nullcontext()
+        if backend.url not in self._semaphores:
+            self._semaphores[backend.url] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[backend.url]
+
+    def _backends(self, model: Optional[str], backend: Optional[Backend]) -> Iterable[Backend]:
+        """A pinned backend, or the pool's failover order for the model"""
+        return [backend] if backend is not None else self.pool.failover(model)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        payload: Optional[Dict[str, Any]] = None,
+        limited: bool = True,
+        backend: Optional[Backend] = None
+    ) -> httpx.Response:
+        """
+        Send a request to the best backend for payload["model"], retrying on the next one
+        if it fails. Pass backend= to address one backend without failover.
+        """
+        model = (payload or {}).get("model")
+        error: Optional[Exception] = None
+        for candidate in self._backends(model, backend):
+            try:
+                with self.pool.lease(candidate):
+                    async with self._slot(candidate, limited):
+                        response = await self.client(candidate).request(method, path, json=payload)
+                        response.raise_for_status()
+                self.pool.record_success(candidate, model)
+                return response
+            except Exception as e:
+                if not self.pool.record_failure(candidate, e):
+                    raise
+                error = e
+        if error is None:
+            raise RuntimeError("No Ollama backend available")
+        raise error
+
+    async def post(self, path: str, payload: Dict[str, Any], backend: Optional[Backend] = None) -> Dict[str, Any]:
+        """POST a JSON payload to Ollama and return the decoded response."""
+        response = await self.request("POST", path, payload, backend=backend)
+        return response.json()
+
+    async def stream(
+        self,
+        path: str,
+        payload: Dict[str, Any],
+        limited: bool = True,
+        backend: Optional[Backend] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST a streaming request and yield each NDJSON object as it arrives.
+        Fails over to another backend only until the first chunk has been yielded.
+        Pass limited=False for long non-inference streams (pulls) that shouldn't hold a concurrency slot.
+        """
+        model = payload.get("model")
+        error: Optional[Exception] = None
+        for candidate in self._backends(model, backend):
+            yielded = False
+            try:
+                with self.pool.lease(candidate):
+                    async with self._slot(candidate, limited):
+                        started = time.perf_counter()
+                        first_token_at = None
+                        async with self.client(candidate).stream("POST", path, json={**payload, "stream": True}) as response:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if line.strip():
+                                    chunk = json.loads(line)
+                                    if first_token_at is None and (chunk.get("response") or chunk.get("message", {}).get("content")):
+                                        first_token_at = time.perf_counter()
+                                    if chunk.get("done"):
+                                        ttft = first_token_at - started if first_token_at else None
+                                        observe_generation(model or "", chunk, ttft)
+                                    yielded = True
+                                    yield chunk
+                self.pool.record_success(candidate, model)
+                return
+            except Exception as e:
+                if yielded or not self.pool.record_failure(candidate, e):
+                    raise
+                error = e
+        if error is None:
+            raise RuntimeError("No Ollama backend available")
+        raise error
+
+    async def get(self, path: str, backend: Optional[Backend] = None) -> Dict[str, Any]:
+        """GET an Ollama endpoint and return the decoded response."""
+        response = await self.request("GET", path, limited=False, backend=backend)
+        return response.json()
+
+    async def get_all(self, path: str) -> list[Tuple[Backend, Dict[str, Any]]]:
+        """GET an endpoint on every backend, skipping ones that fail"""
+        async def fetch(backend: Backend):
+            try:
+                return backend, await self.get(path, backend=backend)
+            except Exception as e:
+                print(f"Error querying {backend.url}{path}: {e}")
+                return None
+
+        results = await asyncio.gather(*(fetch(backend) for backend in self.pool.backends))
+        return [result for result in results if result is not None]
+
+    async def delete(self, path: str, payload: Dict[str, Any], backend: Optional[Backend] = None) -> Dict[str, Any]:
+        """DELETE with a JSON body; Ollama answers these with an empty 200."""
+        response = await self.request("DELETE", path, payload, limited=False, backend=backend)
+        return response.json() if response.content else {}
+
+    def _keep_alive(self) -> Dict[str, Any]:
+        return {"keep_alive": self.keep_alive} if self.keep_alive else {}
+
+    async def generate(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        **extra: Any
+    ) -> Dict[str, Any]:
+        """Run a non-streaming /api/generate call."""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": False,
+            "options": options if options is not None else DEFAULT_OPTIONS,
+            **self._keep_alive(),
+            **extra
+        }
+        result = await self.post("/api/generate", payload)
+        observe_generation(model, result)
+        return result
+
+    async def chat(
+        self,
+        model: str,
+        messages: list[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        **extra: Any
+    ) -> Dict[str, Any]:
+        """Run a non-streaming /api/chat call."""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "stream": False,
+            "options": options if options is not None else DEFAULT_OPTIONS,
+            **self._keep_alive(),
+            **extra
+        }
+        result = await self.post("/api/chat", payload)
+        observe_generation(model, result)
+        return result
+
+    def generate_stream(
+        self,
+        model: str,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        **extra: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/generate chunks; each carries a `response` token."""
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "options": options if options is not None else DEFAULT_OPTIONS,
+            **self._keep_alive(),
+            **extra
+        }
+        return self.stream("/api/generate", payload)
+
+    def chat_stream(
+        self,
+        model: str,
+        messages: list[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None,
+        **extra: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Stream /api/chat chunks; each carries a partial `message`."""
+        payload = {
+            "model": model,
+            "messages": messages,
+            "options": options if options is not None else DEFAULT_OPTIONS,
+            **self._keep_alive(),
+            **extra
+        }
+        return self.stream("/api/chat", payload)
+
+    async def aclose(self):
+        """Close pooled connections."""
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+_client: Optional[OllamaClient] = None
+
+
+def get_ollama_client() -> OllamaClient:
+    """Return the process-wide Ollama client."""
+    global _client
+    if _client is None:
+        _client = OllamaClient()
+    return _client
+
+
+async def close_ollama_client():
+    """Close the process-wide Ollama client, if one was created."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
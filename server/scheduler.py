@@ -0,0 +1,237 @@
+"""
+Model-aware scheduler and admission control for inference calls.
+At most `max_inflight` calls reach Ollama at once; the rest wait in
+per-model priority queues, so interactive chat and completions are served
+ahead of batch reviews. The model that is already resident in Ollama keeps
+being served while it has work of the best waiting priority, so a mix of
+requests for different models doesn't force a reload on every switch.
+When the queue is full, new requests are rejected at once with a
+Retry-After estimate instead of piling up.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from backend_pool import get_backend_pool
+from telemetry import INFLIGHT, QUEUE_DEPTH, QUEUE_REJECTED, QUEUE_WAIT
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # Chat and inline completions
+    STANDARD = 1  # Single generate/review requests
+    BATCH = 2  # Batch review jobs
+
+
+class QueueFull(Exception):
+    """Raised when a request can't be admitted; retry_after is a wait estimate in seconds"""
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full; retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+# (priority, enqueued at, sequence, waiter)
+QueueEntry = Tuple[int, float, int, asyncio.Future]
+
+
+class ModelScheduler:
+    def __init__(
+        self,
+        max_inflight: Optional[int] = None,
+        max_streak: Optional[int] = None,
+        warm_grace: Optional[float] = None,
+        max_queue: Optional[int] = None,
+        max_batch_queue: Optional[int] = None,
+        warm_source: Optional[Callable[[], Iterable[str]]] = None
+    ):
+        """
+        Args:
+            max_inflight: Maximum concurrent inference calls
+            max_streak: Grants to the resident model before yielding to other waiting models
+            warm_grace: Seconds a request for a cold model may be passed over for one already loaded
+            max_queue: Waiting requests before new ones are rejected
+            max_batch_queue: Waiting requests before new batch requests are rejected,
+                so batch work can't fill the queue ahead of interactive requests
+            warm_source: Returns the models currently loaded in Ollama; consulted when choosing
+                which model to switch to, so affinity doesn't depend on anyone polling /models/loaded
+        """
+        self.max_inflight = max_inflight or int(os.getenv("SCHEDULER_MAX_INFLIGHT", "4"))
+        self.max_streak = max_streak or int(os.getenv("SCHEDULER_MAX_STREAK", "8"))
+        self.warm_grace = warm_grace if warm_grace is not None else float(os.getenv("SCHEDULER_WARM_GRACE", "5"))
+        self.max_queue = max_queue or int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))
+        self.max_batch_queue = max_batch_queue or int(
+            os.getenv("SCHEDULER_MAX_BATCH_QUEUE", str(max(1, self.max_queue // 2)))
+        )
+        self._warm_source = warm_source
+        self._queues: Dict[str, List[QueueEntry]] = {}
+        self._sequence = itertools.count()
+        self._inflight = 0
+        self._active_model: Optional[str] = None
+        self._streak = 0
+        self._service_time = 5.0  # Moving average of slot hold time, for Retry-After
+        self._rejected = 0
+
+    @property
+    def active_model(self) -> Optional[str]:
+        return self._active_model
+
+    @property
+    def warm_models(self) -> frozenset:
+        return frozenset(self._warm_source()) if self._warm_source is not None else frozenset()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    @property
+    def queued(self) -> Dict[str, int]:
+        return {model: len(queue) for model, queue in self._queues.items()}
+
+    @property
+    def queued_total(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def queued_by_priority(self) -> Dict[str, int]:
+        counts = {priority.name.lower(): 0 for priority in Priority}
+        for queue in self._queues.values():
+            for entry in queue:
+                counts[Priority(entry[0]).name.lower()] += 1
+        return counts
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained, by average slot hold time"""
+        waves = (self.queued_total + 1) / self.max_inflight
+        return max(1, min(60, math.ceil(waves * self._service_time)))
+
+    def admits(self, priority: int = Priority.STANDARD) -> bool:
+        """Whether the queue has room for another request of this priority"""
+        limit = self.max_batch_queue if priority >= Priority.BATCH else self.max_queue
+        return self.queued_total < limit
+
+    def check_admission(self, priority: int = Priority.STANDARD):
+        """
+        Raise QueueFull if a request of this priority would exceed the queue limit.
+        Called once per request at the endpoint; the slots a request then takes are not re-checked.
+        """
+        if not self.admits(priority):
+            self._rejected += 1
+            QUEUE_REJECTED.labels(Priority(priority).name.lower()).inc()
+            raise QueueFull(self.retry_after())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_model": self._active_model,
+            "inflight": self._inflight,
+            "max_inflight": self.max_inflight,
+            "queued": self.queued,
+            "queued_by_priority": self.queued_by_priority(),
+            "max_queue": self.max_queue,
+            "rejected": self._rejected,
+            "avg_service_s": round(self._service_time, 3)
+        }
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: int = Priority.STANDARD):
+        """Hold an inference slot for `model` for the duration of the block."""
+        enqueued = time.monotonic()
+        await self._acquire(model, priority)
+        granted = time.monotonic()
+        QUEUE_WAIT.labels(Priority(priority).name.lower()).observe(granted - enqueued)
+        try:
+            yield
+        finally:
+            self._service_time = 0.8 * self._service_time + 0.2 * (time.monotonic() - granted)
+            self._release()
+
+    async def _acquire(self, model: str, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        entry: QueueEntry = (int(priority), time.monotonic(), next(self._sequence), future)
+        heapq.heappush(self._queues.setdefault(model, []), entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just before cancellation; hand the slot back
+                self._release()
+            else:
+                self._discard(model, entry)
+            raise
+
+    def _discard(self, model: str, entry: QueueEntry):
+        """Remove a cancelled waiter so it stops counting toward the queue limit"""
+        queue = self._queues.get(model)
+        if queue and entry in queue:
+            queue.remove(entry)
+            heapq.heapify(queue)
+            if not queue:
+                del self._queues[model]
+        self._update_gauges()
+
+    def _release(self):
+        self._inflight -= 1
+        self._dispatch()
+
+    def _next_model(self) -> Optional[str]:
+        """Pick the model whose queue should be served next, if any."""
+        if not self._queues:
+            return None
+        heads = {model: queue[0] for model, queue in self._queues.items()}
+        top = min(head[0] for head in heads.values())
+        active = self._active_model
+        if active in heads and heads[active][0] == top:
+            others_waiting = len(heads) > 1
+            if not others_waiting or self._streak < self.max_streak:
+                return active
+        if self._inflight == 0:
+            # Resident model is idle: switch to the model with the oldest waiter of the best priority,
+            # preferring one that is already loaded unless a cold request has waited too long
+            candidates = [model for model, head in heads.items() if head[0] == top]
+            oldest = min(candidates, key=lambda model: heads[model][1])
+            loaded = self.warm_models if len(candidates) > 1 else frozenset()
+            warm = [model for model in candidates if model in loaded]
+            if warm and time.monotonic() - heads[oldest][1] < self.warm_grace:
+                return min(warm, key=lambda model: heads[model][1])
+            return oldest
+        return None
+
+    def _dispatch(self):
+        while self._inflight < self.max_inflight:
+            model = self._next_model()
+            if model is None:
+                break
+            queue = self._queues[model]
+            future = heapq.heappop(queue)[3]
+            if not queue:
+                del self._queues[model]
+            if future.done():
+                continue  # Waiter was cancelled while queued
+            if model != self._active_model:
+                self._active_model = model
+                self._streak = 0
+            self._streak += 1
+            self._inflight += 1
+            future.set_result(None)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        INFLIGHT.set(self._inflight)
+        for priority, count in self.queued_by_priority().items():
+            QUEUE_DEPTH.labels(priority).set(count)
+
+
+_scheduler: Optional[ModelScheduler] = None
+
+
+def get_scheduler() -> ModelScheduler:
+    """Return the process-wide scheduler."""
+    global _scheduler
+    if _scheduler is None:
+        # The backend pool's health checks keep each backend's loaded models current
+        _scheduler = ModelScheduler(warm_source=get_backend_pool().loaded_models)
+    return _scheduler
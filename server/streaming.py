@@ -0,0 +1,80 @@
+"""
+Helpers for token streaming: incremental ```python block extraction and
+Server-Sent Events framing.
+"""
+import json
+from typing import Any, Dict
+
+CODE_FENCE_OPEN = "```python"
+CODE_FENCE_CLOSE = "```"
+
+
+def extract_code(text: str) -> str:
+    """Return the first ```python block in text, or text unchanged if there is none."""
+    if CODE_FENCE_OPEN in text:
+        code_start = text.find(CODE_FENCE_OPEN) + len(CODE_FENCE_OPEN)
+        code_end = text.find(CODE_FENCE_CLOSE, code_start)
+        return text[code_start:code_end].strip()
+    return text
+
+
+class CodeBlockExtractor:
+    """
+    Incrementally pull the first ```python block out of a token stream.
+
+    feed() returns only the code text that became safe to emit with the new
+    token, holding back trailing characters that could still turn into a fence.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._state = "before"  # before -> header -> inside -> done
+
+    @property
+    def in_code(self) -> bool:
+        return self._state == "inside"
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, text: str) -> str:
+        if self._state == "done":
+            return ""
+        self._buffer += text
+        emitted = ""
+
+        if self._state == "before":
+            index = self._buffer.find(CODE_FENCE_OPEN)
+            if index < 0:
+                # Keep just enough tail to match a fence split across tokens
+                self._buffer = self._buffer[-(len(CODE_FENCE_OPEN) - 1):]
+                return ""
+            self._buffer = self._buffer[index + len(CODE_FENCE_OPEN):]
+            self._state = "header"
+
+        if self._state == "header":
+            newline = self._buffer.find("\n")
+            if newline < 0:
+                return ""
+            self._buffer = self._buffer[newline + 1:]
+            self._state = "inside"
+
+        if self._state == "inside":
+            index = self._buffer.find(CODE_FENCE_CLOSE)
+            if index >= 0:
+                emitted = self._buffer[:index]
+                self._buffer = ""
+                self._state = "done"
+            else:
+                # Hold back trailing backticks that may start the closing fence
+                safe = len(self._buffer.rstrip("`"))
+                emitted = self._buffer[:safe]
+                self._buffer = self._buffer[safe:]
+
+        return emitted
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,164 @@
+"""
+Background sampler for host CPU, memory and GPU usage.
+One thread samples on a fixed interval into a ring buffer; API endpoints
+serve the latest sample or a short history without doing any work
+themselves. When the sampler isn't running, a request resamples once the
+cached sample is older than the interval. GPU stats come from NVML when pynvml is installed, otherwise
+from nvidia-smi, and GPU sampling switches off if neither is available.
+"""
+import asyncio
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import psutil
+
+try:
+    import pynvml
+except ImportError:  # pynvml is optional
+    pynvml = None
+
+
+class MetricsSampler:
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        history: Optional[int] = None,
+        gpu_enabled: bool = True
+    ):
+        """
+        Args:
+            interval: Seconds between samples
+            history: Number of samples kept in the ring buffer
+            gpu_enabled: Sample GPU usage as well as CPU and memory
+        """
+        self.interval = interval or float(os.getenv("METRICS_SAMPLE_INTERVAL", "2.0"))
+        self._samples: deque = deque(maxlen=history or int(os.getenv("METRICS_HISTORY", "300")))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._gpu_backend = self._init_gpu() if gpu_enabled else None
+        self._nvml_handle = None
+
+    def _init_gpu(self) -> Optional[str]:
+        if pynvml is not None:
+            try:
+                pynvml.nvmlInit()
+                return "nvml"
+            except Exception:
+                pass
+        return "nvidia-smi"
+
+    def _gpu_metrics(self) -> Dict[str, float]:
+        if self._gpu_backend == "nvml":
+            try:
+                if self._nvml_handle is None:
+                    self._nvml_handle = pynvml.nvmlDeviceGetHandleByIndex(0)
+                utilization = pynvml.nvmlDeviceGetUtilizationRates(self._nvml_handle)
+                memory = pynvml.nvmlDeviceGetMemoryInfo(self._nvml_handle)
+                return {
+                    "utilization": float(utilization.gpu),
+                    "memory_used": float(memory.used // (1024 * 1024)),
+                    "memory_total": float(memory.total // (1024 * 1024))
+                }
+            except Exception:
+                self._gpu_backend = None
+                return {}
+
+        if self._gpu_backend == "nvidia-smi":
+            try:
+                nvidia_smi = subprocess.check_output([
+                    "nvidia-smi",
+                    "--query-gpu=utilization.gpu,memory.used,memory.total",
+                    "--format=csv,noheader,nounits"
+                ], timeout=5)
+                gpu_metrics = nvidia_smi.decode().strip().splitlines()[0].split(",")
+                return {
+                    "utilization": float(gpu_metrics[0]),
+                    "memory_used": float(gpu_metrics[1]),
+                    "memory_total": float(gpu_metrics[2])
+                }
+            except (OSError, subprocess.CalledProcessError):
+                # No NVIDIA driver here; stop spawning nvidia-smi
+                self._gpu_backend = None
+            except Exception:
+                pass
+        return {}
+
+    def sample(self) -> Dict[str, Any]:
+        """Take one sample and append it to the history."""
+        sample = {
+            "timestamp": time.time(),
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "gpu_metrics": self._gpu_metrics()
+        }
+        with self._lock:
+            self._samples.append(sample)
+        return sample
+
+    def _fresh(self) -> Optional[Dict[str, Any]]:
+        """The most recent sample if the sampler is running or it is younger than the interval."""
+        with self._lock:
+            if not self._samples:
+                return None
+            sample = self._samples[-1]
+            if self._thread is not None or time.time() - sample["timestamp"] < self.interval:
+                return sample
+        return None
+
+    def latest(self) -> Dict[str, Any]:
+        """Most recent sample; samples now if there is none or it is older than the interval."""
+        return self._fresh() or self.sample()
+
+    async def alatest(self) -> Dict[str, Any]:
+        """latest() for async callers; a fresh sample (which may run nvidia-smi) is taken in a worker thread."""
+        return self._fresh() or await asyncio.to_thread(self.sample)
+
+    def history(self, seconds: Optional[float] = None) -> list[Dict[str, Any]]:
+        """Samples from the last `seconds` (all retained samples when omitted)."""
+        with self._lock:
+            samples = list(self._samples)
+        if seconds is None:
+            return samples
+        cutoff = time.time() - seconds
+        return [sample for sample in samples if sample["timestamp"] >= cutoff]
+
+    def start(self):
+        """Start sampling in a background thread."""
+        if self._thread is not None:
+            return
+        psutil.cpu_percent(interval=None)  # Prime the CPU counter
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # Sample right away so the first request after startup isn't served a stale or empty sample
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling metrics: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+
+_sampler: Optional[MetricsSampler] = None
+
+
+def get_sampler() -> MetricsSampler:
+    """Return the process-wide sampler."""
+    global _sampler
+    if _sampler is None:
+        _sampler = MetricsSampler(gpu_enabled=os.getenv("GPU_ENABLED", "true").lower() == "true")
+    return _sampler
@@ -0,0 +1,197 @@
+"""
+Prometheus instrumentation for the API, flow stages and Ollama calls.
+Request and stage latencies are histograms; token throughput and
+time-to-first-token come from Ollama's eval_count/eval_duration fields,
+with load and prompt-eval (prefill) time split out from decode time.
+"""
+import asyncio
+import functools
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500)
+
+REQUESTS = Counter(
+    "codehermit_requests_total",
+    "HTTP requests handled, by endpoint and status code",
+    ["method", "endpoint", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "codehermit_request_duration_seconds",
+    "Time to produce the response headers, by endpoint",
+    ["method", "endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "codehermit_stage_duration_seconds",
+    "Time spent in each stage: flow steps, retrieval and embedding",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter(
+    "codehermit_stage_errors_total",
+    "Flow stages that raised",
+    ["stage"]
+)
+OLLAMA_PHASE = Histogram(
+    "codehermit_ollama_phase_seconds",
+    "Ollama-reported time per phase: load, prefill (prompt eval) and decode (eval)",
+    ["model", "phase"],
+    buckets=LATENCY_BUCKETS
+)
+TOKENS_GENERATED = Counter(
+    "codehermit_tokens_generated_total",
+    "Tokens generated by Ollama (eval_count)",
+    ["model"]
+)
+PROMPT_TOKENS = Counter(
+    "codehermit_prompt_tokens_total",
+    "Prompt tokens evaluated by Ollama (prompt_eval_count)",
+    ["model"]
+)
+TOKENS_PER_SECOND = Histogram(
+    "codehermit_tokens_per_second",
+    "Decode throughput per call (eval_count / eval_duration)",
+    ["model"],
+    buckets=RATE_BUCKETS
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "codehermit_time_to_first_token_seconds",
+    "Time to first token: measured for streams, load + prefill otherwise",
+    ["model"],
+    buckets=LATENCY_BUCKETS
+)
+QUEUE_DEPTH = Gauge(
+    "codehermit_queue_depth",
+    "Requests waiting for an inference slot, by priority",
+    ["priority"]
+)
+QUEUE_WAIT = Histogram(
+    "codehermit_queue_wait_seconds",
+    "Time from enqueue to slot grant, by priority",
+    ["priority"],
+    buckets=LATENCY_BUCKETS
+)
+QUEUE_REJECTED = Counter(
+    "codehermit_queue_rejected_total",
+    "Requests turned away with 429 because the queue was full, by priority",
+    ["priority"]
+)
+INFLIGHT = Gauge(
+    "codehermit_inflight_requests",
+    "Inference calls currently holding a scheduler slot"
+)
+CANCELLED = Counter(
+    "codehermit_cancelled_requests_total",
+    "Requests whose inference was cancelled, by endpoint and reason (disconnect, deadline)",
+    ["endpoint", "reason"]
+)
+BACKEND_REQUESTS = Counter(
+    "codehermit_backend_requests_total",
+    "Requests sent to each Ollama backend, by outcome (ok, failed)",
+    ["backend", "outcome"]
+)
+BACKEND_HEALTHY = Gauge(
+    "codehermit_backend_healthy",
+    "1 if the Ollama backend passed its last health check",
+    ["backend"]
+)
+
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the duration of the enclosed block under `stage`."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def timed_stage(stage: str):
+    """Decorator form of observe_stage for sync and async functions."""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with observe_stage(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with observe_stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe_generation(model: str, final: Dict[str, Any], ttft: Optional[float] = None):
+    """Record token counts and phase timings from a finished Ollama response (durations are in ns)."""
+    load = final.get("load_duration")
+    prefill = final.get("prompt_eval_duration")
+    decode = final.get("eval_duration")
+    eval_count = final.get("eval_count")
+
+    for phase, duration in (("load", load), ("prefill", prefill), ("decode", decode)):
+        if duration:
+            OLLAMA_PHASE.labels(model, phase).observe(duration / 1e9)
+    if final.get("prompt_eval_count"):
+        PROMPT_TOKENS.labels(model).inc(final["prompt_eval_count"])
+    if eval_count:
+        TOKENS_GENERATED.labels(model).inc(eval_count)
+        if decode:
+            TOKENS_PER_SECOND.labels(model).observe(eval_count / (decode / 1e9))
+
+    if ttft is None and (load or prefill):
+        ttft = ((load or 0) + (prefill or 0)) / 1e9
+    if ttft is not None:
+        TIME_TO_FIRST_TOKEN.labels(model).observe(ttft)
+
+
+def observe_request(method: str, endpoint: str, status: int, duration: float):
+    REQUESTS.labels(method, endpoint, str(status)).inc()
+    REQUEST_LATENCY.labels(method, endpoint).observe(duration)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware counting requests and timing them per route template (streams are timed to their first byte)"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            observed = True
+            # The router records the matched route in the scope
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            observe_request(scope["method"], endpoint, status, time.perf_counter() - started)
+
+        async def send_and_observe(message):
+            if message["type"] == "http.response.start" and not observed:
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_observe)
+        finally:
+            if not observed:
+                observe(500)
+
+
+def render_latest() -> tuple[bytes, str]:
+    """Return the exposition payload and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
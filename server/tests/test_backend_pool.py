@@ -0,0 +1,129 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend_pool import BackendPool
+from ollama_client import OllamaClient
+
+A, B = "http://a:11434", "http://b:11434"
+
+
+def client_for(pool: BackendPool, handlers: dict) -> OllamaClient:
+    """OllamaClient whose per-backend httpx clients are served by mock handlers"""
+    client = OllamaClient(pool=pool)
+    for url, handler in handlers.items():
+        client._clients[url] = httpx.AsyncClient(base_url=url, transport=httpx.MockTransport(handler))
+    return client
+
+
+class DroppedStream(httpx.AsyncByteStream):
+    """Response body whose connection drops after the first NDJSON line"""
+    async def __aiter__(self):
+        yield b'{"response": "hi"}\n'
+        raise httpx.ReadError("connection reset")
+
+
+def reply(body: dict, status: int = 200):
+    return lambda request: httpx.Response(status, json=body)
+
+
+def refuse(request):
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def test_least_busy_backend_wins_unless_another_has_the_model_loaded():
+    pool = BackendPool(urls=[A, B], affinity_slack=2)
+    a, b = pool.backends
+    a.outstanding = 2
+    assert pool.choose("m") is b
+
+    a.loaded = frozenset({"m"})
+    assert pool.choose("m") is a
+    a.outstanding = 3
+    assert pool.choose("m") is b
+
+
+def test_connection_error_fails_over_and_takes_the_backend_out_of_rotation():
+    pool = BackendPool(urls=[A, B], health_interval=60)
+    client = client_for(pool, {A: refuse, B: reply({"response": "from b"})})
+
+    assert asyncio.run(client.post("/api/generate", {"model": "m"})) == {"response": "from b"}
+    a, b = pool.backends
+    assert not a.healthy and a.failures == 1 and "refused" in a.last_error
+    assert b.healthy and "m" in b.loaded
+    # Until a health interval passes, the failed backend isn't tried at all
+    assert [backend.url for backend in pool.ranked("m")] == [B]
+
+
+def test_not_found_moves_on_without_marking_the_backend_down():
+    pool = BackendPool(urls=[A, B])
+    client = client_for(pool, {A: reply({"error": "model not found"}, 404), B: reply({"response": "ok"})})
+
+    assert asyncio.run(client.post("/api/generate", {"model": "m"})) == {"response": "ok"}
+    assert all(backend.healthy for backend in pool.backends)
+
+
+def test_client_errors_are_not_retried():
+    pool = BackendPool(urls=[A, B])
+    calls = []
+
+    def bad_request(request):
+        calls.append(str(request.url))
+        return httpx.Response(400, json={"error": "bad options"})
+
+    client = client_for(pool, {A: bad_request, B: bad_request})
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.post("/api/generate", {"model": "m"}))
+    assert len(calls) == 1 and all(backend.healthy for backend in pool.backends)
+
+
+def test_stream_fails_over_only_before_the_first_chunk():
+    def ndjson(*chunks):
+        body = "".join(json.dumps(chunk) + "\n" for chunk in chunks)
+        return lambda request: httpx.Response(200, content=body.encode())
+
+    async def collect(client):
+        return [chunk async for chunk in client.stream("/api/generate", {"model": "m"})]
+
+    pool = BackendPool(urls=[A, B])
+    client = client_for(pool, {A: refuse, B: ndjson({"response": "hi"}, {"done": True})})
+    assert asyncio.run(collect(client)) == [{"response": "hi"}, {"done": True}]
+
+    # A backend that dies mid-stream is not retried: tokens were already sent
+    pool = BackendPool(urls=[A, B])
+    client = client_for(pool, {A: lambda request: httpx.Response(200, stream=DroppedStream()), B: ndjson({"response": "again"}, {"done": True})})
+    received = []
+
+    async def consume():
+        async for chunk in client.stream("/api/generate", {"model": "m"}):
+            received.append(chunk)
+
+    with pytest.raises(httpx.ReadError):
+        asyncio.run(consume())
+    assert received == [{"response": "hi"}]
+
+
+def test_failed_backend_recovers_after_a_passing_health_check():
+    pool = BackendPool(urls=[A, B], health_interval=60)
+    a, _ = pool.backends
+    pool.record_failure(a, httpx.ConnectError("down"))
+    assert pool.ranked()[0].url == B and not a.healthy
+
+    def ps(request):
+        return httpx.Response(200, json={"models": [{"name": "m"}]})
+
+    with httpx.Client(transport=httpx.MockTransport(ps)) as http:
+        pool.check(a, http)
+    assert a.healthy and a.loaded == frozenset({"m"})
+    assert pool.loaded_models() == frozenset({"m"})
+    assert {backend.url for backend in pool.ranked()} == {A, B}
+
+
+def test_unhealthy_backends_are_still_tried_when_none_are_healthy():
+    pool = BackendPool(urls=[A, B], health_interval=60)
+    for backend in pool.backends:
+        pool.record_failure(backend, httpx.ConnectError("down"))
+    assert len(pool.ranked()) == 2
+    assert pool.loaded_models() == frozenset()
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from batch_review import collect_files
+
+
+def touch(root, relpath: str) -> str:
+    path = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x = 1\n")
+    return path
+
+
+def test_collect_files_expands_directories_inside_the_workspace(tmp_path):
+    workspace = tmp_path / "workspace"
+    first = touch(workspace, "pkg/a.py")
+    second = touch(workspace, "pkg/sub/b.py")
+    single = touch(workspace, "c.py")
+
+    files = collect_files(["pkg", "c.py", str(workspace / "c.py")], str(workspace))
+
+    assert sorted(files) == sorted([first, second, single])
+
+
+@pytest.mark.parametrize("path", ["../secret.py", "pkg/../../secret.py", "/etc/passwd"])
+def test_collect_files_refuses_paths_outside_the_workspace(tmp_path, path):
+    workspace = tmp_path / "workspace"
+    touch(workspace, "pkg/a.py")
+    touch(tmp_path, "secret.py")
+
+    with pytest.raises(PermissionError):
+        collect_files([path], str(workspace))
+
+
+def test_collect_files_refuses_symlinks_out_of_the_workspace(tmp_path):
+    workspace = tmp_path / "workspace"
+    inside = touch(workspace, "pkg/a.py")
+    secret = touch(tmp_path, "secret.py")
+    os.symlink(secret, workspace / "pkg" / "link.py")
+    os.symlink(tmp_path, workspace / "escape")
+
+    with pytest.raises(PermissionError):
+        collect_files(["pkg/link.py"], str(workspace))
+    with pytest.raises(PermissionError):
+        collect_files(["escape/secret.py"], str(workspace))
+    assert collect_files(["pkg"], str(workspace)) == [inside]
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+import cache as cache_module
+from cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def no_cache_path(monkeypatch):
+    monkeypatch.delenv("RESPONSE_CACHE_PATH", raising=False)
+
+
+class Clock:
+    """Stands in for time.time() in the cache module"""
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_key_covers_model_options_and_prompt():
+    key = ResponseCache.make_key("generate", "m", {"seed": 1, "temperature": 0}, "p")
+    assert key == ResponseCache.make_key("generate", "m", {"temperature": 0, "seed": 1}, "p")
+    assert key != ResponseCache.make_key("review", "m", {"seed": 1, "temperature": 0}, "p")
+    assert key != ResponseCache.make_key("generate", "m", {"seed": 2, "temperature": 0}, "p")
+    assert key != ResponseCache.make_key("generate", "other", {"seed": 1, "temperature": 0}, "p")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl=0)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["memory_entries"] == 2
+
+
+def test_entries_expire_after_the_ttl(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    cache = ResponseCache(ttl=60, sqlite_path=str(tmp_path / "cache.sqlite3"))
+    cache.set("k", {"response": "v"})
+
+    clock.now += 59
+    assert cache.get("k") == {"response": "v"}
+    clock.now += 2
+    assert cache.get("k") is None
+    # The expired row is dropped from disk too
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_sqlite_tier_survives_a_restart_and_refills_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResponseCache(sqlite_path=path).set("k", {"response": "v"})
+
+    cache = ResponseCache(sqlite_path=path)
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.get("k") == {"response": "v"}
+    assert cache.get("k") == {"response": "v"}
+    stats = cache.stats()
+    assert stats["disk_hits"] == 1 and stats["hits"] == 2 and stats["memory_entries"] == 1
+
+
+def test_sqlite_tier_keeps_the_most_recently_used_rows(monkeypatch, tmp_path):
+    clock = Clock()
+    monkeypatch.setattr(cache_module.time, "time", clock)
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(max_entries=1, ttl=0, sqlite_path=path, max_disk_entries=2)
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.set(key, key)
+    clock.now += 1
+    assert cache.get("a") == "a"  # From disk: refreshes a's access time
+    clock.now += 1
+    cache.set("c", "c")
+
+    reopened = ResponseCache(ttl=0, sqlite_path=path)
+    assert reopened.stats()["disk_entries"] == 2
+    assert reopened.get("b") is None
+    assert reopened.get("a") == "a" and reopened.get("c") == "c"
+
+
+def test_async_accessors_and_clear(tmp_path):
+    cache = ResponseCache(sqlite_path=str(tmp_path / "cache.sqlite3"))
+
+    async def scenario():
+        await cache.aset("k", [1, 2])
+        return await cache.aget("k"), await cache.aget("missing")
+
+    assert asyncio.run(scenario()) == ([1, 2], None)
+    cache.clear()
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0 and cache.stats()["misses"] == 2
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from cancellation import RequestCancelled, guard_stream, run_cancellable
+from scheduler import ModelScheduler
+
+
+class FakeRequest:
+    """Starlette Request double whose client disconnects after `disconnect_after` seconds"""
+    def __init__(self, disconnect_after: float = None):
+        self.scope = {}
+        self.disconnect_after = disconnect_after
+        self.started = None
+
+    async def is_disconnected(self) -> bool:
+        loop = asyncio.get_running_loop()
+        if self.started is None:
+            self.started = loop.time()
+        return self.disconnect_after is not None and loop.time() - self.started >= self.disconnect_after
+
+
+@pytest.fixture(autouse=True)
+def fast_disconnect_polling(monkeypatch):
+    monkeypatch.setenv("DISCONNECT_POLL_INTERVAL", "0.01")
+
+
+def test_run_cancellable_returns_the_result():
+    async def work():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    assert asyncio.run(run_cancellable(FakeRequest(), work(), deadline=1)) == "done"
+
+
+@pytest.mark.parametrize("fake_request, deadline, reason", [
+    (FakeRequest(), 0.05, "deadline"),
+    (FakeRequest(disconnect_after=0.02), None, "disconnect")
+])
+def test_cancelled_work_releases_its_scheduler_slot(fake_request, deadline, reason):
+    async def scenario():
+        scheduler = ModelScheduler(max_inflight=1, max_queue=10)
+        unwound = asyncio.Event()
+
+        async def work():
+            try:
+                async with scheduler.slot("m"):
+                    await asyncio.sleep(10)
+            finally:
+                unwound.set()
+
+        with pytest.raises(RequestCancelled) as cancelled:
+            await run_cancellable(fake_request, work(), deadline)
+        await asyncio.wait_for(unwound.wait(), 1)
+        return cancelled.value, scheduler.inflight
+
+    cancelled, inflight = asyncio.run(scenario())
+    assert cancelled.reason == reason
+    assert inflight == 0
+
+
+def test_guard_stream_relays_every_event():
+    async def events():
+        yield "token", {"text": "a"}
+        yield "done", {"response": "a"}
+
+    async def scenario():
+        return [event async for event in guard_stream(FakeRequest(), events(), deadline=1)]
+
+    assert asyncio.run(scenario()) == [("token", {"text": "a"}), ("done", {"response": "a"})]
+
+
+def test_guard_stream_deadline_ends_with_an_error_and_closes_the_flow():
+    closed = []
+
+    async def events():
+        try:
+            yield "token", {"text": "a"}
+            await asyncio.sleep(10)
+            yield "token", {"text": "never"}
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        return [event async for event in guard_stream(FakeRequest(), events(), deadline=0.05)]
+
+    received = asyncio.run(scenario())
+    assert received[0] == ("token", {"text": "a"})
+    assert received[-1][0] == "error" and received[-1][1]["cancelled"] == "deadline"
+    assert closed == [True]
@@ -0,0 +1,71 @@
+from chunking import chunk_file, chunk_ids, chunk_lines, chunk_python
+
+SOURCE = '''import os
+
+
+def first():
+    return 1
+
+
+class Greeter:
+    greeting = "hi"
+
+    def greet(self, name):
+        return f"{self.greeting} {name}"
+
+
+@staticmethod
+def decorated():
+    return 2
+'''
+
+
+def test_definitions_get_their_own_chunks():
+    chunks = chunk_python(SOURCE)
+    named = {chunk.name: chunk for chunk in chunks if chunk.name}
+    assert named["first"].kind == "function"
+    assert named["first"].text.startswith("def first():")
+    assert named["Greeter"].kind == "class"
+    assert "def greet" in named["Greeter"].text
+    assert (named["decorated"].start_line, named["decorated"].end_line) == (15, 17)
+    assert named["decorated"].text.startswith("@staticmethod")
+    assert chunks[0].kind == "module" and chunks[0].text.strip() == "import os"
+
+
+def test_large_class_is_split_per_method():
+    methods = "\n\n".join(f"    def method_{i}(self):\n        return {i}" for i in range(4))
+    source = f"class Big:\n    size = 4\n\n{methods}\n"
+    chunks = chunk_python(source, chunk_size=60)
+    names = [chunk.name for chunk in chunks]
+    assert names == ["Big", "Big.method_0", "Big.method_1", "Big.method_2", "Big.method_3"]
+    assert chunks[0].kind == "class" and chunks[1].kind == "function"
+
+
+def test_unparseable_python_falls_back_to_lines():
+    chunks = chunk_python("def broken(:\n    pass\n")
+    assert [chunk.kind for chunk in chunks] == ["lines"]
+
+
+def test_chunk_lines_tracks_line_numbers():
+    text = "\n".join(f"line {i}" for i in range(1, 11))
+    chunks = chunk_lines(text, chunk_size=20)
+    assert chunks[0].start_line == 1
+    assert chunks[-1].end_line == 10
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start_line == previous.end_line + 1
+
+
+def test_ids_are_stable_when_code_moves():
+    before = chunk_file("a.py", SOURCE)
+    after = chunk_file("a.py", "import sys\n\n\ndef added():\n    pass\n\n\n" + SOURCE)
+    ids_before = dict(zip((chunk.name for chunk in before), chunk_ids("a.py", before)))
+    ids_after = dict(zip((chunk.name for chunk in after), chunk_ids("a.py", after)))
+    for name in ("first", "Greeter", "decorated"):
+        assert ids_before[name] == ids_after[name]
+
+
+def test_ids_depend_on_path_and_disambiguate_repeats():
+    chunks = chunk_python("def a():\n    pass\n\n\ndef a():\n    pass\n")
+    ids = chunk_ids("x.py", chunks)
+    assert ids[1] == f"{ids[0]}-1"
+    assert chunk_ids("y.py", chunks)[0] != ids[0]
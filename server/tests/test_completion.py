@@ -0,0 +1,105 @@
+import asyncio
+
+from completion import CompletionCache, CompletionService, trim_overlap
+from inference import InferenceContext
+
+
+def test_cache_continues_a_completion_the_user_is_typing():
+    cache = CompletionCache()
+    cache.set("m", "def add(a, b):\n    ", "", "return a + b")
+    assert cache.get("m", "def add(a, b):\n    ", "") == "return a + b"
+    assert cache.get("m", "def add(a, b):\n    ret", "") == "urn a + b"
+    assert cache.get("m", "def add(a, b):\n    return a", "") == " + b"
+    assert cache.hits == 3
+
+
+def test_cache_misses_when_typing_diverges_or_context_changes():
+    cache = CompletionCache()
+    cache.set("m", "x = ", "\nprint(x)", "compute()")
+    assert cache.get("m", "x = load", "\nprint(x)") is None
+    assert cache.get("m", "x = ", "\nprint(y)") is None
+    assert cache.get("other", "x = ", "\nprint(x)") is None
+    # Nothing left to suggest once the whole completion has been typed
+    assert cache.get("m", "x = compute()", "\nprint(x)") is None
+    assert cache.misses == 4
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CompletionCache(max_entries=2)
+    cache.set("m", "a", "", "1")
+    cache.set("m", "b", "", "2")
+    assert cache.get("m", "a", "") == "1"
+    cache.set("m", "c", "", "3")
+    assert cache.get("m", "b", "") is None
+    assert cache.get("m", "a", "") == "1"
+
+
+def test_trim_overlap_drops_text_already_after_the_cursor():
+    assert trim_overlap("foo(bar))", ")") == "foo(bar)"
+    assert trim_overlap("value\n    return x", "    return x\n") == "value\n"
+    assert trim_overlap("value", "other") == "value"
+
+
+def test_newer_request_supersedes_one_in_flight_even_on_a_cache_hit():
+    async def scenario():
+        service = CompletionService(model="m", debounce=0.01)
+        inference = InferenceContext(model="m", device="gpu")
+
+        async def slow_generate(prefix, suffix, inference):
+            await asyncio.sleep(5)
+            return "stale"
+
+        service._generate = slow_generate
+        service.cache.set("m", "abc", "", "def()")
+        older = asyncio.create_task(service.complete("xyz", "", inference, "doc"))
+        await asyncio.sleep(0.05)
+        newer = await service.complete("abcd", "", inference, "doc")
+        return newer, await asyncio.wait_for(older, 1), service.stats()
+
+    newer, older, stats = asyncio.run(scenario())
+    assert newer["completion"] == "ef()" and newer["cached"]
+    assert older["superseded"] and older["completion"] == ""
+    assert stats["in_flight"] == 0 and stats["superseded"] == 1
+
+
+def test_debounced_request_is_superseded_before_generating():
+    async def scenario():
+        service = CompletionService(model="m", debounce=0.05)
+        inference = InferenceContext(model="m", device="gpu")
+        calls = []
+
+        async def generate(prefix, suffix, inference):
+            calls.append(prefix)
+            return "pass"
+
+        service._generate = generate
+        first = asyncio.create_task(service.complete("a", "", inference, "doc"))
+        await asyncio.sleep(0)
+        second = await service.complete("ab", "", inference, "doc")
+        return await first, second, calls
+
+    first, second, calls = asyncio.run(scenario())
+    assert first["superseded"]
+    assert second["completion"] == "pass"
+    assert calls == ["ab"]
+
+
+def test_requests_without_a_document_id_do_not_supersede_each_other():
+    async def scenario():
+        service = CompletionService(model="m", debounce=0.05)
+        inference = InferenceContext(model="m", device="gpu")
+
+        async def generate(prefix, suffix, inference):
+            await asyncio.sleep(0.05)
+            return f"{prefix}-done"
+
+        service._generate = generate
+        return await asyncio.gather(
+            service.complete("first", "", inference),
+            service.complete("second", "", inference, document_id="")
+        ), service.stats()
+
+    (first, second), stats = asyncio.run(scenario())
+    assert first["completion"] == "first-done" and not first["superseded"]
+    assert second["completion"] == "second-done" and not second["superseded"]
+    assert stats["superseded"] == 0 and stats["in_flight"] == 0
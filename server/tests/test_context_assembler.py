@@ -0,0 +1,40 @@
+from context_assembler import ContextAssembler, estimate_tokens, render_context
+
+
+class FakeManager:
+    """ContextManager double returning fixed chunks best first"""
+    dir = "/workspace"
+
+    def __init__(self, chunks: list[dict]):
+        self.chunks = chunks
+
+    def retrieve_chunks(self, query: str, k: int):
+        return self.chunks[:k]
+
+
+def chunk(index: int, size: int = 600) -> dict:
+    return {
+        "id": str(index),
+        "text": f"def f{index}():\n" + "    x = 1\n" * (size // 10),
+        "metadata": {"filepath": f"/workspace/m{index}.py", "start_line": 1, "end_line": size // 10 + 1}
+    }
+
+
+def test_packed_prompt_fits_num_ctx_with_the_system_message_and_header():
+    assembler = ContextAssembler(FakeManager([chunk(i) for i in range(8)]), k=8, reserve_tokens=256)
+    system = "You are a meticulous reviewer. " * 20
+    prompt = "Explain f0"
+
+    context = assembler.assemble("f0", num_ctx=1024, prompt=prompt, system=system)
+
+    assert context.chunks and len(context.chunks) < 8
+    total = estimate_tokens(system) + estimate_tokens(render_context(context.text, prompt))
+    assert total <= 1024 - 256
+
+
+def test_system_message_shrinks_the_budget():
+    assembler = ContextAssembler(FakeManager([]), reserve_tokens=100)
+    without = assembler.budget_for(1000, "prompt")
+    assert without == 1000 - 100 - estimate_tokens(render_context("", "prompt"))
+    assert assembler.budget_for(1000, "prompt", system="s" * 300) == without - estimate_tokens("s" * 300)
+    assert assembler.budget_for(100, "prompt") == 0
@@ -0,0 +1,106 @@
+import asyncio
+
+import flows
+from context_assembler import CHARS_PER_TOKEN
+from conversations import Conversation, ConversationStore
+from flows import ConversationFlow
+from inference import InferenceContext
+
+
+def text(tokens: int, prefix: str = "") -> str:
+    """Text that estimates to exactly `tokens` tokens"""
+    return prefix + "x" * (int(tokens * CHARS_PER_TOKEN) - len(prefix))
+
+
+def turns(count: int, tokens: int = 100) -> list[dict]:
+    """Alternating user/assistant turns of `tokens` tokens each"""
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": text(tokens, f"{i}:")} for i in range(count)]
+
+
+class FakeClient:
+    """Ollama client double recording requests"""
+    def __init__(self, summary: str = "summary"):
+        self.requests = []
+        self.summary = summary
+
+    async def generate_stream(self, **request):
+        self.requests.append(request)
+        yield {"response": "ok"}
+        yield {"done": True, "context": [1, 2, 3]}
+
+    async def generate(self, **request):
+        self.requests.append(request)
+        return {"response": self.summary}
+
+
+def chat_flow(monkeypatch, store: ConversationStore, client: FakeClient) -> ConversationFlow:
+    monkeypatch.setattr(flows, "get_ollama_client", lambda: client)
+    monkeypatch.setattr(flows, "get_conversation_store", lambda: store)
+    monkeypatch.setattr(flows, "get_context_assembler", lambda: None)
+    return ConversationFlow(inference=InferenceContext(model="m", device="gpu"))
+
+
+def test_recent_turns_fit_the_budget_with_the_summary():
+    store = ConversationStore(token_budget=500, keep_turns=2)
+    conversation = Conversation("s", summary=text(100), turns=turns(6))
+
+    # 100 summary tokens leave room for the newest four 100-token turns
+    assert store.recent_turns(conversation) == conversation.turns[-4:]
+    assert store.recent_turns(conversation, budget=250) == conversation.turns[-1:]
+    assert store.recent_turns(Conversation("s", summary=text(1000), turns=turns(2))) == []
+
+
+def test_needs_summary_once_history_exceeds_the_budget():
+    store = ConversationStore(token_budget=500, keep_turns=2)
+    assert not store.needs_summary(Conversation("s", turns=turns(4)))
+    assert store.needs_summary(Conversation("s", turns=turns(6)))
+    assert not store.needs_summary(Conversation("s", turns=turns(2, tokens=1000)))
+    assert not store.needs_summary(Conversation("s", turns=turns(6), summarizing=True))
+
+
+def test_conversations_persist_in_sqlite(tmp_path):
+    path = str(tmp_path / "conversations.sqlite3")
+    store = ConversationStore(sqlite_path=path)
+    conversation = store.get("s")
+    conversation.summary = "earlier"
+    conversation.turns = turns(2)
+    store.save(conversation)
+
+    restored = ConversationStore(sqlite_path=path).get("s")
+    assert restored.summary == "earlier" and restored.turns == conversation.turns
+    store.delete("s")
+    assert ConversationStore(sqlite_path=path).get("s").turns == []
+
+
+def test_prefill_without_kv_state_is_capped_to_the_budget(monkeypatch):
+    store = ConversationStore(token_budget=300, keep_turns=2)
+    client = FakeClient()
+    flow = chat_flow(monkeypatch, store, client)
+    conversation = store.get("s")
+    conversation.turns = turns(20)
+
+    async def scenario():
+        return [event async for event, _ in flow.stream_session_chat("next?", "s")]
+
+    assert asyncio.run(scenario())[-1] == "done"
+    prompt = client.requests[0]["prompt"]
+    # Only the newest three 100-token turns fit in the 300-token budget
+    assert "17:" in prompt and "19:" in prompt and "16:" not in prompt
+    assert "context" not in client.requests[0]
+
+
+def test_summarize_folds_older_turns_into_the_summary(monkeypatch):
+    store = ConversationStore(token_budget=300, keep_turns=2)
+    client = FakeClient(summary="  the user asked about parsing  ")
+    flow = chat_flow(monkeypatch, store, client)
+    conversation = store.get("s")
+    conversation.turns = turns(6)
+    recent = conversation.turns[-2:]
+    conversation.summarizing = True
+
+    asyncio.run(flow._summarize(conversation, store))
+
+    assert conversation.summary == "the user asked about parsing"
+    assert conversation.turns == recent
+    assert not conversation.summarizing
+    assert "0:" in client.requests[0]["prompt"] and "4:" not in client.requests[0]["prompt"]
@@ -0,0 +1,84 @@
+import asyncio
+
+from jobs import Job, JobManager
+
+
+def test_job_reports_progress_and_result():
+    async def scenario():
+        manager = JobManager()
+        seen = []
+
+        async def work(job: Job):
+            job.update(0.5, "halfway")
+            seen.append((job.status, job.progress, job.message))
+            await asyncio.sleep(0)
+            return {"pulled": True}
+
+        job = manager.submit("pull", work)
+        assert manager.running("pull") is job
+        await manager.wait(job.id)
+        return job, seen, manager.running("pull")
+
+    job, seen, running = asyncio.run(scenario())
+    assert seen == [("running", 0.5, "halfway")]
+    assert job.status == "succeeded" and job.result == {"pulled": True}
+    assert job.progress == 1.0 and job.finished_at >= job.started_at
+    assert running is None
+
+
+def test_failed_job_keeps_the_error():
+    async def scenario():
+        manager = JobManager()
+
+        async def work(job: Job):
+            job.update(2.0)
+            raise RuntimeError("model not found")
+
+        job = manager.submit("pull", work)
+        await manager.wait(job.id)
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.done and job.status == "failed"
+    assert job.error == "model not found" and job.progress == 1.0
+
+
+def test_history_drops_the_oldest_finished_jobs_but_not_running_ones():
+    async def scenario():
+        manager = JobManager(max_history=2)
+        release = asyncio.Event()
+
+        async def quick(job: Job):
+            return job.id
+
+        async def slow(job: Job):
+            await release.wait()
+
+        running = manager.submit("reset", slow)
+        first = manager.submit("warmup", quick)
+        await manager.wait(first.id)
+        second = manager.submit("warmup", quick)
+        await manager.wait(second.id)
+        kept = [job.id for job in manager.list()]
+        release.set()
+        await manager.wait(running.id)
+        return running, second, kept
+
+    running, second, kept = asyncio.run(scenario())
+    assert kept == [running.id, second.id]
+
+
+def test_shutdown_cancels_running_jobs():
+    async def scenario():
+        manager = JobManager()
+
+        async def forever(job: Job):
+            await asyncio.sleep(60)
+
+        job = manager.submit("pull", forever)
+        await asyncio.sleep(0)
+        await manager.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "failed" and job.error == "cancelled"
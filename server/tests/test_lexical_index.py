@@ -0,0 +1,101 @@
+from lexical_index import LexicalIndex, symbol_query, tokenize
+
+
+def metadata(filepath: str, name: str = "", kind: str = "function", start_line: int = 1) -> dict:
+    return {"filepath": filepath, "name": name, "kind": kind, "start_line": start_line}
+
+
+def build() -> LexicalIndex:
+    index = LexicalIndex()
+    index.add(
+        ["fetch", "parse", "cache", "notes"],
+        [
+            "def fetch_url(url):\n    return httpClient.get(url)",
+            "def parse_config(path):\n    return load_yaml(path)",
+            "class ResponseCache:\n    def get(self, key):\n        return self.entries[key]",
+            "Notes about the release process and changelog."
+        ],
+        [
+            metadata("net.py", "fetch_url"),
+            metadata("config.py", "parse_config"),
+            metadata("cache.py", "ResponseCache", kind="class"),
+            metadata("NOTES.md", kind="lines")
+        ]
+    )
+    return index
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("retrieve_chunks") == ["retrieve_chunks", "retrieve", "chunks"]
+    assert tokenize("httpClient.get") == ["httpclient", "http", "client", "get"]
+    assert tokenize("HTTPServer") == ["httpserver", "http", "server"]
+    assert tokenize("a = b") == []
+
+
+def test_symbol_query_accepts_names_only():
+    assert symbol_query("index_files") == "index_files"
+    assert symbol_query("  ContextManager.retrieve() ") == "ContextManager.retrieve"
+    assert symbol_query("def parse_urls") == "parse_urls"
+    assert symbol_query("how are files indexed") is None
+    assert symbol_query("a.b(x)") is None
+
+
+def test_bm25_ranks_matching_chunks():
+    index = build()
+    results = index.search("parse the config file", k=2)
+    assert results[0][0] == "parse"
+    assert all(score > 0 for _, score in results)
+    # Identifier parts match, too
+    assert index.search("client", k=1)[0][0] == "fetch"
+    assert index.search("nothing matches this", k=3) == []
+
+
+def test_bm25_prefers_rarer_terms():
+    index = LexicalIndex()
+    index.add(
+        ["common", "rare"],
+        ["shared shared shared", "shared unusual"],
+        [metadata("a.py"), metadata("b.py")]
+    )
+    assert index.search("shared unusual", k=2)[0][0] == "rare"
+
+
+def test_lookup_finds_qualified_and_bare_names():
+    index = LexicalIndex()
+    index.add(
+        ["method", "function", "module"],
+        ["def get(self): pass", "def get(): pass", "get = 1"],
+        [
+            metadata("b.py", "Store.get", start_line=10),
+            metadata("a.py", "get", start_line=3),
+            metadata("c.py", "", kind="module")
+        ]
+    )
+    assert index.lookup("Store.get") == ["method"]
+    # Exact qualified matches come first, then the rest in file order
+    assert index.lookup("get") == ["function", "method"]
+    assert index.lookup("missing") == []
+    assert index.symbols_in("why does Store.get return None") == ["method"]
+
+
+def test_remove_file_and_reindex():
+    index = build()
+    index.remove_file("net.py")
+    assert index.lookup("fetch_url") == []
+    assert index.search("fetch url", k=1) == []
+    assert index.stats()["files"] == 3
+
+    # Re-adding an ID replaces the old chunk instead of duplicating its postings
+    index.add(["parse"], ["def parse_toml(path): pass"], [metadata("config.py", "parse_toml")])
+    assert index.lookup("parse_config") == []
+    assert index.lookup("parse_toml") == ["parse"]
+    assert index.search("yaml", k=1) == []
+    assert len(index) == 3
+
+
+def test_update_metadata_moves_symbols():
+    index = build()
+    index.update_metadata(["fetch"], [metadata("net.py", "download", start_line=40)])
+    assert index.lookup("fetch_url") == []
+    assert index.lookup("download") == ["fetch"]
+    assert index.get("fetch")["metadata"]["start_line"] == 40
@@ -0,0 +1,111 @@
+import threading
+
+import pytest
+
+from context_manager import ContextManager
+from lexical_index import LexicalIndex
+
+
+class FakeCollection:
+    """Vector store double returning fixed nearest neighbours and counting queries"""
+    def __init__(self, hits: list[tuple[str, str, dict, float]]):
+        self.hits = hits
+        self.queries = 0
+
+    def count(self) -> int:
+        return len(self.hits)
+
+    def query(self, query_texts, n_results, include):
+        self.queries += 1
+        hits = self.hits[:n_results]
+        return {
+            "ids": [[hit[0] for hit in hits]],
+            "documents": [[hit[1] for hit in hits]],
+            "metadatas": [[hit[2] for hit in hits]],
+            "distances": [[hit[3] for hit in hits]]
+        }
+
+
+def manager_with(collection: FakeCollection, lexical: LexicalIndex, mode: str = "hybrid") -> ContextManager:
+    manager = ContextManager.__new__(ContextManager)
+    manager.collection = collection
+    manager.lexical = lexical
+    manager.retrieval_mode = mode
+    manager.rrf_k = 60
+    manager._lexical_loaded = True
+    manager._index_lock = threading.Lock()
+    return manager
+
+
+def chunk(chunk_id: str, name: str = "", kind: str = "function") -> tuple[str, str, dict]:
+    return chunk_id, f"def {name or chunk_id}(): pass", {"filepath": f"{chunk_id}.py", "name": name, "kind": kind}
+
+
+def test_fuse_orders_by_reciprocal_rank():
+    manager = manager_with(FakeCollection([]), LexicalIndex())
+    ids = ["a", "b", "c", "d"]
+    manager.lexical.add(ids, [f"text {i}" for i in ids], [{"filepath": f"{i}.py"} for i in ids])
+
+    fused = manager._fuse({"vector": ["a", "b", "c"], "lexical": ["c", "a", "d"]}, {}, k=3)
+
+    # a: 1/61 + 1/62, c: 1/63 + 1/61, b: 1/62, d: 1/63
+    assert [hit["id"] for hit in fused] == ["a", "c", "b"]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 62, abs=1e-6)
+    assert fused[0]["source"] == "vector+lexical"
+    assert fused[2]["source"] == "vector"
+    assert len(fused) == 3
+
+
+def test_fuse_keeps_vector_distance_and_skips_unknown_ids():
+    manager = manager_with(FakeCollection([]), LexicalIndex())
+    manager.lexical.add(["lex"], ["text"], [{"filepath": "lex.py"}])
+    vector_hit = {"id": "vec", "text": "v", "metadata": {}, "distance": 0.25}
+
+    fused = manager._fuse({"vector": ["vec", "gone"], "lexical": ["lex"]}, {"vec": vector_hit}, k=5)
+
+    assert [hit["id"] for hit in fused] == ["vec", "lex"]
+    assert fused[0]["distance"] == 0.25
+    assert fused[1]["distance"] is None
+
+
+def test_exact_symbol_query_skips_the_vector_store():
+    lexical = LexicalIndex()
+    chunk_id, text, metadata = chunk("fetch", "Client.fetch_url")
+    lexical.add([chunk_id], [text], [metadata])
+    collection = FakeCollection([(chunk_id, text, metadata, 0.5)])
+    manager = manager_with(collection, lexical)
+
+    hits = manager.retrieve_chunks("fetch_url", k=3)
+
+    assert [hit["id"] for hit in hits] == ["fetch"]
+    assert hits[0]["source"] == "symbol"
+    assert collection.queries == 0
+
+
+def test_hybrid_merges_vector_and_lexical_results():
+    lexical = LexicalIndex()
+    rows = [chunk("parse", "parse_config"), chunk("load", "load_yaml"), chunk("other", "unrelated")]
+    lexical.add(*zip(*rows))
+    # The vector store ranks "other" first; the lexical ranking pulls "parse" up
+    collection = FakeCollection([(*rows[2], 0.1), (*rows[0], 0.2), (*rows[1], 0.3)])
+    manager = manager_with(collection, lexical)
+
+    hits = manager.retrieve_chunks("where is the config parsed parse_config", k=2)
+
+    assert hits[0]["id"] == "parse"
+    assert "vector" in hits[0]["source"] and "lexical" in hits[0]["source"]
+    assert collection.queries == 1
+
+
+def test_vector_and_lexical_modes():
+    lexical = LexicalIndex()
+    rows = [chunk("parse", "parse_config"), chunk("other", "unrelated")]
+    lexical.add(*zip(*rows))
+    collection = FakeCollection([(*rows[1], 0.1), (*rows[0], 0.2)])
+
+    vector = manager_with(collection, lexical, mode="vector").retrieve_chunks("config parsing", k=1)
+    assert [hit["id"] for hit in vector] == ["other"]
+
+    lexical_hits = manager_with(collection, lexical, mode="lexical").retrieve_chunks("config parsing", k=1)
+    assert [hit["id"] for hit in lexical_hits] == ["parse"]
+    assert collection.queries == 1
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from scheduler import ModelScheduler, Priority, QueueFull
+
+
+async def run_order(scheduler: ModelScheduler, requests: list[tuple[str, int]]) -> list[str]:
+    """Queue requests behind a held slot and return the order they are granted in"""
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with scheduler.slot("warm", Priority.INTERACTIVE):
+            await release.wait()
+
+    async def request(label: str, model: str, priority: int):
+        async with scheduler.slot(model, priority):
+            order.append(label)
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(request(f"{model}#{index}", model, priority))
+        for index, (model, priority) in enumerate(requests)
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_higher_priority_is_served_first():
+    scheduler = ModelScheduler(max_inflight=1, max_queue=10)
+    order = asyncio.run(run_order(scheduler, [
+        ("warm", Priority.BATCH),
+        ("warm", Priority.STANDARD),
+        ("warm", Priority.INTERACTIVE)
+    ]))
+    assert order == ["warm#2", "warm#1", "warm#0"]
+
+
+def test_same_priority_is_first_come_first_served():
+    scheduler = ModelScheduler(max_inflight=1, max_queue=10)
+    order = asyncio.run(run_order(scheduler, [("warm", Priority.STANDARD)] * 3))
+    assert order == ["warm#0", "warm#1", "warm#2"]
+
+
+def test_resident_model_keeps_serving_until_its_streak_ends():
+    scheduler = ModelScheduler(max_inflight=1, max_streak=3, max_queue=10, warm_grace=0)
+    order = asyncio.run(run_order(scheduler, [
+        ("cold", Priority.STANDARD),
+        ("warm", Priority.STANDARD),
+        ("warm", Priority.STANDARD),
+        ("warm", Priority.STANDARD)
+    ]))
+    # The holder counts toward the streak, so "warm" gets two more grants before yielding
+    assert order == ["warm#1", "warm#2", "cold#0", "warm#3"]
+
+
+def test_priority_beats_model_affinity():
+    scheduler = ModelScheduler(max_inflight=1, max_streak=8, max_queue=10, warm_grace=0)
+    order = asyncio.run(run_order(scheduler, [
+        ("warm", Priority.BATCH),
+        ("cold", Priority.INTERACTIVE)
+    ]))
+    assert order == ["cold#1", "warm#0"]
+
+
+def test_check_admission_rejects_when_queue_is_full():
+    async def scenario():
+        scheduler = ModelScheduler(max_inflight=1, max_queue=2, max_batch_queue=1)
+        release = asyncio.Event()
+
+        async def hold(priority: int):
+            async with scheduler.slot("m", priority):
+                await release.wait()
+
+        tasks = [asyncio.create_task(hold(Priority.STANDARD)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert scheduler.inflight == 1
+        assert scheduler.queued_total == 1
+
+        # One waiter already fills the batch share of the queue, but not the whole queue
+        with pytest.raises(QueueFull) as rejected:
+            scheduler.check_admission(Priority.BATCH)
+        assert rejected.value.retry_after >= 1
+        scheduler.check_admission(Priority.INTERACTIVE)
+
+        tasks.append(asyncio.create_task(hold(Priority.INTERACTIVE)))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            scheduler.check_admission(Priority.INTERACTIVE)
+        assert scheduler.stats()["rejected"] == 2
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = ModelScheduler(max_inflight=1, max_queue=10)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("m"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert scheduler.queued_total == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.queued_total == 0
+
+        release.set()
+        await holder
+        assert scheduler.inflight == 0
+
+    asyncio.run(scenario())
+
+
+def test_slots_are_not_rejected_once_a_request_is_admitted():
+    async def scenario():
+        scheduler = ModelScheduler(max_inflight=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot("m"):
+                await release.wait()
+
+        # More sub-calls than the queue allows, as a fanned-out review makes
+        tasks = [asyncio.create_task(hold()) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert scheduler.queued_total == 3
+        assert not scheduler.admits(Priority.STANDARD)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.stats()["rejected"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_idle_scheduler_prefers_a_model_its_warm_source_reports_loaded():
+    loaded = {"hot"}
+    scheduler = ModelScheduler(max_inflight=1, max_queue=10, warm_grace=60, warm_source=lambda: loaded)
+    order = asyncio.run(run_order(scheduler, [("cold", Priority.STANDARD), ("hot", Priority.STANDARD)]))
+    assert order == ["hot#1", "cold#0"]
+
+    # Once the source stops reporting it, the oldest waiter goes first again
+    loaded.clear()
+    order = asyncio.run(run_order(scheduler, [("cold", Priority.STANDARD), ("hot", Priority.STANDARD)]))
+    assert order == ["cold#0", "hot#1"]
@@ -0,0 +1,45 @@
+import json
+
+from streaming import CodeBlockExtractor, extract_code, sse_event
+
+
+def feed_all(tokens: list[str]) -> tuple[str, CodeBlockExtractor]:
+    extractor = CodeBlockExtractor()
+    return "".join(extractor.feed(token) for token in tokens), extractor
+
+
+def test_extract_code():
+    assert extract_code("Here:\n```python\nx = 1\n```\nDone") == "x = 1"
+    assert extract_code("no fences") == "no fences"
+
+
+def test_extractor_matches_extract_code_for_any_token_split():
+    text = "Sure, here you go:\n```python\ndef f():\n    return `x`\n```\nHope that helps. ```python\nignored\n```"
+    expected = extract_code(text)
+    for size in (1, 2, 3, 5, 8, 13, len(text)):
+        tokens = [text[i:i + size] for i in range(0, len(text), size)]
+        code, extractor = feed_all(tokens)
+        assert code.strip() == expected
+        assert extractor.done
+
+
+def test_extractor_holds_back_a_partial_closing_fence():
+    extractor = CodeBlockExtractor()
+    assert extractor.feed("```python\nx = 1\n``") == "x = 1\n"
+    assert extractor.in_code
+    assert extractor.feed("`") == ""
+    assert extractor.done
+    assert extractor.feed("more text") == ""
+
+
+def test_extractor_emits_nothing_without_a_fence():
+    code, extractor = feed_all(["just ", "prose ", "``", "` not python"])
+    assert code == ""
+    assert not extractor.in_code and not extractor.done
+
+
+def test_sse_event_framing():
+    frame = sse_event("token", {"text": "a\nb"})
+    assert frame.startswith("event: token\ndata: ")
+    assert frame.endswith("\n\n")
+    assert json.loads(frame.split("data: ", 1)[1]) == {"text": "a\nb"}
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+from system_metrics import MetricsSampler
+
+
+def test_latest_resamples_once_the_cached_sample_is_stale():
+    sampler = MetricsSampler(interval=0.05, gpu_enabled=False)
+    first = sampler.latest()
+    assert sampler.latest() is first
+
+    time.sleep(0.06)
+    second = asyncio.run(sampler.alatest())
+    assert second is not first and second["timestamp"] > first["timestamp"]
+    assert len(sampler.history()) == 2
+
+
+def test_running_sampler_samples_immediately_and_serves_its_latest():
+    sampler = MetricsSampler(interval=60, gpu_enabled=False)
+    sampler.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not sampler.history() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(sampler.history()) == 1
+        assert sampler.latest() is sampler.history()[-1]
+    finally:
+        sampler.stop()
+    assert sampler.latest()["gpu_metrics"] == {}
@@ -0,0 +1,56 @@
+import os
+
+from watcher import WorkspaceWatcher
+from workspace_filter import WorkspaceFilter
+
+
+class FakeManager:
+    """ContextManager double that records index_paths calls"""
+    def __init__(self, root: str, indexed: list[str]):
+        self.dir = root
+        self.filter = WorkspaceFilter(root, skip_dirs=[])
+        self.indexed = {path: {"hash": "", "chunks": {}} for path in indexed}
+        self.calls = []
+
+    def _indexed_state(self):
+        return self.indexed
+
+    def index_paths(self, changed, removed):
+        self.calls.append((set(changed), set(removed)))
+        return {}
+
+
+def touch(root, relpath: str) -> str:
+    path = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x = 1\n")
+    return path
+
+
+def test_moved_directory_reindexes_its_files_under_the_new_path(tmp_path):
+    root = str(tmp_path)
+    old = [os.path.join(root, "pkg", "a.py"), os.path.join(root, "pkg", "sub", "b.py")]
+    new = [touch(root, "lib/a.py"), touch(root, "lib/sub/b.py")]
+    kept = touch(root, "pkg_other/c.py")
+    manager = FakeManager(root, old + [kept])
+    watcher = WorkspaceWatcher(manager, use_polling=True)
+
+    watcher.notify_tree(os.path.join(root, "pkg"), os.path.join(root, "lib"))
+    watcher._flush()
+
+    assert manager.calls == [(set(new), set(old))]
+
+
+def test_deleted_directory_removes_only_files_beneath_it(tmp_path):
+    root = str(tmp_path)
+    kept = touch(root, "src/keep.py")
+    gone = [os.path.join(root, "src", "old", "x.py"), os.path.join(root, "src", "old", "y.py")]
+    manager = FakeManager(root, gone + [kept])
+    watcher = WorkspaceWatcher(manager, use_polling=True)
+
+    watcher.notify(changed=[kept])
+    watcher.notify_tree(os.path.join(root, "src", "old"))
+    watcher._flush()
+
+    assert manager.calls == [({kept}, set(gone))]
@@ -0,0 +1,75 @@
+import os
+
+from workspace_filter import GitignoreRule, WorkspaceFilter
+
+
+def touch(root, relpath: str, content: str = "x = 1\n"):
+    path = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+    return path
+
+
+def walked(workspace: WorkspaceFilter) -> list[str]:
+    return sorted(os.path.relpath(path, workspace.root).replace(os.sep, "/") for path in workspace.walk())
+
+
+def test_gitignore_rule_matching():
+    assert GitignoreRule("*.log").matches("logs/app.log", is_dir=False)
+    assert GitignoreRule("/build").matches("build", is_dir=True)
+    assert not GitignoreRule("/build").matches("pkg/build", is_dir=True)
+    assert GitignoreRule("cache/").matches("cache", is_dir=True)
+    assert not GitignoreRule("cache/").matches("cache", is_dir=False)
+    assert GitignoreRule("docs/**/*.html").matches("docs/a/b/index.html", is_dir=False)
+    assert GitignoreRule("docs/**/*.html").matches("docs/index.html", is_dir=False)
+    assert GitignoreRule("file[0-9].txt").matches("file3.txt", is_dir=False)
+    assert GitignoreRule("!keep.log").negate
+
+
+def test_gitignore_files_are_respected_with_negation_and_nesting(tmp_path):
+    touch(tmp_path, ".gitignore", "*.log\n!important.log\ngenerated/\n")
+    touch(tmp_path, "app.py")
+    touch(tmp_path, "debug.log")
+    touch(tmp_path, "important.log")
+    touch(tmp_path, "generated/out.py")
+    touch(tmp_path, "pkg/.gitignore", "secret.py\n")
+    touch(tmp_path, "pkg/secret.py")
+    touch(tmp_path, "pkg/public.py")
+    touch(tmp_path, "secret.py")
+
+    assert walked(WorkspaceFilter(str(tmp_path))) == ["app.py", "important.log", "pkg/public.py", "secret.py"]
+
+
+def test_only_unambiguous_directories_are_always_skipped(tmp_path):
+    touch(tmp_path, "build/setup_helpers.py")
+    touch(tmp_path, "env/settings.py")
+    touch(tmp_path, "node_modules/lib/index.js")
+    touch(tmp_path, "__pycache__/app.cpython-311.py")
+    touch(tmp_path, ".cache/data.py")
+    touch(tmp_path, "myenv/pyvenv.cfg", "home = /usr/bin\n")
+    touch(tmp_path, "myenv/lib/site.py")
+
+    assert walked(WorkspaceFilter(str(tmp_path), skip_dirs=[])) == ["build/setup_helpers.py", "env/settings.py"]
+    assert walked(WorkspaceFilter(str(tmp_path), skip_dirs=["build"])) == ["env/settings.py"]
+
+
+def test_include_and_exclude_globs(tmp_path):
+    touch(tmp_path, "src/app.py")
+    touch(tmp_path, "src/app.ts")
+    touch(tmp_path, "docs/generated/api.py")
+    touch(tmp_path, "bundle.min.js")
+
+    workspace = WorkspaceFilter(str(tmp_path), include=["*.py", "*.js"], exclude=["docs/generated"], skip_dirs=[])
+    assert walked(workspace) == ["src/app.py"]
+
+
+def test_accepts_path_checks_every_ancestor(tmp_path):
+    touch(tmp_path, ".gitignore", "vendor/\n")
+    inside = touch(tmp_path, "vendor/pkg/mod.py")
+    kept = touch(tmp_path, "src/mod.py")
+    workspace = WorkspaceFilter(str(tmp_path), skip_dirs=[])
+
+    assert not workspace.accepts_path(inside)
+    assert workspace.accepts_path(kept)
+    assert not workspace.accepts_path(os.path.join(os.path.dirname(str(tmp_path)), "elsewhere.py"))
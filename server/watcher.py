@@ -0,0 +1,211 @@
+"""
+Keep the workspace index fresh from filesystem events.
+Uses watchdog (inotify/FSEvents/ReadDirectoryChanges) when installed and
+falls back to polling file mtimes. Events are debounced and only the
+affected files are re-embedded through ContextManager.index_paths; a
+directory event rescans that subtree.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Optional
+
+from context_manager import ContextManager
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional
+    FileSystemEventHandler = object
+    Observer = None
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "WorkspaceWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            if event.event_type in ("deleted", "created"):
+                self.watcher.notify_tree(event.src_path)
+            elif event.event_type == "moved":
+                self.watcher.notify_tree(event.src_path, event.dest_path)
+            return
+        if event.event_type == "deleted":
+            self.watcher.notify(removed=[event.src_path])
+        elif event.event_type == "moved":
+            self.watcher.notify(changed=[event.dest_path], removed=[event.src_path])
+        elif event.event_type in ("created", "modified", "closed"):
+            self.watcher.notify(changed=[event.src_path])
+
+
+class WorkspaceWatcher:
+    def __init__(
+        self,
+        manager: ContextManager,
+        debounce: Optional[float] = None,
+        poll_interval: Optional[float] = None,
+        use_polling: bool = False
+    ):
+        """
+        Args:
+            manager: ContextManager whose collection is kept up to date
+            debounce: Quiet period in seconds before a burst of events is indexed
+            poll_interval: Seconds between scans in polling mode
+            use_polling: Force polling even when watchdog is available
+        """
+        self.manager = manager
+        self.debounce = debounce if debounce is not None else float(os.getenv("WATCH_DEBOUNCE", "1.0"))
+        self.poll_interval = poll_interval or float(os.getenv("WATCH_POLL_INTERVAL", "2.0"))
+        self.use_polling = use_polling or Observer is None
+        self.root = os.path.abspath(manager.dir)
+        self.last_stats: Optional[dict] = None
+
+        self._changed: set[str] = set()
+        self._removed: set[str] = set()
+        self._subtrees: set[str] = set()
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._observer = None
+
+    @property
+    def mode(self) -> str:
+        return "polling" if self.use_polling else "native"
+
+    def _normalize(self, path: str) -> str:
+        """Express an event path the way the walker does, so stored file IDs match."""
+        return os.path.join(self.manager.dir, os.path.relpath(os.path.abspath(path), self.root))
+
+    def notify(self, changed=(), removed=()):
+        """Record file events; they are indexed once the debounce window is quiet."""
+        with self._lock:
+            for path in changed:
+                path = self._normalize(path)
+                self._removed.discard(path)
+                self._changed.add(path)
+            for path in removed:
+                path = self._normalize(path)
+                self._changed.discard(path)
+                self._removed.add(path)
+            self._last_event = time.monotonic()
+        self._wake.set()
+
+    def notify_tree(self, *directories: str):
+        """Record directories that were created, moved or deleted; their subtrees are rescanned on flush."""
+        with self._lock:
+            self._subtrees.update(self._normalize(directory) for directory in directories)
+            self._last_event = time.monotonic()
+        self._wake.set()
+
+    def start(self):
+        """Start watching in background threads."""
+        self._stop.clear()
+        if self.use_polling:
+            self._spawn(self._poll_loop, "index-poller")
+        else:
+            self._observer = Observer()
+            self._observer.schedule(_EventHandler(self), self.root, recursive=True)
+            self._observer.start()
+        self._spawn(self._flush_loop, "index-flusher")
+
+    def stop(self):
+        """Stop watching and index any events still pending."""
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._flush()
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            # Wait for the event burst to go quiet before indexing
+            while not self._stop.is_set():
+                with self._lock:
+                    remaining = self._last_event + self.debounce - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._stop.wait(remaining)
+            if not self._stop.is_set():
+                self._flush()
+
+    def _flush(self):
+        with self._lock:
+            changed, removed, subtrees = self._changed, self._removed, self._subtrees
+            self._changed, self._removed, self._subtrees = set(), set(), set()
+        if not changed and not removed and not subtrees:
+            return
+        try:
+            if subtrees:
+                tree_changed, tree_removed = self._expand(subtrees)
+                changed |= tree_changed
+                removed = (removed | tree_removed) - tree_changed
+            self.last_stats = self.manager.index_paths(changed, removed)
+        except Exception as e:
+            print(f"Error updating index: {e}")
+
+    def _expand(self, subtrees: set[str]) -> tuple[set[str], set[str]]:
+        """
+        Turn directory events into file events: indexed files under a subtree that are
+        gone from disk are removed, and files now on disk under it are (re)indexed.
+        Unchanged files are skipped by their content hash.
+        """
+        prefixes = tuple(os.path.join(directory, "") for directory in subtrees)
+        on_disk = set()
+        for directory in subtrees:
+            if os.path.isdir(directory):
+                on_disk.update(self.manager.filter.walk(directory))
+        indexed = {path for path in self.manager._indexed_state() if path.startswith(prefixes)}
+        return on_disk, indexed - on_disk
+
+    def _snapshot(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for filepath in self.manager._walk_files():
+            try:
+                stat = os.stat(filepath)
+            except OSError:
+                continue
+            snapshot[filepath] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _poll_loop(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            changed = [path for path, signature in current.items() if previous.get(path) != signature]
+            removed = [path for path in previous if path not in current]
+            if changed or removed:
+                self.notify(changed=changed, removed=removed)
+            previous = current
+
+
+if __name__ == "__main__":
+    # Usage: python watcher.py <workspace_dir> [persist_dir]
+    manager = ContextManager(sys.argv[1], *sys.argv[2:3])
+    print(manager.index_files())
+    watcher = WorkspaceWatcher(manager)
+    watcher.start()
+    print(f"Watching {watcher.root} ({watcher.mode} mode), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+            if watcher.last_stats:
+                print(watcher.last_stats)
+                watcher.last_stats = None
+    except KeyboardInterrupt:
+        watcher.stop()
@@ -0,0 +1,206 @@
+"""
+Decide which parts of a workspace get indexed.
+Directories are pruned before they are traversed: VCS metadata, caches,
+node_modules and virtualenvs, anything matched by a .gitignore (nested
+files respected), INDEX_SKIP_DIRS names and user exclude globs. Generic
+names such as build/ or env/ are only skipped when configured, since they
+are often real source packages. Files can further be limited by include globs.
+"""
+import fnmatch
+import os
+import re
+from typing import Iterable, Optional
+
+# Never source code, whatever the project; everything else is left to .gitignore or INDEX_SKIP_DIRS
+DEFAULT_SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", ".chroma",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox"
+}
+
+DEFAULT_EXCLUDE_GLOBS = [
+    "*.pyc", "*.pyo", "*.so", "*.dll", "*.dylib", "*.exe", "*.bin", "*.o", "*.a",
+    "*.vsix", "*.zip", "*.tar", "*.gz", "*.tgz", "*.whl", "*.jar",
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.ico", "*.pdf", "*.woff", "*.woff2", "*.ttf",
+    "*.min.js", "*.map", "*.lock", "package-lock.json", "*.sqlite3", "*.db"
+]
+
+
+def _split_globs(value: Optional[str]) -> list[str]:
+    return [glob.strip() for glob in (value or "").split(",") if glob.strip()]
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore glob into a regex fragment."""
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+            continue
+        if pattern.startswith("/**", i) and i + 3 == len(pattern):
+            regex += "(?:/.*)?"
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end < 0:
+                regex += re.escape(char)
+            else:
+                regex += "[" + pattern[i + 1:end].replace("!", "^", 1) + "]"
+                i = end
+        else:
+            regex += re.escape(char)
+        i += 1
+    return regex
+
+
+class GitignoreRule:
+    def __init__(self, line: str):
+        self.negate = line.startswith("!")
+        pattern = line[1:] if self.negate else line
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "^" if anchored else "^(?:.*/)?"
+        self.regex = re.compile(prefix + _glob_to_regex(pattern) + "$")
+
+    def matches(self, relpath: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        return bool(self.regex.match(relpath))
+
+
+def load_gitignore(path: str) -> list[GitignoreRule]:
+    """Parse a .gitignore file into rules (comments and blanks skipped)."""
+    rules = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.rstrip("\n").rstrip()
+                if line and not line.startswith("#"):
+                    rules.append(GitignoreRule(line.replace("\\#", "#")))
+    except OSError:
+        pass
+    return rules
+
+
+class WorkspaceFilter:
+    def __init__(
+        self,
+        root: str,
+        include: Optional[Iterable[str]] = None,
+        exclude: Optional[Iterable[str]] = None,
+        max_file_size: Optional[int] = None,
+        use_gitignore: bool = True,
+        skip_dirs: Optional[Iterable[str]] = None
+    ):
+        """
+        Args:
+            root: Workspace root
+            include: Globs a file must match to be indexed (all files when empty)
+            exclude: Extra globs for files or directories to skip, added to the defaults
+            max_file_size: Largest file, in bytes, that will be indexed
+            use_gitignore: Respect .gitignore files found in the workspace
+            skip_dirs: Extra directory names never traversed (e.g. build, dist), added to the defaults
+        """
+        self.root = root
+        self.include = list(include) if include is not None else _split_globs(os.getenv("INDEX_INCLUDE"))
+        extra = list(exclude) if exclude is not None else _split_globs(os.getenv("INDEX_EXCLUDE"))
+        self.exclude = DEFAULT_EXCLUDE_GLOBS + extra
+        self.max_file_size = max_file_size or int(os.getenv("INDEX_MAX_FILE_SIZE", str(512 * 1024)))
+        self.use_gitignore = use_gitignore
+        extra_dirs = list(skip_dirs) if skip_dirs is not None else _split_globs(os.getenv("INDEX_SKIP_DIRS"))
+        self.skip_dirs = DEFAULT_SKIP_DIRS | set(extra_dirs)
+        self._gitignores: dict[str, list[GitignoreRule]] = {}
+
+    def _relpath(self, path: str) -> str:
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _rules_for(self, directory: str) -> list[GitignoreRule]:
+        if directory not in self._gitignores:
+            self._gitignores[directory] = load_gitignore(os.path.join(directory, ".gitignore"))
+        return self._gitignores[directory]
+
+    def _gitignored(self, path: str, is_dir: bool) -> bool:
+        """Apply .gitignore files from the root down to path's directory; the last match wins."""
+        ignored = False
+        directory = os.path.dirname(path)
+        chain = []
+        while True:
+            chain.append(directory)
+            if os.path.normpath(directory) == os.path.normpath(self.root) or len(chain) > 64:
+                break
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                break
+            directory = parent
+        for base in reversed(chain):
+            relpath = os.path.relpath(path, base).replace(os.sep, "/")
+            for rule in self._rules_for(base):
+                if rule.matches(relpath, is_dir):
+                    ignored = not rule.negate
+        return ignored
+
+    def _excluded(self, path: str) -> bool:
+        name = os.path.basename(path)
+        relpath = self._relpath(path)
+        return any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(relpath, glob) for glob in self.exclude)
+
+    def skip_dir(self, path: str) -> bool:
+        """Whether a directory (and its whole subtree) should not be traversed."""
+        name = os.path.basename(path)
+        if name in self.skip_dirs or (name.startswith(".") and name != "."):
+            return True
+        if os.path.isfile(os.path.join(path, "pyvenv.cfg")):
+            return True  # A virtualenv, whatever it is called
+        if self._excluded(path):
+            return True
+        return self.use_gitignore and self._gitignored(path, is_dir=True)
+
+    def accepts_file(self, path: str) -> bool:
+        """Whether a file inside an already-accepted directory should be indexed."""
+        name = os.path.basename(path)
+        if name.startswith("."):
+            return False
+        if self._excluded(path):
+            return False
+        if self.include:
+            relpath = self._relpath(path)
+            if not any(fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(relpath, glob) for glob in self.include):
+                return False
+        return not (self.use_gitignore and self._gitignored(path, is_dir=False))
+
+    def accepts_path(self, path: str) -> bool:
+        """accepts_file plus a check that no ancestor directory is skipped (for watcher events)."""
+        directory = os.path.dirname(path)
+        relparts = self._relpath(directory).split("/")
+        if relparts[0] == "..":
+            return False
+        current = self.root
+        for part in relparts:
+            if part in ("", "."):
+                continue
+            current = os.path.join(current, part)
+            if self.skip_dir(current):
+                return False
+        return self.accepts_file(path)
+
+    def walk(self, top: Optional[str] = None):
+        """Yield accepted file paths under top (default: the root), pruning skipped directories before descending."""
+        for root, dirnames, files in os.walk(top or self.root):
+            dirnames[:] = [d for d in dirnames if not self.skip_dir(os.path.join(root, d))]
+            for fname in files:
+                filepath = os.path.join(root, fname)
+                if self.accepts_file(filepath):
+                    yield filepath